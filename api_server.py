@@ -0,0 +1,458 @@
+"""
+EV Charge Pro UK - JSON HTTP API
+Exposes the costing, cheapest-card and route planning engine to clients that
+can't use the Streamlit UI. Every endpoint takes a batch and evaluates it in
+one vectorized pass; POI, FX, geocode and tariff caches are shared process-wide.
+
+    python api_server.py --port 8080
+
+Keys are read from the OCM_API_KEY / ORS_API_KEY environment variables, falling
+back to .streamlit/secrets.toml.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import numpy as np
+
+from ev_charge_pro_app import (
+    Config,
+    IO_ENGINE,
+    cache_stats,
+    calculate_charging_cost,
+    calculate_charging_time_vectorized,
+    calculate_session_costs_compiled,
+    compile_tariffs,
+    current_catalogue,
+    currency_factors,
+    degraded_upstreams,
+    fetch_exchange_rates,
+    fetch_ocm_operators,
+    get_secret,
+    infer_tariffs_for_operator,
+    local_minute_now,
+    plan_route_async,
+    plan_trip_async,
+    reload_catalogue,
+    start_background_warm_up,
+    upstream_stats,
+)
+
+MAX_BATCH = 10_000
+MAX_ROUTES = 50
+MAX_WAYPOINTS = 30
+MAX_BODY_BYTES = 8 * 2**20
+CURRENCIES = ("GBP", "EUR", "USD")
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ============================================================================
+# REQUEST PARSING
+# ============================================================================
+
+def _batch(body: Dict, key: str, limit: int = MAX_BATCH) -> List[Dict]:
+    items = body.get(key)
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, f"'{key}' must be a non-empty list")
+    if len(items) > limit:
+        raise ApiError(413, f"at most {limit} {key} per request")
+    if not all(isinstance(item, dict) for item in items):
+        raise ApiError(400, f"every entry in '{key}' must be an object")
+    return items
+
+
+def _column(items: List[Dict], key: str, default: Optional[float] = None) -> np.ndarray:
+    try:
+        values = [item[key] if key in item else default for item in items]
+        if any(v is None for v in values):
+            raise KeyError(key)
+        return np.asarray(values, dtype=float)
+    except KeyError:
+        raise ApiError(400, f"'{key}' is required for every entry")
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{key}' must be numeric")
+
+
+def _number(item: Dict, key: str, default: float, low: float, high: float = np.inf) -> float:
+    """item[key] (or default) as a float in [low, high]; anything else is a 400."""
+    try:
+        value = float(item.get(key, default))
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{key}' must be numeric")
+    if not low <= value <= high or not np.isfinite(value):
+        raise ApiError(400, f"'{key}' must be between {low:g} and {high:g}")
+    return value
+
+
+def _currency(body: Dict) -> str:
+    currency = body.get("currency", "GBP")
+    if currency not in CURRENCIES:
+        raise ApiError(400, f"'currency' must be one of {', '.join(CURRENCIES)}")
+    return currency
+
+
+def _provider(name: str) -> Dict:
+    preset = current_catalogue().providers.get(name)
+    if preset is None:
+        raise ApiError(400, f"unknown provider '{name}'")
+    return preset
+
+
+def _json_default(value):
+    # Route profiles are NumPy arrays / scalars
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return str(value)
+
+
+def _session_arrays(items: List[Dict]) -> Tuple[np.ndarray, ...]:
+    """battery_kwh, effective_kw, start_pct, end_pct, efficiency_loss, apply_taper."""
+    battery = _column(items, "battery_kwh")
+    station_kw = _column(items, "station_kw", 50.0)
+    car_max_kw = _column(items, "car_max_kw", np.inf)
+    start = _column(items, "start_pct")
+    end = _column(items, "end_pct")
+    loss = _column(items, "efficiency_loss", Config.DEFAULT_EFFICIENCY_LOSS)
+    taper = np.array([bool(item.get("apply_taper", True)) for item in items])
+    if (end < start).any() or (start < 0).any() or (end > 100).any():
+        raise ApiError(400, "need 0 <= start_pct <= end_pct <= 100")
+    return battery, np.minimum(station_kw, car_max_kw), start, end, loss, taper
+
+
+def _taper_split(func: Callable, taper: np.ndarray, *args) -> np.ndarray:
+    """Evaluate func for tapered and untapered sessions (apply_taper is a scalar flag)."""
+    out = np.empty(len(taper))
+    for flag in (True, False):
+        mask = taper == flag
+        if mask.any():
+            out[mask] = func(*(a[mask] if isinstance(a, np.ndarray) else a for a in args), flag)
+    return out
+
+
+# ============================================================================
+# ENDPOINTS
+# ============================================================================
+
+def handle_sessions(body: Dict) -> Dict:
+    """Flat-rate time and cost for a batch of sessions.
+
+    Each session names a "provider" preset or gives energy_price, time_price,
+    session_fee and currency itself.
+    """
+    items = _batch(body, "sessions")
+    currency = _currency(body)
+    battery, effective_kw, start, end, loss, taper = _session_arrays(items)
+    tariffs = [
+        _provider(item["provider"]) if "provider" in item else {
+            "energy": item.get("energy_price", 0.0),
+            "time": item.get("time_price", 0.0),
+            "session_fee": item.get("session_fee", 0.0),
+            "currency": item.get("currency", "GBP"),
+        }
+        for item in items
+    ]
+    energy_price = _column(tariffs, "energy")
+    time_price = _column(tariffs, "time")
+    session_fee = _column(tariffs, "session_fee", 0.0)
+    native_currencies = [t["currency"] for t in tariffs]
+
+    rates = fetch_exchange_rates()
+    minutes = _taper_split(calculate_charging_time_vectorized, taper, battery, effective_kw, start, end)
+    energy = battery * (end - start) / 100.0 * (1.0 + loss / 100.0)
+    native_cost = calculate_charging_cost(energy, minutes, energy_price, time_price, session_fee)
+    unique = sorted(set(native_currencies))
+    factors = dict(zip(unique, currency_factors(unique, currency, rates)))
+    cost = native_cost * np.array([factors[c] for c in native_currencies])
+    return {
+        "currency": currency,
+        "rates_date": rates.get("_date"),
+        "results": [
+            {"time_min": t, "energy_kwh": e, "native_cost": n, "native_currency": nc, "cost": c}
+            for t, e, n, nc, c in zip(
+                minutes.tolist(), energy.tolist(), native_cost.tolist(), native_currencies, cost.tolist()
+            )
+        ],
+    }
+
+
+def handle_cheapest_card(body: Dict) -> Dict:
+    """Cheapest usable card per session under the full tariff rules.
+
+    Sessions may give an "operator" (only cards accepted there are considered),
+    "cards" (cards the driver holds, default: the request's "cards" or all) and
+    plug_in_minute for time-of-use tariffs (minutes after local midnight,
+    default now).
+    """
+    items = _batch(body, "sessions")
+    currency = _currency(body)
+    battery, effective_kw, start, end, loss, taper = _session_arrays(items)
+    plug_in = _column(items, "plug_in_minute", local_minute_now())
+    names = tuple(current_catalogue().providers)
+    column = {name: j for j, name in enumerate(names)}
+    default_cards = body.get("cards") or names
+
+    usable = np.zeros((len(items), len(names)), dtype=bool)
+    for i, item in enumerate(items):
+        cards = set(item.get("cards") or default_cards)
+        operator = item.get("operator")
+        candidates = infer_tariffs_for_operator(operator) if operator else names
+        for name in candidates:
+            if name in cards and name in column:
+                usable[i, column[name]] = True
+
+    rates = fetch_exchange_rates()
+    compiled = compile_tariffs(names)
+    fx = currency_factors(list(compiled.currencies), currency, rates)
+    costs = np.full((len(items), len(names)), np.inf)
+    minutes = np.empty(len(items))
+    for flag in (True, False):
+        mask = taper == flag
+        if not mask.any():
+            continue
+        costs[mask] = calculate_session_costs_compiled(
+            compiled, battery[mask, None], effective_kw[mask, None], start[mask, None],
+            end[mask, None], loss[mask, None], flag, plug_in[mask, None],
+        ) * fx
+        minutes[mask] = calculate_charging_time_vectorized(
+            battery[mask], effective_kw[mask], start[mask], end[mask], flag
+        )
+    costs = np.where(usable, costs, np.inf)
+    best = costs.argmin(axis=1)
+    best_cost = costs[np.arange(len(items)), best]
+
+    results = []
+    for i in range(len(items)):
+        if not np.isfinite(best_cost[i]):
+            results.append({"card": None, "cost": None, "time_min": float(minutes[i]), "options": {}})
+            continue
+        options = {names[j]: float(costs[i, j]) for j in np.flatnonzero(usable[i])}
+        results.append({
+            "card": names[best[i]],
+            "cost": float(best_cost[i]),
+            "time_min": float(minutes[i]),
+            "options": options,
+        })
+    return {"currency": currency, "rates_date": rates.get("_date"), "results": results}
+
+
+def handle_convert(body: Dict) -> Dict:
+    """Convert a batch of amounts; "from" is one currency or one per amount."""
+    to_currency = _currency({"currency": body.get("to", "GBP")})
+    amounts = body.get("amounts")
+    if not isinstance(amounts, list):
+        raise ApiError(400, "'amounts' must be a list")
+    from_currencies = body.get("from", "GBP")
+    if isinstance(from_currencies, str):
+        from_currencies = [from_currencies] * len(amounts)
+    if len(from_currencies) != len(amounts):
+        raise ApiError(400, "'from' must be one currency or one per amount")
+    rates = fetch_exchange_rates()
+    unique = sorted(set(from_currencies))
+    factors = dict(zip(unique, currency_factors(unique, to_currency, rates)))
+    try:
+        converted = np.asarray(amounts, dtype=float) * np.array([factors[c] for c in from_currencies])
+    except (TypeError, ValueError):
+        raise ApiError(400, "'amounts' must be numeric")
+    return {"currency": to_currency, "rates_date": rates.get("_date"), "amounts": converted.tolist()}
+
+
+def _strip_geometry(plan: Dict) -> Dict:
+    return {k: v for k, v in plan.items() if k not in ("geometry", "coords", "profile")}
+
+
+def handle_routes(body: Dict) -> Dict:
+    """Plan a batch of routes concurrently; each route fails on its own."""
+    items = _batch(body, "routes", MAX_ROUTES)
+    currency = _currency(body)
+    ors_api_key = get_secret("ORS_API_KEY")
+    if not ors_api_key:
+        raise ApiError(503, "route planning needs ORS_API_KEY")
+    headers = {"Authorization": ors_api_key}
+    include_geometry = bool(body.get("include_geometry", False))
+    providers = current_catalogue().providers
+
+    def route_job(item: Dict) -> Tuple[Callable, Tuple]:
+        if not item.get("start") or not item.get("end"):
+            raise ApiError(400, "every route needs 'start' and 'end'")
+        start_pct = _number(item, "start_pct", Config.ROUTE_START_PCT, 0.0, 100.0)
+        reserve_pct = _number(item, "reserve_pct", Config.DEFAULT_RESERVE_PCT, 0.0, 100.0)
+        charge_to_pct = _number(item, "charge_to_pct", Config.ROUTE_CHARGE_TO_PCT, 0.0, 100.0)
+        if charge_to_pct <= reserve_pct:
+            raise ApiError(400, "'charge_to_pct' must be above 'reserve_pct'")
+        name = item.get("provider", next(iter(providers)))
+        preset = _provider(name)
+        provider = {
+            "provider": name,
+            "currency": preset["currency"],
+            "station_kw": _number(item, "car_max_kw", preset["default_kw"], 1.0, 1000.0),
+            "energy_price": preset["energy"],
+        }
+        common = (
+            _number(item, "battery_kwh", 75.0, 1.0, 1000.0),
+            _number(item, "miles_per_kwh", Config.DEFAULT_MILES_PER_KWH, 0.1, 20.0),
+            provider, currency, item.get("cards") or body.get("cards") or list(providers), headers,
+            start_pct, reserve_pct, charge_to_pct,
+        )
+        via = item.get("via") or []
+        if not via:
+            alternatives = min(max(int(_number(item, "alternatives", 1, -np.inf)), 1), Config.ROUTE_ALTERNATIVES_MAX)
+            return plan_route_async, (item["start"], item["end"], *common, alternatives)
+        if not isinstance(via, list) or len(via) > MAX_WAYPOINTS:
+            raise ApiError(400, f"'via' must be a list of at most {MAX_WAYPOINTS} places")
+        stops = [v if isinstance(v, dict) else {"place": v} for v in via]
+        if not all(isinstance(v.get("place"), str) and v["place"].strip() for v in stops):
+            raise ApiError(400, "every 'via' entry needs a 'place'")
+        places = [item["start"], *(v["place"] for v in stops), item["end"]]
+        overnight = [False, *(bool(v.get("overnight", False)) for v in stops), False]
+        return plan_trip_async, (places, overnight, *common)
+
+    jobs = [route_job(item) for item in items]
+
+    async def plan_all():
+        return await asyncio.gather(*(planner(*args) for planner, args in jobs), return_exceptions=True)
+
+    results = []
+    for plan in IO_ENGINE.run(plan_all()):
+        if isinstance(plan, Exception):
+            results.append({"error": f"{type(plan).__name__}: {plan}"})
+            continue
+        if not include_geometry:
+            plan = _strip_geometry(plan)
+            for key in ("alternatives", "legs"):
+                if key in plan:
+                    plan[key] = [_strip_geometry(p) for p in plan[key]]
+        results.append(plan)
+    return {"currency": currency, "results": results}
+
+
+def handle_providers(_body: Dict) -> Dict:
+    catalogue = current_catalogue()
+    return {
+        "tariff_version": catalogue.tariff_version,
+        "providers": catalogue.providers,
+        "operators": catalogue.operator_tariffs,
+    }
+
+
+def handle_health(_body: Dict) -> Dict:
+    return {
+        "status": "degraded" if degraded_upstreams() else "ok",
+        "degraded": degraded_upstreams(),
+        "caches": cache_stats().to_dict(orient="records"),
+        "upstreams": upstream_stats().to_dict(orient="records"),
+    }
+
+
+ROUTES: Dict[Tuple[str, str], Callable[[Dict], Dict]] = {
+    ("GET", "/health"): handle_health,
+    ("GET", "/v1/providers"): handle_providers,
+    ("POST", "/v1/sessions"): handle_sessions,
+    ("POST", "/v1/cheapest-card"): handle_cheapest_card,
+    ("POST", "/v1/convert"): handle_convert,
+    ("POST", "/v1/routes"): handle_routes,
+}
+
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so batching clients reuse connections
+    server_version = "EVChargePro/1.0"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    quiet = True
+
+    def _dispatch(self, method: str):
+        reload_catalogue()
+        handler = ROUTES.get((method, self.path.split("?", 1)[0]))
+        try:
+            if handler is None:
+                raise ApiError(404, f"no route for {method} {self.path}")
+            body = {}
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                raise ApiError(413, "request body too large")
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    raise ApiError(400, "body is not valid JSON")
+                if not isinstance(body, dict):
+                    raise ApiError(400, "body must be a JSON object")
+            self._send(200, handler(body))
+        except ApiError as e:
+            self._send(e.status, {"error": e.message})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _send(self, status: int, payload: Dict):
+        data = json.dumps(payload, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def warm_caches():
+    """Fill FX, operator and compiled-tariff caches before the first request."""
+    futures = [IO_ENGINE.submit_call(fetch_exchange_rates)]
+    if get_secret("OCM_API_KEY"):
+        futures.append(IO_ENGINE.submit_call(fetch_ocm_operators))
+    compile_tariffs(tuple(current_catalogue().providers))
+    for future in futures:
+        future.result()
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8080, quiet: bool = True) -> ThreadingHTTPServer:
+    ApiHandler.quiet = quiet
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="EV Charge Pro JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+
+    warm_caches()
+    if Config.WARMUP_ON_START:
+        start_background_warm_up()
+    server = make_server(args.host, args.port, quiet=not args.verbose)
+    print(f"EV Charge Pro API listening on http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,54 @@ EV Charge Pro UK - Professional Edition
 A comprehensive EV charging cost and route planning tool for the UK market
 """
 
-from typing import Dict, Tuple, Optional, List, Set
-
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import time as dt_time
+from typing import Callable, Dict, Hashable, Tuple, Optional, List, Set
+
+import asyncio
+import functools
+import hashlib
+import inspect
 import json
+import logging
+import os
+import pickle
+import sqlite3
+import stat
+import sys
+import threading
+import time
+import zlib
 import requests
+import altair as alt
 import numpy as np
 import pandas as pd
 import streamlit as st
 from geopy.geocoders import Nominatim
 import folium
 from streamlit_folium import st_folium
-from openrouteservice import convert
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # ChargerIndex falls back to a brute-force scan
+    cKDTree = None
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    # Streamlit execs this file afresh on every rerun, which would rebuild every
+    # cache, I/O thread pool and catalogue each time. Run the imported module
+    # instead so that state lives for the whole server process.
+    import importlib
+
+    _here = os.path.dirname(os.path.abspath(__file__))
+    if _here not in sys.path:
+        sys.path.insert(0, _here)
+    importlib.import_module(os.path.splitext(os.path.basename(__file__))[0]).run()
+    st.stop()
 
 # ============================================================================
 # CONFIGURATION & DATA
@@ -24,133 +61,1182 @@ class Config:
     APP_ICON = "⚡"
     PAGE_LAYOUT = "wide"
     CACHE_TTL = 1800  # 30 minutes
+    # Per-function cache quotas: (max bytes, max entries)
+    CACHE_QUOTAS = {
+        "fetch_nearby_chargers": (64 * 2**20, 5000),
+        "fetch_ocm_operators": (4 * 2**20, 4),
+        "fetch_exchange_rates": (2**20, 4),
+        "geocode_postcode": (2 * 2**20, 20000),
+        "compile_tariffs": (16 * 2**20, 256),
+        "annual_cost_simulation": (16 * 2**20, 64),
+        "geocode_place_ors": (2 * 2**20, 20000),
+        "fetch_ors_directions": (64 * 2**20, 500),
+    }
+    # Cross-process cache shared by every server worker on this host (SQLite, WAL mode).
+    # Unset disables it; each worker then only has its in-process cache.
+    SHARED_CACHE_PATH = os.environ.get("EVCP_SHARED_CACHE")
+    SHARED_CACHE_MAX_BYTES = 512 * 2**20
     API_TIMEOUT = 8
+    # Upstream base URLs; the load-test harness points them at standin_apis.py
+    OCM_BASE_URL = os.environ.get("EVCP_OCM_URL", "https://api.openchargemap.io")
+    ORS_BASE_URL = os.environ.get("EVCP_ORS_URL", "https://api.openrouteservice.org")
+    FX_BASE_URL = os.environ.get("EVCP_FX_URL", "https://api.frankfurter.app")
+    NOMINATIM_URL = os.environ.get("EVCP_NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+    # Circuit breaker: open after this many consecutive failures, probe again after BREAKER_OPEN_S
+    BREAKER_FAILURES = 5
+    BREAKER_OPEN_S = 30.0
+    # Hedging: duplicate a call still running past this quantile of recent latencies
+    HEDGE_QUANTILE = 0.95
+    HEDGE_WINDOW = 200
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_MIN_DELAY_S = 0.05
+    # Per upstream: (max concurrent calls, sustained calls per second, burst)
+    UPSTREAM_LIMITS = {
+        "ocm": (4, 5.0, 10),
+        "ors_geocode": (2, 100 / 60, 5),  # ORS free plan: 100 geocodes/min
+        "ors_directions": (2, 40 / 60, 2),  # ORS free plan: 40 directions/min
+        "nominatim": (1, 1.0, 1),  # Nominatim usage policy: 1 request/s
+        "fx": (1, 1.0, 1),
+    }
+    UPSTREAM_QUEUE_TIMEOUT_S = 30.0  # longest wait for an upstream slot outside call()
+    IO_MAX_WORKERS = 16
     DEFAULT_MILES_PER_KWH = 3.5
     DEFAULT_EFFICIENCY_LOSS = 6  # percentage
+    FLEET_POWER_LEVELS_KW = (7, 22, 50, 100, 150, 250, 350)
+    MONTE_CARLO_DRAWS = (10_000, 100_000, 1_000_000)
+    MONTE_CARLO_CHUNK = 32_768
+    # Progressive nearby search: (radius km, max results) per ring
+    NEARBY_SEARCH_RINGS = ((2, 10), (5, 25), (10, 50), (20, 100), (40, 200))
+    NEARBY_TARGET_COMPATIBLE = 15
+    ROAD_DISTANCE_FACTOR = 1.3  # typical road distance / straight-line distance
+    # Charger search is partitioned by country: a search only queries (and caches) the
+    # countries whose outline in COUNTRY_OUTLINES_PATH comes within its radius.
+    # EVCP_COUNTRIES=GB,FR limits coverage to those countries.
+    CHARGER_COUNTRIES = tuple(
+        code for code in ("GB", "IE", "FR", "BE", "NL", "LU", "DE", "CH", "AT", "IT", "ES", "PT", "DK", "NO", "SE")
+        if code in os.environ.get("EVCP_COUNTRIES", code).upper().split(",")
+    )
+    DEFAULT_RESERVE_PCT = 10
+    # Charger ranking: value of time per hour (comparison currency), detour driving speed
+    VALUE_OF_TIME_PER_HOUR = 15.0
+    DETOUR_SPEED_KMH = 40.0
+    RANKING_K = 10
+    # Tariff and vehicle catalogues (see data/); checked for changes at most this often
+    DATA_DIR = os.environ.get("EVCP_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    CATALOGUE_POLL_SECONDS = 5.0
+    # Cache warm-up targets (see load_hotspots). EVCP_WARMUP: unset/0 = off, "start" = once
+    # at process start, a number = also every that many seconds
+    HOTSPOTS_PATH = os.environ.get("EVCP_HOTSPOTS", os.path.join(DATA_DIR, "hotspots.json"))
+    COUNTRY_OUTLINES_PATH = os.path.join(DATA_DIR, "countries.json")
+    WARMUP_MODE = os.environ.get("EVCP_WARMUP", "0")
+    WARMUP_ON_START = WARMUP_MODE not in ("", "0")
+    WARMUP_INTERVAL_S = float(WARMUP_MODE) if WARMUP_MODE.replace(".", "", 1).isdigit() else None
+    # Route energy model: miles/kWh is taken to hold on the flat at this speed
+    ROUTE_REFERENCE_SPEED_KMH = 80.0
+    ROUTE_START_PCT = 90
+    ROUTE_CHARGE_TO_PCT = 80
+    CORRIDOR_SPACING_KM = 5.0  # stops snap to points this far apart (the stop search radius)
+    # Alternative routes (ORS alternative_routes): at most this many; an alternative may
+    # share up to SHARE of the best route and be up to WEIGHT times its duration
+    ROUTE_ALTERNATIVES_MAX = 3
+    ROUTE_ALTERNATIVE_SHARE = 0.6
+    ROUTE_ALTERNATIVE_WEIGHT = 1.6
+    # Optional .npz height grid used when the route has no elevation (see ElevationGrid)
+    ELEVATION_GRID_PATH = os.environ.get("EVCP_ELEVATION_GRID")
+    # Per-rerun profiler (?profile=1); off unless EVCP_PROFILING=1, as anyone could trigger it
+    PROFILING_ENABLED = os.environ.get("EVCP_PROFILING", "0") == "1"
+    PROFILE_INTERVAL_S = 0.002
+
 
+# ============================================================================
+# TARIFF & VEHICLE CATALOGUES
+# ============================================================================
 
-VEHICLE_DATABASE = pd.DataFrame([
-    {"model": "Tesla Model Y Long Range", "battery_kwh": 75.0, "max_dc_kw": 250, "category": "Premium SUV"},
-    {"model": "Tesla Model 3 Long Range", "battery_kwh": 75.0, "max_dc_kw": 250, "category": "Premium Sedan"},
-    {"model": "Audi Q4 e-tron 77", "battery_kwh": 77.0, "max_dc_kw": 135, "category": "Premium SUV"},
-    {"model": "Audi Q6 e-tron", "battery_kwh": 94.9, "max_dc_kw": 270, "category": "Premium SUV"},
-    {"model": "Ford Explorer Extended Range", "battery_kwh": 79.0, "max_dc_kw": 185, "category": "SUV"},
-    {"model": "BMW i4 eDrive40", "battery_kwh": 81.3, "max_dc_kw": 205, "category": "Premium Sedan"},
-    {"model": "Skoda Enyaq 85", "battery_kwh": 82.0, "max_dc_kw": 175, "category": "SUV"},
-    {"model": "Kia EV3 Long Range", "battery_kwh": 81.4, "max_dc_kw": 135, "category": "SUV"},
-    {"model": "Skoda Elroq 85", "battery_kwh": 82.0, "max_dc_kw": 175, "category": "SUV"},
-    {"model": "Volvo EX30 Extended Range", "battery_kwh": 69.0, "max_dc_kw": 153, "category": "Compact SUV"},
-    {"model": "MG4 Long Range", "battery_kwh": 77.0, "max_dc_kw": 144, "category": "Hatchback"},
-    {"model": "Hyundai Kona Electric 65", "battery_kwh": 65.4, "max_dc_kw": 102, "category": "Compact SUV"},
-    {"model": "VW ID.4 Pro", "battery_kwh": 77.0, "max_dc_kw": 175, "category": "SUV"},
-    {"model": "Nissan Ariya 87", "battery_kwh": 87.0, "max_dc_kw": 130, "category": "SUV"},
-    {"model": "Kia EV6 Long Range", "battery_kwh": 84.0, "max_dc_kw": 235, "category": "SUV"},
-    {"model": "Hyundai IONIQ 5 Long Range", "battery_kwh": 84.0, "max_dc_kw": 235, "category": "SUV"},
-    {"model": "Mercedes EQA 350", "battery_kwh": 70.5, "max_dc_kw": 100, "category": "Premium SUV"},
-    {"model": "Polestar 2 Long Range", "battery_kwh": 82.0, "max_dc_kw": 205, "category": "Premium Sedan"},
-    {"model": "BYD Dolphin Comfort", "battery_kwh": 60.4, "max_dc_kw": 88, "category": "Hatchback"},
-    {"model": "Vauxhall Corsa Electric", "battery_kwh": 51.0, "max_dc_kw": 100, "category": "Hatchback"},
-    {"model": "Custom Vehicle", "battery_kwh": 80.0, "max_dc_kw": 150, "category": "Custom"},
+# data/tariffs.json: {"version", "providers", "operator_tariffs", "direct_tariffs"}
+#   providers: name → {"energy", "time", "currency", "default_kw", "type", "category", "network"}
+#   plus optional rules evaluated by the compiled tariff engine:
+#   "session_fee": flat fee per session
+#   "energy_windows": [{"start": "HH:MM", "end": "HH:MM", "energy": price}] time-of-day
+#       energy prices replacing "energy" inside the window (may wrap past midnight)
+#   "energy_tiers": [{"from_kwh": kwh, "energy_delta": delta}] per-kWh adjustment once
+#       the session has delivered more than from_kwh
+#   "time_grace_min": minutes before the per-minute "time" price starts
+#   "idle_fee", "idle_grace_min", "idle_fee_cap": per-minute overstay fee after charging
+#       completes, after a grace period, optionally capped per session
+#   operator_tariffs: operator name fragment → all tariffs/cards usable there (host + roaming)
+# data/vehicles.json: {"version", "vehicles": [{"model", "battery_kwh", "max_dc_kw", "category"}]}
+
+PRICE_DTYPE = np.dtype([
+    ("energy", np.float64),
+    ("time", np.float64),
+    ("session_fee", np.float64),
+    ("default_kw", np.float64),
 ])
+REQUIRED_PROVIDER_KEYS = ("energy", "time", "currency", "default_kw", "type")
+REQUIRED_VEHICLE_KEYS = ("model", "battery_kwh", "max_dc_kw", "category")
 
-CHARGING_PROVIDERS: Dict[str, Dict] = {
-    # UK / roaming
-    "MFG EV Power": {
-        "energy": 0.79, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "Regional"
-    },
-    "EVYVE Charging Stations": {
-        "energy": 0.80, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "Regional"
-    },
-    "Osprey Charging (App)": {
-        "energy": 0.82, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "National"
-    },
-    "Osprey Charging (Contactless)": {
-        "energy": 0.87, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "National"
-    },
-    "Shell Recharge UK": {
-        "energy": 0.79, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "National"
-    },
-    "Electroverse": {
-        "energy": 0.80, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Roaming", "network": "Multi-Network"
-    },
-    "Zapmap Zap-Pay": {
-        "energy": 0.80, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Roaming", "network": "Multi-Network"
-    },
-    "Plugsurfing": {
-        "energy": 0.80, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Roaming", "network": "Multi-Network"
-    },
-    "BP Pulse PAYG": {
-        "energy": 0.87, "time": 0.00, "currency": "GBP", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "National"
-    },
-    "Pod Point": {
-        "energy": 0.69, "time": 0.00, "currency": "GBP", "default_kw": 75,
-        "type": "public", "category": "Fast", "network": "National"
-    },
-    # European / roaming
-    "IZIVIA Pass": {
-        "energy": 0.75, "time": 0.00, "currency": "EUR", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "European"
-    },
-    "Electra+": {
-        "energy": 0.49, "time": 0.00, "currency": "EUR", "default_kw": 150,
-        "type": "public", "category": "Rapid", "network": "European"
-    },
-    "Freshmile": {
-        "energy": 0.25, "time": 0.05, "currency": "EUR", "default_kw": 50,
-        "type": "public", "category": "Fast", "network": "European"
-    },
-    "Ionity": {
-        "energy": 0.69, "time": 0.00, "currency": "EUR", "default_kw": 350,
-        "type": "public", "category": "Ultra-rapid", "network": "European"
-    },
-    # Home
-    "Home - Octopus Intelligent": {
-        "energy": 0.08, "time": 0.00, "currency": "GBP", "default_kw": 7,
-        "type": "home", "category": "Home", "network": "Domestic"
-    },
-    "Home - E.ON Drive": {
-        "energy": 0.09, "time": 0.00, "currency": "GBP", "default_kw": 7,
-        "type": "home", "category": "Home", "network": "Domestic"
-    },
-    "Home - EDF Standard": {
-        "energy": 0.10, "time": 0.00, "currency": "GBP", "default_kw": 7,
-        "type": "home", "category": "Home", "network": "Domestic"
-    },
-}
 
-# Operator → all tariffs/cards that can be used there (host + roaming)
-OPERATOR_TARIFFS = {
-    "shell": ["Shell Recharge UK", "Electroverse", "Freshmile"],
-    "bp pulse": ["BP Pulse PAYG", "Electroverse"],
-    "bp pulse payg": ["BP Pulse PAYG", "Electroverse"],
-    "osprey": ["Osprey Charging (App)", "Electroverse"],
-    "pod point": ["Pod Point", "Electroverse"],
-    "evyve": ["EVYVE Charging Stations", "Electroverse"],
-    "mfg ev power": ["MFG EV Power", "Electroverse"],
-    "ionity": ["Ionity", "Electroverse", "Freshmile"],
-}
+class CatalogueError(ValueError):
+    """A tariff or vehicle data file is missing, malformed or inconsistent."""
+
+
+@dataclass(frozen=True, eq=False)
+class Catalogue:
+    """One version of the tariff and vehicle data, compiled for fast lookups.
+
+    Instances are never mutated; a reload builds a new one and swaps it in.
+    """
+    tariff_version: str
+    vehicle_version: str
+    providers: Dict[str, Dict]
+    operator_tariffs: Dict[str, List[str]]
+    direct_tariffs: Set[str]
+    vehicles: pd.DataFrame
+    provider_index: Dict[str, int]
+    prices: np.ndarray  # PRICE_DTYPE, one row per provider
+    operator_needles: Tuple[Tuple[str, Tuple[str, ...]], ...]
+    vehicles_by_model: Dict[str, Dict]
+
+    @property
+    def version(self) -> str:
+        return f"tariffs {self.tariff_version} • vehicles {self.vehicle_version}"
+
+    def provider_prices(self, names) -> np.ndarray:
+        return self.prices[[self.provider_index[name] for name in names]]
+
+
+def _read_catalogue_file(path: str, key: str) -> Dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise CatalogueError(f"{os.path.basename(path)}: {e}") from e
+    if not isinstance(data, dict) or not data.get("version") or key not in data:
+        raise CatalogueError(f"{os.path.basename(path)}: needs 'version' and '{key}'")
+    return data
+
+
+def _clock_minutes(hhmm: str) -> float:
+    hours, minutes = (int(part) for part in hhmm.split(":"))
+    if not (0 <= hours <= 24 and 0 <= minutes < 60):
+        raise ValueError(f"{hhmm!r} is not a time of day")
+    return float(hours * 60 + minutes) % 1440.0
+
+
+def _number(value, what: str, minimum: Optional[float] = 0.0) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        raise CatalogueError(f"{what} must be a number, got {value!r}")
+    if minimum is not None and value < minimum:
+        raise CatalogueError(f"{what} must be at least {minimum:g}, got {value!r}")
+    return float(value)
+
+
+def _check_provider(name: str, preset: Dict) -> None:
+    """Reject a provider the compiled tariff engine could not use."""
+    missing = [k for k in REQUIRED_PROVIDER_KEYS if k not in preset]
+    if missing:
+        raise CatalogueError(f"provider '{name}' is missing {', '.join(missing)}")
+    for key in ("energy", "time", "session_fee", "time_grace_min", "idle_fee", "idle_grace_min", "idle_fee_cap"):
+        if key in preset:
+            _number(preset[key], f"provider '{name}' {key}")
+    if _number(preset["default_kw"], f"provider '{name}' default_kw") <= 0:
+        raise CatalogueError(f"provider '{name}' default_kw must be positive")
+    for key in ("currency", "type"):
+        if not isinstance(preset[key], str):
+            raise CatalogueError(f"provider '{name}' {key} must be a string")
+    for i, window in enumerate(preset.get("energy_windows", [])):
+        what = f"provider '{name}' energy_windows[{i}]"
+        try:
+            _clock_minutes(window["start"])
+            _clock_minutes(window["end"])
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            raise CatalogueError(f"{what} needs HH:MM 'start' and 'end' ({e})") from e
+        _number(window.get("energy"), f"{what} energy")
+    for i, tier in enumerate(preset.get("energy_tiers", [])):
+        what = f"provider '{name}' energy_tiers[{i}]"
+        if not isinstance(tier, dict):
+            raise CatalogueError(f"{what} must be an object")
+        _number(tier.get("from_kwh"), f"{what} from_kwh")
+        _number(tier.get("energy_delta"), f"{what} energy_delta", minimum=None)
+
+
+def _check_vehicle(row: Dict) -> None:
+    missing = [k for k in REQUIRED_VEHICLE_KEYS if k not in row]
+    if missing:
+        raise CatalogueError(f"vehicle {row.get('model', '?')!r} is missing {', '.join(missing)}")
+    for key in ("battery_kwh", "max_dc_kw"):
+        if _number(row[key], f"vehicle {row['model']!r} {key}") <= 0:
+            raise CatalogueError(f"vehicle {row['model']!r} {key} must be positive")
+
+
+def load_catalogue(data_dir: str) -> Catalogue:
+    """Read and validate the data files; every problem is raised as CatalogueError."""
+    tariffs = _read_catalogue_file(os.path.join(data_dir, "tariffs.json"), "providers")
+    vehicles = _read_catalogue_file(os.path.join(data_dir, "vehicles.json"), "vehicles")
+    try:
+        return _build_catalogue(tariffs, vehicles)
+    except CatalogueError:
+        raise
+    except Exception as e:
+        raise CatalogueError(f"malformed catalogue data: {type(e).__name__}: {e}") from e
+
+
+def _build_catalogue(tariffs: Dict, vehicles: Dict) -> Catalogue:
+    providers: Dict[str, Dict] = tariffs["providers"]
+    if not isinstance(providers, dict):
+        raise CatalogueError("tariffs.json 'providers' must be an object")
+    for name, preset in providers.items():
+        if not isinstance(preset, dict):
+            raise CatalogueError(f"provider '{name}' must be an object")
+        _check_provider(name, preset)
+    operator_tariffs: Dict[str, List[str]] = tariffs.get("operator_tariffs", {})
+    unknown = {t for names in operator_tariffs.values() for t in names} - set(providers)
+    unknown |= set(tariffs.get("direct_tariffs", [])) - set(providers)
+    if unknown:
+        raise CatalogueError(f"unknown tariffs referenced: {', '.join(sorted(unknown))}")
+
+    vehicle_rows = vehicles["vehicles"]
+    for row in vehicle_rows:
+        if not isinstance(row, dict):
+            raise CatalogueError(f"vehicle entries must be objects, got {row!r}")
+        _check_vehicle(row)
+    if not vehicle_rows:
+        raise CatalogueError("vehicles.json lists no vehicles")
+
+    prices = np.array([
+        (p["energy"], p["time"], p.get("session_fee", 0.0), p["default_kw"]) for p in providers.values()
+    ], dtype=PRICE_DTYPE)
+    return Catalogue(
+        tariff_version=str(tariffs["version"]),
+        vehicle_version=str(vehicles["version"]),
+        providers=providers,
+        operator_tariffs=operator_tariffs,
+        direct_tariffs=set(tariffs.get("direct_tariffs", [])),
+        vehicles=pd.DataFrame(vehicle_rows),
+        provider_index={name: i for i, name in enumerate(providers)},
+        prices=prices,
+        operator_needles=tuple((needle.lower(), tuple(names)) for needle, names in operator_tariffs.items()),
+        vehicles_by_model={row["model"]: row for row in vehicle_rows},
+    )
+
+
+def _install_catalogue(catalogue: Catalogue) -> None:
+    """Make catalogue current. Readers holding the previous one keep a consistent view."""
+    global CATALOGUE, CHARGING_PROVIDERS, OPERATOR_TARIFFS, DIRECT_TARIFFS, VEHICLE_DATABASE
+    previous = globals().get("CATALOGUE")
+    CATALOGUE = catalogue
+    CHARGING_PROVIDERS = catalogue.providers
+    OPERATOR_TARIFFS = catalogue.operator_tariffs
+    DIRECT_TARIFFS = catalogue.direct_tariffs
+    VEHICLE_DATABASE = catalogue.vehicles
+    if previous is not None:
+        invalidate_catalogue_caches(previous, catalogue)
+
+
+def _catalogue_stamp(data_dir: str) -> Tuple:
+    stamp = []
+    for name in ("tariffs.json", "vehicles.json"):
+        try:
+            st_ = os.stat(os.path.join(data_dir, name))
+            stamp.append((st_.st_mtime_ns, st_.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+_catalogue_lock = threading.Lock()
+_catalogue_state: Dict[str, object] = {"stamp": None, "checked_at": float("-inf"), "error": None}
+
+
+def reload_catalogue(force: bool = False) -> bool:
+    """Swap in new catalogue data if a data file changed; True when one was installed.
+
+    Checks at most every Config.CATALOGUE_POLL_SECONDS and only one thread
+    checks at a time; everyone else carries on with the current catalogue, so a
+    reload never stalls requests. A file that fails to load leaves the current
+    catalogue in place (see catalogue_error) until the file changes again.
+    Write data files to a temporary name and rename them over the old ones.
+    """
+    now = time.monotonic()
+    if not force and now - _catalogue_state["checked_at"] < Config.CATALOGUE_POLL_SECONDS:
+        return False
+    if not _catalogue_lock.acquire(blocking=False):
+        return False
+    try:
+        _catalogue_state["checked_at"] = now
+        stamp = _catalogue_stamp(Config.DATA_DIR)
+        if stamp == _catalogue_state["stamp"] and not force:
+            return False
+        _catalogue_state["stamp"] = stamp
+        try:
+            catalogue = load_catalogue(Config.DATA_DIR)
+            # Compile before swapping, so a tariff the engine rejects never goes live.
+            try:
+                compile_presets(tuple(catalogue.providers), list(catalogue.providers.values()))
+            except Exception as e:
+                raise CatalogueError(f"tariffs do not compile: {type(e).__name__}: {e}") from e
+        except CatalogueError as e:
+            _catalogue_state["error"] = str(e)
+            return False
+        _catalogue_state["error"] = None
+        _install_catalogue(catalogue)
+        return True
+    finally:
+        _catalogue_lock.release()
+
+
+def catalogue_error() -> Optional[str]:
+    """Why the latest data files were rejected, if they were."""
+    return _catalogue_state["error"]
+
+
+def current_catalogue() -> Catalogue:
+    return CATALOGUE
+
+
+_catalogue_state["stamp"] = _catalogue_stamp(Config.DATA_DIR)
+_catalogue_state["checked_at"] = time.monotonic()
+_install_catalogue(load_catalogue(Config.DATA_DIR))
+
+
+def get_secret(name: str) -> Optional[str]:
+    """Environment variable first, then Streamlit secrets (absent outside `streamlit run`)."""
+    value = os.environ.get(name)
+    if value:
+        return value
+    try:
+        return st.secrets.get(name)
+    except Exception:  # no secrets.toml
+        return None
+
+
+OCM_API_KEY = get_secret("OCM_API_KEY")
+
+# ============================================================================
+# CACHING
+# ============================================================================
+
+class BoundedCache:
+    """Thread-safe LRU cache with a byte quota, an entry cap and a TTL.
+
+    Values are shared between callers, not copied, so treat them as read-only.
+    Expired entries count as misses but stay until evicted, so get_stale() can
+    still serve them while their upstream is down. With a partition function,
+    partition_version(part) changes only when entries in that part do.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        upstream: Optional[str] = None,
+        partition: Optional[Callable[[Hashable], Hashable]] = None,
+    ):
+        self.name = name
+        self.upstream = upstream
+        self.partition = partition
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[object, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.version = 0  # bumped whenever the set of cached entries changes
+        self._partition_versions: Dict[Hashable, int] = {}
+        self.hits = self.misses = self.evictions = self.expirations = self.rejections = 0
+        self.shared_hits = self.coalesced = self.stale_serves = 0
+        self.stale_served_at = 0.0
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def get(self, key: Hashable) -> Tuple[bool, object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def get_stale(self, key: Hashable) -> Tuple[bool, object]:
+        """Cached value for key even if expired (the last good response); counted as a stale serve."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            self.stale_serves += 1
+            self.stale_served_at = time.monotonic()
+            return True, entry[0]
+
+    def put(self, key: Hashable, value: object, ttl: Optional[float] = None, shared_hit: bool = False) -> None:
+        """Store value; ttl overrides the cache TTL, e.g. with the time left on a shared entry."""
+        size = estimate_size(value)
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else float("inf")
+        with self._lock:
+            self.shared_hits += shared_hit
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                self.rejections += 1
+                return
+            self._entries[key] = (value, size, expires_at)
+            self.bytes += size
+            self._bump(key)
+            while self.bytes > self.max_bytes or (
+                self.max_entries is not None and len(self._entries) > self.max_entries
+            ):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def load(self, key: Hashable, loader: Callable[[], object]) -> object:
+        """Single-flight miss path: the first caller for key runs loader, which is
+        expected to put() its result; concurrent callers for the same key wait for
+        that result instead of each calling upstream. Errors propagate to all of them.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                entry = self._entries.get(key)
+                if entry is not None and entry[2] >= time.monotonic():
+                    return entry[0]  # a leader finished between our get() and now
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            value = loader()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def time_left(self, key: Hashable) -> float:
+        """Seconds until key expires (0 when absent); not counted as a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return max(entry[2] - time.monotonic(), 0.0) if entry is not None else 0.0
+
+    def values(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> List[object]:
+        """Snapshot of all unexpired cached values, optionally only those whose key matches predicate."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                value for key, (value, _, expires_at) in self._entries.items()
+                if expires_at >= now and (predicate is None or predicate(key))
+            ]
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate; returns how many went."""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                self._drop(key)
+            return len(stale)
+
+    def partition_version(self, part: Hashable) -> int:
+        with self._lock:
+            return self._partition_versions.get(part, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.version += 1
+            for part in self._partition_versions:
+                self._partition_versions[part] += 1
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+        self._bump(key)
+
+    def _bump(self, key: Hashable) -> None:
+        self.version += 1
+        if self.partition is not None:
+            part = self.partition(key)
+            self._partition_versions[part] = self._partition_versions.get(part, 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache": self.name,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejections": self.rejections,
+                "shared_hits": self.shared_hits,
+                "coalesced": self.coalesced,
+                "stale_serves": self.stale_serves,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def _process_resources() -> Dict[str, object]:
+    return {"lock": threading.Lock(), "objects": {}}
+
+
+def process_resource(name: str, factory: Callable[[], object]) -> object:
+    """The object registered under name for this server process, made by factory on first use.
+
+    When Streamlit runs this file as the script it re-executes it on every
+    rerun; objects kept here (in st.cache_resource) survive that, so caches
+    stay warm and pools are created once.
+    """
+    resources = _process_resources()
+    with resources["lock"]:
+        objects = resources["objects"]
+        if name not in objects:
+            objects[name] = factory()
+        return objects[name]
+
+
+CACHES: Dict[str, BoundedCache] = process_resource("caches", dict)
+
+
+def estimate_size(value: object) -> int:
+    """Approximate memory footprint of a cached value, in bytes."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def dumps_compact(value: object) -> bytes:
+    """Pickle, zlib-compressing anything over 1 KiB; the first byte says which."""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) >= 1024:
+        return b"z" + zlib.compress(data, 1)
+    return b"p" + data
+
+
+def loads_compact(blob: bytes) -> object:
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return pickle.loads(data)
+
+
+class SharedCacheStore(ABC):
+    """Backend interface for caches shared between processes.
+
+    Keys and values are bytes; expires_at is wall-clock time (None never expires).
+    Failures must read as misses so a broken store never breaks a request.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        ...
+
+    @abstractmethod
+    def put(self, namespace: str, key: bytes, value: bytes, expires_at: Optional[float]) -> None:
+        ...
 
-DIRECT_TARIFFS: Set[str] = {
-    "MFG EV Power",
-    "EVYVE Charging Stations",
-    "Osprey Charging (App)",
-    "Osprey Charging (Contactless)",
-    "Shell Recharge UK",
-    "BP Pulse PAYG",
-    "Pod Point",
-    "Ionity",
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        ...
+
+    def stats(self) -> Dict[str, object]:
+        return {}
+
+
+class SQLiteCacheStore(SharedCacheStore):
+    """SharedCacheStore in one SQLite file in WAL mode.
+
+    Readers never block the single writer, and every thread gets its own
+    connection. Expired rows are pruned every prune_every writes; past
+    max_bytes the oldest quarter of the rows goes as well.
+    """
+
+    def __init__(self, path: str, max_bytes: int = Config.SHARED_CACHE_MAX_BYTES, prune_every: int = 512):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.writes = self.errors = 0
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " namespace TEXT NOT NULL, key BLOB NOT NULL, value BLOB NOT NULL,"
+            " expires_at REAL, written_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, namespace: str, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            self._count("errors")
+            return None
+        self._count("hits" if row else "misses")
+        return row
+
+    def put(self, namespace: str, key: bytes, value: bytes, expires_at: Optional[float]) -> None:
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, expires_at, time.time()),
+            )
+            self._count("writes")
+            if self.writes % self.prune_every == 0:
+                self._prune(conn)
+        except sqlite3.Error:
+            self._count("errors")
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        (total,) = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()
+        if total > self.max_bytes:
+            conn.execute(
+                "DELETE FROM entries WHERE (namespace, key) IN ("
+                " SELECT namespace, key FROM entries ORDER BY written_at"
+                " LIMIT (SELECT COUNT(*) / 4 + 1 FROM entries))"
+            )
+
+    def clear(self, namespace: str) -> None:
+        try:
+            self._connect().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+        except sqlite3.Error:
+            self._count("errors")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "errors": self.errors,
+            }
+
+
+def check_private_store_path(path: str) -> None:
+    """Raise PermissionError unless only this user can write path and its directory.
+
+    Entries are pickles, so anyone able to write the store could run code in
+    every worker that reads it. The directory is created 0700 if missing; an
+    existing one, and any existing database, WAL or SHM file, must be owned by
+    us with no group or other access, and must not be symlinks.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    for candidate in (directory, path, f"{path}-wal", f"{path}-shm"):
+        try:
+            info = os.lstat(candidate)
+        except FileNotFoundError:
+            continue
+        if stat.S_ISLNK(info.st_mode):
+            raise PermissionError(f"{candidate} is a symlink")
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"{candidate} is owned by uid {info.st_uid}, not {os.getuid()}")
+        if info.st_mode & 0o077:
+            raise PermissionError(f"{candidate} is accessible to other users (mode {info.st_mode & 0o777:o})")
+
+
+def open_shared_store(path: Optional[str]) -> Optional[SharedCacheStore]:
+    if not path:
+        return None
+    try:
+        check_private_store_path(path)
+        # SQLite gives the WAL and SHM files the database file's mode.
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600))
+        return SQLiteCacheStore(path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("shared cache disabled, %s: %s", path, e)
+        return None
+
+
+SHARED_CACHE_STORE: Optional[SharedCacheStore] = open_shared_store(Config.SHARED_CACHE_PATH)
+
+
+def bounded_cache(
+    ttl: Optional[float] = None,
+    name: Optional[str] = None,
+    shared: bool = False,
+    upstream: Optional[str] = None,
+    fallback: Optional[Callable] = None,
+    mark_stale: Optional[Callable[[object], object]] = None,
+    partition: Optional[str] = None,
+):
+    """Memoize a function in a BoundedCache sized from Config.CACHE_QUOTAS.
+
+    As with st.cache_data, parameters whose names start with an underscore are
+    left out of the cache key. With shared=True, misses fall through to
+    SHARED_CACHE_STORE (when configured) before calling the function, so every
+    worker process on the host reuses each other's results. Concurrent misses
+    for the same key share one call (see BoundedCache.load).
+
+    When the function raises UpstreamUnavailable the last good value for the
+    key is returned instead, even if expired, passed through mark_stale if
+    given; with nothing cached, fallback(*args, **kwargs) is returned uncached,
+    or the error propagates when there is no fallback. upstream names the
+    UPSTREAMS entry the function calls, for the stale-data banner. partition
+    names a parameter whose value partitions the cache (see
+    BoundedCache.partition_version).
+    """
+    def decorator(func):
+        cache_name = name or func.__name__
+        max_bytes, max_entries = Config.CACHE_QUOTAS.get(cache_name, (8 * 2**20, None))
+        part_of = (lambda key: dict(key)[partition]) if partition else None
+        cache = CACHES[cache_name] = process_resource(
+            f"cache:{cache_name}",
+            lambda: BoundedCache(cache_name, max_bytes, max_entries, ttl, upstream, part_of),
+        )
+        signature = inspect.signature(func)
+
+        def shared_get(key: Hashable) -> Tuple[bool, object]:
+            store = SHARED_CACHE_STORE
+            if store is None:
+                return False, None
+            found = store.get(cache_name, _shared_key(key))
+            if found is None:
+                return False, None
+            blob, expires_at = found
+            try:
+                value = loads_compact(blob)
+            except Exception:
+                return False, None
+            cache.put(key, value, ttl=expires_at - time.time() if expires_at else None, shared_hit=True)
+            return True, value
+
+        def shared_put(key: Hashable, value: object) -> None:
+            store = SHARED_CACHE_STORE
+            if store is not None:
+                store.put(cache_name, _shared_key(key), dumps_compact(value), time.time() + ttl if ttl else None)
+
+        def make_key(args, kwargs) -> Hashable:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(
+                (arg, value) for arg, value in bound.arguments.items() if not arg.startswith("_")
+            )
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            hit, value = cache.get(key)
+            if hit:
+                return value
+
+            def load():
+                if shared:
+                    hit, value = shared_get(key)
+                    if hit:
+                        return value
+                try:
+                    value = func(*args, **kwargs)
+                except UpstreamUnavailable:
+                    found, value = cache.get_stale(key)
+                    if found:
+                        return mark_stale(value) if mark_stale is not None else value
+                    if fallback is None:
+                        raise
+                    return fallback(*args, **kwargs)
+                cache.put(key, value)
+                if shared:
+                    shared_put(key, value)
+                return value
+
+            return cache.load(key, load)
+
+        def refresh(*args, **kwargs):
+            """Call through and re-cache, whatever is cached now (used by the warm-up job)."""
+            key = make_key(args, kwargs)
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+            if shared:
+                shared_put(key, value)
+            return value
+
+        def time_left(*args, **kwargs) -> float:
+            return cache.time_left(make_key(args, kwargs))
+
+        def clear() -> None:
+            cache.clear()
+            if shared and SHARED_CACHE_STORE is not None:
+                SHARED_CACHE_STORE.clear(cache_name)
+
+        wrapper.cache = cache
+        wrapper.refresh = refresh
+        wrapper.time_left = time_left
+        wrapper.clear = clear
+        return wrapper
+
+    return decorator
+
+
+def _shared_key(key: Hashable) -> bytes:
+    """Fixed-size digest of a cache key, stable across processes."""
+    return hashlib.blake2b(pickle.dumps(key, protocol=4), digest_size=16).digest()
+
+
+def cache_stats() -> pd.DataFrame:
+    return pd.DataFrame([cache.stats() for cache in CACHES.values()])
+
+# ============================================================================
+# ASYNC I/O
+# ============================================================================
+
+class AsyncIOEngine:
+    """Event loop on a background thread for overlapping independent network calls.
+
+    Blocking helpers (requests, geopy) run in a bounded thread pool via call();
+    run() and submit() are the sync facade used from Streamlit reruns.
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="evcp-io")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(self._executor)
+                threading.Thread(target=loop.run_forever, name="evcp-io-loop", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    async def call(self, func, *args, **kwargs):
+        """Await a blocking function on the I/O thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def submit_call(self, func, *args, **kwargs) -> Future:
+        return self._executor.submit(func, *args, **kwargs)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        return self.submit(coro).result(timeout)
+
+
+# One loop thread and pool per process, however often the script is re-executed
+IO_ENGINE: AsyncIOEngine = process_resource("io_engine", lambda: AsyncIOEngine(Config.IO_MAX_WORKERS))
+
+# ============================================================================
+# UPSTREAM CALLS
+# ============================================================================
+
+class UpstreamUnavailable(Exception):
+    """An upstream API failed, timed out, or its circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, bursts of up to capacity."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """Take a token now; returns how many seconds to wait before using it.
+
+        With max_wait, no token is taken (and None returned) when the wait would be longer.
+        """
+        with self._lock:
+            self._refill()
+            wait_s = max((1.0 - self._tokens) / self.rate, 0.0)
+            if max_wait is not None and wait_s > max_wait:
+                return None
+            self._tokens -= 1.0
+            return wait_s
+
+    def try_take(self) -> bool:
+        """Take a token only if one is available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a token; False, with none taken, if that would take longer than timeout."""
+        wait_s = self.reserve(timeout)
+        if wait_s is None:
+            return False
+        time.sleep(wait_s)
+        return True
+
+
+# Attempts run here so a slow one can be hedged; sized for two attempts per slot
+UPSTREAM_POOL: ThreadPoolExecutor = process_resource(
+    "upstream_pool",
+    lambda: ThreadPoolExecutor(
+        max_workers=2 * sum(n for n, _, _ in Config.UPSTREAM_LIMITS.values()), thread_name_prefix="evcp-io-upstream"
+    ),
+)
+
+
+class UpstreamLimiter:
+    """Every call to one upstream API: concurrency cap, rate limit, circuit breaker, hedging.
+
+    - At most max_concurrent calls run at once, paced by a token bucket, so
+      callers over the limit wait instead of drawing 429s.
+    - After Config.BREAKER_FAILURES consecutive failures (errors, timeouts,
+      429/5xx) the breaker opens and calls fail fast with UpstreamUnavailable
+      for Config.BREAKER_OPEN_S; then one probe call is let through.
+    - Once enough latencies are known, an attempt still running after the
+      learned Config.HEDGE_QUANTILE latency is hedged with a duplicate, if the
+      rate limit has a token spare, and the first success wins. The slot is
+      held until every attempt has finished, so an abandoned attempt still
+      counts against max_concurrent while it runs.
+    - A call that cannot get a slot and a token within its timeout fails with
+      UpstreamUnavailable (counted as saturated) instead of queueing forever.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, rate: float, burst: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.bucket = TokenBucket(rate, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._latencies: "deque[float]" = deque(maxlen=Config.HEDGE_WINDOW)
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._failures = 0
+        self.in_flight = self.peak_in_flight = self.calls = 0
+        self.errors = self.trips = self.rejected = self.saturated = self.hedges = self.hedge_wins = 0
+        self.waited_s = 0.0
+
+    def __enter__(self) -> "UpstreamLimiter":
+        self.acquire(Config.UPSTREAM_QUEUE_TIMEOUT_S)
+        return self
+
+    def acquire(self, timeout: float) -> None:
+        """Take a slot and a rate-limit token, waiting at most timeout seconds in all."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            self._saturated()
+        if not self.bucket.acquire(max(started + timeout - time.monotonic(), 0.0)):
+            self._slots.release()
+            self._saturated()
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.waited_s += time.monotonic() - started
+
+    def _saturated(self) -> None:
+        with self._lock:
+            self.saturated += 1
+        raise UpstreamUnavailable(f"{self.name}: saturated, no slot free in time")
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+        return False
+
+    def _exit_when_done(self, attempts: List[Future]) -> None:
+        """Leave the slot once every attempt has finished, losers and timed-out ones included."""
+        if not attempts:
+            self.__exit__()
+            return
+        remaining = [len(attempts)]
+        lock = threading.Lock()
+
+        def finished(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self.__exit__()
+
+        for future in attempts:
+            future.add_done_callback(finished)
+
+    def _allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() >= self._opened_at + Config.BREAKER_OPEN_S:
+                self.state = "half-open"  # this caller is the probe
+                return True
+            self.rejected += 1
+            return False
+
+    def _record(self, ok: bool, latency: float = 0.0) -> None:
+        with self._lock:
+            if ok:
+                self._failures = 0
+                self.state = "closed"
+                self._latencies.append(latency)
+                return
+            self._failures += 1
+            self.errors += 1
+            if self.state == "half-open" or self._failures >= Config.BREAKER_FAILURES:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def hedge_delay(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < Config.HEDGE_MIN_SAMPLES:
+                return None
+            latencies = np.fromiter(self._latencies, dtype=np.float64)
+        return max(float(np.quantile(latencies, Config.HEDGE_QUANTILE)), Config.HEDGE_MIN_DELAY_S)
+
+    def call(self, attempt: Callable[[], object], timeout: float) -> object:
+        """Run attempt() under the limits; raises UpstreamUnavailable on failure or timeout."""
+        if not self._allow():
+            raise UpstreamUnavailable(f"{self.name}: circuit open")
+        try:
+            self.acquire(timeout)
+        except UpstreamUnavailable:
+            with self._lock:
+                if self.state == "half-open":
+                    self.state = "open"  # the probe never ran; let the next caller probe
+            raise
+        attempts: List[Future] = []
+        try:
+            started = time.monotonic()
+            deadline = started + timeout
+            hedge_at = self.hedge_delay()
+            hedge_at = started + hedge_at if hedge_at is not None else None
+            attempts.append(UPSTREAM_POOL.submit(attempt))
+            pending = list(attempts)
+            primary = pending[0]
+            error: Optional[BaseException] = None
+            while pending:
+                now = time.monotonic()
+                until = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _ = wait(pending, timeout=max(until - now, 0.0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    if future.exception() is None:
+                        self._record(True, time.monotonic() - started)
+                        if future is not primary:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return future.result()
+                    error = future.exception()
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None  # at most one hedge per call
+                    if pending and self.bucket.try_take():
+                        with self._lock:
+                            self.hedges += 1
+                        attempts.append(UPSTREAM_POOL.submit(attempt))
+                        pending.append(attempts[-1])
+        finally:
+            self._exit_when_done(attempts)
+        self._record(False)
+        if error is None:
+            raise UpstreamUnavailable(f"{self.name}: no response within {timeout:.0f} s")
+        raise UpstreamUnavailable(f"{self.name}: {type(error).__name__}: {error}") from error
+
+    def request(self, method: str, url: str, timeout: float, **kwargs) -> requests.Response:
+        """HTTP call through call(); 429 and 5xx count as failures, other statuses are returned."""
+        send = getattr(requests, method)
+
+        def attempt() -> requests.Response:
+            response = send(url, timeout=timeout, **kwargs)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise UpstreamUnavailable(f"HTTP {response.status_code}")
+            return response
+
+        return self.call(attempt, timeout)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "upstream": self.name,
+                "state": self.state,
+                "calls": self.calls,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_concurrent": self.max_concurrent,
+                "rate_per_s": self.bucket.rate,
+                "mean_wait_ms": 1000.0 * self.waited_s / self.calls if self.calls else 0.0,
+                "p95_ms": 1000.0 * float(np.quantile(self._latencies, 0.95)) if self._latencies else 0.0,
+                "errors": self.errors,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "saturated": self.saturated,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+
+UPSTREAMS: Dict[str, UpstreamLimiter] = process_resource("upstreams", lambda: {
+    name: UpstreamLimiter(name, n, rate, burst) for name, (n, rate, burst) in Config.UPSTREAM_LIMITS.items()
+})
+UPSTREAM_TITLES = {
+    "ocm": "OpenChargeMap",
+    "ors_geocode": "OpenRouteService geocoding",
+    "ors_directions": "OpenRouteService directions",
+    "nominatim": "Nominatim postcode lookup",
+    "fx": "Frankfurter exchange rates",
 }
 
-OCM_API_KEY = st.secrets.get("OCM_API_KEY")
+
+def upstream_stats() -> pd.DataFrame:
+    return pd.DataFrame([limiter.stats() for limiter in UPSTREAMS.values()])
+
+
+def degraded_upstreams(within_s: float = 120.0) -> List[str]:
+    """Upstreams whose breaker is not closed, or whose caches served stale data recently."""
+    now = time.monotonic()
+    names = {name for name, limiter in UPSTREAMS.items() if limiter.state != "closed"}
+    names.update(
+        cache.upstream for cache in CACHES.values()
+        if cache.upstream and cache.stale_served_at and now - cache.stale_served_at < within_s
+    )
+    return [name for name in UPSTREAMS if name in names]
+
 
 # ============================================================================
 # HELPERS
@@ -162,7 +1248,7 @@ def infer_tariffs_for_operator(text: Optional[str]) -> List[str]:
         return []
     t = text.lower()
     candidates: List[str] = []
-    for needle, tariffs in OPERATOR_TARIFFS.items():
+    for needle, tariffs in CATALOGUE.operator_needles:
         if needle in t:
             candidates.extend(tariffs)
     seen: Set[str] = set()
@@ -174,53 +1260,318 @@ def infer_tariffs_for_operator(text: Optional[str]) -> List[str]:
     return result
 
 
-@st.cache_data(ttl=Config.CACHE_TTL)
+POI_DTYPE = np.dtype([
+    ("id", np.int64),
+    ("lat", np.float64),
+    ("lon", np.float64),
+    ("distance_km", np.float32),  # NaN when OCM gives no distance
+    ("power_kw", np.float32),     # first connection's PowerKW, NaN when unknown
+    ("operator", np.int32),       # index into ChargerSet.operators, -1 when unknown
+])
+
+
+def _as_float(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+def _effective_kw(power_kw: np.ndarray, car_max_kw: float, default_kw: float = 50.0) -> np.ndarray:
+    power = power_kw.astype(float)
+    return np.minimum(np.where(np.isnan(power), default_kw, power), float(car_max_kw))
+
+
+def _fallback_poi_id(lat: float, lon: float, operator: Optional[str]) -> int:
+    """Stable negative id for a POI OCM gave no ID, from its position and operator.
+
+    Negative so it never meets a real OCM id; the same site gets the same id in
+    every set, so unions still keep it once.
+    """
+    digest = hashlib.blake2b(f"{lat:.6f},{lon:.6f},{operator or ''}".encode(), digest_size=8).digest()
+    return -(int.from_bytes(digest, "big") >> 1) - 1
+
+
+class ChargerSet:
+    """OpenChargeMap POIs parsed into columns at the fetch boundary.
+
+    Numeric fields live in one structured array; operator names are interned
+    and stored once per set, so cached entries stay small.
+    """
+    __slots__ = ("records", "titles", "operators")
+
+    def __init__(
+        self,
+        records: np.ndarray,
+        titles: Tuple[Optional[str], ...],
+        operators: Tuple[str, ...],
+    ):
+        self.records = records
+        self.titles = titles
+        self.operators = operators
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def empty(cls) -> "ChargerSet":
+        return cls(np.empty(0, dtype=POI_DTYPE), (), ())
+
+    @classmethod
+    def from_ocm(cls, pois: list, operator_names: Dict[int, str]) -> "ChargerSet":
+        records = np.empty(len(pois), dtype=POI_DTYPE)
+        titles: List[Optional[str]] = []
+        operator_index: Dict[str, int] = {}
+        for i, poi in enumerate(pois):
+            addr = poi.get("AddressInfo") or {}
+            connections = poi.get("Connections") or []
+            operator = (poi.get("OperatorInfo") or {}).get("Title") or operator_names.get(poi.get("OperatorID"))
+            lat, lon = _as_float(addr.get("Latitude")), _as_float(addr.get("Longitude"))
+            records[i] = (
+                poi.get("ID") or _fallback_poi_id(lat, lon, operator),
+                lat,
+                lon,
+                _as_float(addr.get("Distance")),
+                _as_float(connections[0].get("PowerKW") if connections else None),
+                operator_index.setdefault(sys.intern(operator), len(operator_index)) if operator else -1,
+            )
+            titles.append(addr.get("Title"))
+        return cls(records, tuple(titles), tuple(operator_index))
+
+    def fingerprint(self) -> str:
+        """Digest of the set's contents: equal sets share it, whichever objects hold them."""
+        digest = hashlib.blake2b(self.records.tobytes(), digest_size=16)
+        digest.update(repr((self.titles, self.operators)).encode())
+        return digest.hexdigest()
+
+    def operator(self, i: int) -> Optional[str]:
+        idx = self.records["operator"][i]
+        return self.operators[idx] if idx >= 0 else None
+
+    def search_text(self, i: int) -> str:
+        return f"{self.operator(i) or ''} {self.titles[i] or ''}"
+
+    def effective_kw(self, car_max_kw: float, default_kw: float = 50.0) -> np.ndarray:
+        return _effective_kw(self.records["power_kw"], car_max_kw, default_kw)
+
+    @classmethod
+    def union(cls, sets: List["ChargerSet"]) -> "ChargerSet":
+        """All chargers from several sets, each OCM id kept once."""
+        sets = [c for c in sets if len(c)]
+        if not sets:
+            return cls.empty()
+        index: Dict[str, int] = {}
+        parts, titles = [], []
+        for c in sets:
+            remap = np.array([index.setdefault(name, len(index)) for name in c.operators] + [-1])
+            part = c.records.copy()
+            part["operator"] = remap[part["operator"]]
+            parts.append(part)
+            titles.extend(c.titles)
+        records = np.concatenate(parts)
+        _, first = np.unique(records["id"], return_index=True)
+        first.sort()
+        return cls(records[first], tuple(titles[i] for i in first), tuple(index))
+
+    def nearest(self, n: int) -> "ChargerSet":
+        """The n chargers with the smallest OCM distance (unknown distances last)."""
+        order = np.argsort(self.records["distance_km"], kind="stable")[:n]
+        return ChargerSet(self.records[order], tuple(self.titles[i] for i in order), self.operators)
+
+    def merge(self, other: "ChargerSet") -> Tuple["ChargerSet", np.ndarray]:
+        """Append chargers from other whose OCM id is new; return the result and new indices."""
+        is_new = ~np.isin(other.records["id"], self.records["id"])
+        if not is_new.any():
+            return self, np.empty(0, dtype=int)
+        index = {name: i for i, name in enumerate(self.operators)}
+        remap = np.array([index.setdefault(name, len(index)) for name in other.operators] + [-1])
+        added = other.records[is_new].copy()
+        added["operator"] = remap[added["operator"]]  # -1 (unknown) maps to the trailing -1
+        titles = self.titles + tuple(t for t, keep in zip(other.titles, is_new) if keep)
+        merged = ChargerSet(np.concatenate([self.records, added]), titles, tuple(index))
+        return merged, np.arange(len(self), len(merged))
+
+
+@bounded_cache(ttl=24 * 3600, shared=True, upstream="ocm", fallback=lambda: {})
+def fetch_ocm_operators() -> Dict[int, str]:
+    """OpenChargeMap operator ID → title, needed because compact POIs only carry IDs.
+
+    As with fetch_nearby_chargers, failures raise UpstreamUnavailable, so the
+    empty fallback is never cached for a day or written to the shared store.
+    """
+    if not OCM_API_KEY:
+        raise UpstreamUnavailable("ocm: no API key")
+    try:
+        resp = UPSTREAMS["ocm"].request(
+            "get",
+            f"{Config.OCM_BASE_URL}/v3/referencedata/",
+            headers={"X-API-Key": OCM_API_KEY},
+            timeout=Config.API_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return {
+            op["ID"]: sys.intern(op["Title"])
+            for op in resp.json().get("Operators", [])
+            if op.get("ID") is not None and op.get("Title")
+        }
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        raise UpstreamUnavailable(f"ocm: {type(e).__name__}: {e}") from e
+
+
+class CountryOutlines:
+    """Coarse country outlines (data/countries.json) as one flat array of edges.
+
+    Good to ~15 km, which is plenty to tell which OCM country partitions a
+    search circle reaches; the Channel, Irish Sea and Kattegat separate
+    countries that bounding boxes would overlap.
+    """
+
+    def __init__(self, rings: Dict[str, List[List[List[float]]]]):
+        self.codes = tuple(rings)
+        starts, ends, offsets = [], [], []
+        for code in self.codes:
+            offsets.append(sum(len(a) for a in starts))
+            for ring in rings[code]:
+                ring = np.asarray(ring, dtype=np.float64)
+                starts.append(ring)
+                ends.append(np.roll(ring, -1, axis=0))
+        self._start = np.concatenate(starts)
+        self._end = np.concatenate(ends)
+        self._offsets = np.asarray(offsets)
+
+    @classmethod
+    def load(cls, path: str, codes) -> "CountryOutlines":
+        with open(path, encoding="utf-8") as f:
+            rings = json.load(f)["countries"]
+        return cls({code: rings[code] for code in codes})
+
+    def distances_km(self, lat: float, lon: float) -> np.ndarray:
+        """Distance from a point to each country, 0 inside it; equirectangular around the point."""
+        scale = np.array([111.32 * np.cos(np.radians(lat)), 110.57])
+        a = (self._start - (lon, lat)) * scale
+        b = (self._end - (lon, lat)) * scale
+        d = b - a
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.clip(-(a * d).sum(axis=1) / (d * d).sum(axis=1), 0.0, 1.0)
+        t = np.nan_to_num(t)
+        edge_km = np.hypot(a[:, 0] + t * d[:, 0], a[:, 1] + t * d[:, 1])
+        # Even-odd rule: a ray east from the point crosses an odd number of edges when inside.
+        straddles = (a[:, 1] > 0) != (b[:, 1] > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = a[:, 0] - a[:, 1] * d[:, 0] / d[:, 1]
+        crossings = np.add.reduceat((straddles & (x_cross > 0)).astype(np.int64), self._offsets)
+        return np.where(crossings % 2 == 1, 0.0, np.minimum.reduceat(edge_km, self._offsets))
+
+
+COUNTRY_OUTLINES = CountryOutlines.load(Config.COUNTRY_OUTLINES_PATH, Config.CHARGER_COUNTRIES)
+
+
+def countries_near(lat: float, lon: float, radius_km: float = 0.0) -> Tuple[str, ...]:
+    """Countries in Config.CHARGER_COUNTRIES whose outline comes within radius_km of a point.
+
+    A point further than that from every outline (e.g. at sea, or on a small
+    island the outlines leave out) gets the nearest country, so a search
+    always has at least one partition to ask.
+    """
+    if not COUNTRY_OUTLINES.codes:
+        return ()
+    distances = COUNTRY_OUTLINES.distances_km(lat, lon)
+    found = tuple(code for code, km in zip(COUNTRY_OUTLINES.codes, distances) if km <= radius_km)
+    return found or (COUNTRY_OUTLINES.codes[int(np.argmin(distances))],)
+
+
+@bounded_cache(
+    ttl=Config.CACHE_TTL, shared=True, upstream="ocm", fallback=lambda *args, **kwargs: ChargerSet.empty(),
+    partition="country",
+)
 def fetch_nearby_chargers(
     lat: float,
     lon: float,
     distance_km: float = 10,
     max_results: int = 20,
-) -> list:
+    country: str = "GB",
+) -> ChargerSet:
+    """Chargers within distance_km of a point in one country; search_chargers spans borders.
+
+    Failures of any kind raise UpstreamUnavailable, so an empty answer is
+    never cached or written to the shared store in place of real chargers.
+    """
     if not OCM_API_KEY:
-        return []
-    url = "https://api.openchargemap.io/v3/poi/"
+        raise UpstreamUnavailable("ocm: no API key")
+    url = f"{Config.OCM_BASE_URL}/v3/poi/"
     params = {
         "output": "json",
-        "countrycode": "GB",
+        "countrycode": country,
         "latitude": lat,
         "longitude": lon,
         "distance": distance_km,
         "distanceunit": "KM",
         "maxresults": max_results,
-        "compact": False,
-        "verbose": True,
-        "includeoperatorinfo": True,
+        "compact": True,
+        "verbose": False,
     }
     try:
-        resp = requests.get(
+        resp = UPSTREAMS["ocm"].request(
+            "get",
             url,
             params=params,
             headers={"X-API-Key": OCM_API_KEY},
             timeout=Config.API_TIMEOUT,
         )
         resp.raise_for_status()
-        return resp.json()
-    except Exception:
-        return []
+        # Outside the slot: the operator lookup takes an OCM slot of its own
+        return ChargerSet.from_ocm(resp.json(), fetch_ocm_operators())
+    except UpstreamUnavailable:
+        raise  # the cache serves the last good result, if any
+    except Exception as e:
+        raise UpstreamUnavailable(f"ocm: {type(e).__name__}: {e}") from e
+
+
+# Further country partitions of a border search; the first is fetched in the caller's thread
+COUNTRY_POOL: ThreadPoolExecutor = process_resource(
+    "country_pool", lambda: ThreadPoolExecutor(max_workers=Config.IO_MAX_WORKERS, thread_name_prefix="evcp-io-country")
+)
+
+
+def search_chargers(lat: float, lon: float, distance_km: float = 10, max_results: int = 20) -> ChargerSet:
+    """The max_results nearest chargers within distance_km, across every country the circle reaches.
+
+    Each country is fetched and cached as its own partition, concurrently, so
+    a search in Kent only asks for GB (the Channel keeps France out of reach)
+    while one in Basel merges CH, DE and FR.
+    """
+    countries = countries_near(lat, lon, distance_km)
+    if not countries:
+        return ChargerSet.empty()
+    fetch = functools.partial(fetch_nearby_chargers, lat, lon, distance_km=distance_km, max_results=max_results)
+    pending = [COUNTRY_POOL.submit(fetch, country=country) for country in countries[1:]]
+    parts = [fetch(country=countries[0])] + [future.result() for future in pending]
+    if len(parts) == 1:
+        return parts[0]
+    return ChargerSet.union(parts).nearest(max_results)
+
+
+FALLBACK_EXCHANGE_RATES = {
+    "EUR": 1.0,
+    "GBP": 0.87,
+    "USD": 1.10,
+    "_date": "fallback",
+    "_status": "Using fallback rates"
+}
 
 
-@st.cache_data(ttl=Config.CACHE_TTL)
+def _stale_exchange_rates(rates: Dict) -> Dict:
+    return {**rates, "_status": f"Stale rates from {rates.get('_date', 'unknown')} (service unavailable)"}
+
+
+@bounded_cache(
+    ttl=Config.CACHE_TTL, upstream="fx", fallback=lambda: FALLBACK_EXCHANGE_RATES, mark_stale=_stale_exchange_rates
+)
 def fetch_exchange_rates() -> Dict[str, float]:
-    fallback_rates = {
-        "EUR": 1.0,
-        "GBP": 0.87,
-        "USD": 1.10,
-        "_date": "fallback",
-        "_status": "Using fallback rates"
-    }
+    fallback_rates = FALLBACK_EXCHANGE_RATES
     try:
-        response = requests.get(
-            "https://api.frankfurter.app/latest?from=EUR&to=GBP,USD",
+        response = UPSTREAMS["fx"].request(
+            "get",
+            f"{Config.FX_BASE_URL}/latest?from=EUR&to=GBP,USD",
             timeout=Config.API_TIMEOUT
         )
         response.raise_for_status()
@@ -233,11 +1584,17 @@ def fetch_exchange_rates() -> Dict[str, float]:
             "_date": data.get("date", "unknown"),
             "_status": "Live rates"
         }
+    except UpstreamUnavailable:
+        raise
     except Exception:
-        st.warning("⚠️ Unable to fetch live exchange rates. Using fallback values.")
         return fallback_rates
 
 
+def rates_fingerprint(rates: Dict) -> Tuple[Tuple[str, float], ...]:
+    """Hashable form of an exchange-rate dict, without the _date/_status metadata."""
+    return tuple(sorted((code, float(rate)) for code, rate in rates.items() if not code.startswith("_")))
+
+
 def convert_currency(amount: float, from_currency: str, to_currency: str, rates: Dict) -> float:
     if from_currency == to_currency:
         return amount
@@ -290,6 +1647,66 @@ def calculate_charging_cost(
     return energy_kwh * energy_price + time_minutes * time_price + session_fee
 
 
+# (upper SoC bound, fraction of effective power) — same curve as calculate_charging_time
+CHARGING_TAPER_BANDS: Tuple[Tuple[float, float], ...] = (
+    (80.0, 1.0),
+    (90.0, 0.5),
+    (np.inf, 0.3),
+)
+
+
+def _iter_taper_bands(battery_kwh, effective_kw, start_pct, end_pct, apply_taper: bool):
+    """Yield (minutes, SoC points) charged in each taper band."""
+    battery = np.asarray(battery_kwh, dtype=float)
+    power = np.asarray(effective_kw, dtype=float)
+    start = np.asarray(start_pct, dtype=float)
+    end = np.asarray(end_pct, dtype=float)
+    bands = CHARGING_TAPER_BANDS if apply_taper else ((np.inf, 1.0),)
+    # Minutes per SoC point at full power; zero where the charger delivers nothing.
+    minutes_per_pct = battery * 0.6 * (power > 0)
+    lower = -np.inf
+    for upper, fraction in bands:
+        band_pct = np.minimum(end, upper) - (start if lower == -np.inf else np.maximum(start, lower))
+        band_pct = np.maximum(band_pct, 0.0)
+        yield minutes_per_pct * band_pct / np.maximum(power * fraction, 0.1), band_pct
+        lower = upper
+
+
+def charging_band_minutes(
+    battery_kwh,
+    effective_kw,
+    start_pct,
+    end_pct,
+    apply_taper: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Minutes and SoC points spent in each taper band, stacked on a leading band axis."""
+    bands = list(_iter_taper_bands(battery_kwh, effective_kw, start_pct, end_pct, apply_taper))
+    shape = np.broadcast_shapes(*(a.shape for band in bands for a in band))
+    return (
+        np.stack([np.broadcast_to(minutes, shape) for minutes, _ in bands]),
+        np.stack([np.broadcast_to(pct, shape) for _, pct in bands]),
+    )
+
+
+def calculate_charging_time_vectorized(
+    battery_kwh,
+    effective_kw,
+    start_pct,
+    end_pct,
+    apply_taper: bool = True
+) -> np.ndarray:
+    """Array version of calculate_charging_time; all inputs broadcast together."""
+    total_minutes = 0.0
+    for band_minutes, _ in _iter_taper_bands(battery_kwh, effective_kw, start_pct, end_pct, apply_taper):
+        total_minutes = total_minutes + band_minutes
+    return np.asarray(total_minutes, dtype=float)
+
+
+def currency_factors(currencies: List[str], to_currency: str, rates: Dict) -> np.ndarray:
+    """Multipliers converting each currency into to_currency (see convert_currency)."""
+    return np.array([convert_currency(1.0, c, to_currency, rates) for c in currencies])
+
+
 def format_time(minutes: float) -> str:
     if minutes < 60:
         return f"{minutes:.0f} min"
@@ -303,18 +1720,255 @@ def format_currency(amount: float, currency: str) -> str:
     return f"{symbols.get(currency, currency)}{amount:.2f}"
 
 
-@st.cache_data(ttl=Config.CACHE_TTL)
+@bounded_cache(ttl=Config.CACHE_TTL, shared=True, upstream="nominatim", fallback=lambda postcode: None)
 def geocode_postcode(postcode: str) -> Optional[Tuple[float, float]]:
-    geolocator = Nominatim(user_agent="ev_charge_pro_app")
+    scheme, _, domain = Config.NOMINATIM_URL.partition("://")
+    geolocator = Nominatim(user_agent="ev_charge_pro_app", domain=domain, scheme=scheme)
     try:
-        location = geolocator.geocode(postcode)
+        location = UPSTREAMS["nominatim"].call(
+            lambda: geolocator.geocode(
+                postcode, country_codes=list(Config.CHARGER_COUNTRIES), timeout=Config.API_TIMEOUT
+            ),
+            Config.API_TIMEOUT,
+        )
         if location:
             return (location.latitude, location.longitude)
+    except UpstreamUnavailable:
+        raise
     except Exception:
         pass
     return None
 
 
+class CheapestCardTable:
+    """Materialized cheapest usable card per (usable tariffs, charger power, session).
+
+    The cheapest card at a charger depends only on which of the user's cards the
+    operator accepts, the charging power, the session and the caller's FX rates,
+    which are part of each key, so sessions on different rates never share an
+    entry. Entries are costed once and then served from LRU BoundedCaches.
+    refresh() fingerprints CHARGING_PROVIDERS and OPERATOR_TARIFFS, and drops
+    only the entries that depend on something that changed; a result costed
+    while the catalogue changed is returned but not stored, so stale costs are
+    never served.
+    """
+
+    def __init__(self, max_entries: int = 50_000, max_bytes: int = 32 * 2**20):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = BoundedCache("cheapest_cards", max_bytes, max_entries)
+        self._usable = BoundedCache("cheapest_cards_usable", max_bytes, max_entries)
+        self._tariff_prints: Dict[str, str] = {}
+        self._operator_print: Optional[str] = None
+        self.version = 0
+        self.hits = self.misses = self.invalidated = 0
+
+    def refresh(self) -> None:
+        """Invalidate entries whose tariffs or operator mapping changed."""
+        tariff_prints = {
+            name: json.dumps(preset, sort_keys=True, default=str)
+            for name, preset in CHARGING_PROVIDERS.items()
+        }
+        operator_print = json.dumps(OPERATOR_TARIFFS, sort_keys=True)
+        with self._lock:
+            changed_tariffs = {
+                name for name in set(tariff_prints) | set(self._tariff_prints)
+                if tariff_prints.get(name) != self._tariff_prints.get(name)
+            }
+            if operator_print != self._operator_print:
+                self._usable.clear()
+            if changed_tariffs:
+                self.invalidated += self._entries.discard(lambda key: not changed_tariffs.isdisjoint(key[0]))
+            if changed_tariffs or operator_print != self._operator_print:
+                self.version += 1
+            self._tariff_prints = tariff_prints
+            self._operator_print = operator_print
+
+    def usable_tariffs(self, search_text: str, card_set: frozenset) -> Tuple[str, ...]:
+        """Tariffs accepted at a charger (see infer_tariffs_for_operator) that the user holds."""
+        key = (search_text, card_set)
+        found, usable = self._usable.get(key)
+        if not found:
+            version, catalogue = self.version, CATALOGUE
+            usable = tuple(t for t in infer_tariffs_for_operator(search_text) if t in card_set)
+            self._store(self._usable, key, usable, version, catalogue)
+        return usable
+
+    def cheapest(
+        self,
+        usable: Tuple[str, ...],
+        effective_kw: float,
+        battery_kwh: float,
+        start_pct: float,
+        end_pct: float,
+        efficiency_loss: float,
+        apply_taper: bool,
+        comparison_currency: str,
+        rates: Dict,
+    ) -> Tuple[Optional[str], Optional[float]]:
+        """(card, cost in comparison_currency at rates) of the cheapest usable tariff, or (None, None)."""
+        key = (
+            usable, round(float(effective_kw), 1), battery_kwh, start_pct, end_pct,
+            efficiency_loss, apply_taper, comparison_currency, rates_fingerprint(rates),
+        )
+        found, entry = self._entries.get(key)
+        if found:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        version, catalogue = self.version, CATALOGUE
+        entry = self._compute(key, catalogue.providers)
+        self._store(self._entries, key, entry, version, catalogue)
+        return entry
+
+    def _store(self, cache: BoundedCache, key: Tuple, value: object, version: int, catalogue: Catalogue) -> None:
+        """Cache value unless the table was refreshed or the catalogue swapped while it was computed."""
+        with self._lock:
+            if self.version == version and CATALOGUE is catalogue:
+                cache.put(key, value)
+
+    def _compute(self, key: Tuple, providers: Dict[str, Dict]) -> Tuple[Optional[str], Optional[float]]:
+        usable, effective_kw, battery_kwh, start_pct, end_pct, efficiency_loss, apply_taper, currency, fx = key
+        rates = dict(fx)
+        energy_needed = battery_kwh * ((end_pct - start_pct) / 100.0) * (1.0 + efficiency_loss / 100.0)
+        if energy_needed <= 0:
+            return None, None
+        time_min = calculate_charging_time(battery_kwh, effective_kw, start_pct, end_pct, apply_taper)
+        best_card, best_cost = None, None
+        for name in usable:
+            preset = providers.get(name)
+            if not preset:
+                continue
+            native_cost = calculate_charging_cost(energy_needed, time_min, preset["energy"], preset["time"], 0.0)
+            cost = convert_currency(native_cost, preset["currency"], currency, rates)
+            if best_cost is None or cost < best_cost:
+                best_card, best_cost = name, cost
+        return best_card, best_cost
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "entries": self._entries.stats()["entries"],
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+            }
+
+
+CHEAPEST_CARDS: CheapestCardTable = process_resource("cheapest_cards", CheapestCardTable)
+
+
+def iter_charger_rings(
+    lat: float,
+    lon: float,
+    is_compatible: Callable[[ChargerSet, int], bool],
+    target_compatible: int = Config.NEARBY_TARGET_COMPATIBLE,
+    rings: Tuple[Tuple[float, int], ...] = Config.NEARBY_SEARCH_RINGS,
+):
+    """Search ever wider rings around a point until enough compatible chargers are found.
+
+    Yields (radius_km, merged ChargerSet, indices of chargers new in this ring).
+    Chargers seen in an earlier ring are dropped by OCM id.
+    """
+    merged = ChargerSet.empty()
+    compatible = 0
+    for radius_km, max_results in rings:
+        merged, new_idx = merged.merge(
+            search_chargers(lat, lon, distance_km=radius_km, max_results=max_results)
+        )
+        compatible += sum(1 for i in new_idx if is_compatible(merged, i))
+        yield radius_km, merged, new_idx
+        if compatible >= target_compatible:
+            break
+
+
+def haversine_km(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Great-circle distance from one point to many, in km."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * 6371.0088 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def remaining_range_miles(
+    battery_kwh: float,
+    soc_pct: float,
+    miles_per_kwh: float,
+    reserve_pct: float = 0.0,
+) -> float:
+    return max(0.0, battery_kwh * (soc_pct - reserve_pct) / 100.0 * miles_per_kwh)
+
+
+class CountryShard:
+    """One country's partition of the chargers held in the POI cache.
+
+    The shard is merged from that country's cache entries only when a query
+    touches it, and again only after one of those entries has changed, so a
+    session that never leaves GB never materializes the French partition and
+    French searches don't rebuild the GB one. One thread rebuilds at a time.
+    """
+    __slots__ = ("code", "_version", "_chargers", "_lock")
+
+    def __init__(self, code: str):
+        self.code = code
+        self._version: Optional[int] = None
+        self._chargers = ChargerSet.empty()
+        self._lock = threading.Lock()
+
+    def chargers(self) -> ChargerSet:
+        cache = fetch_nearby_chargers.cache
+        if self._version == cache.partition_version(self.code):
+            return self._chargers
+        with self._lock:
+            version = cache.partition_version(self.code)
+            if self._version != version:
+                self._chargers = ChargerSet.union(cache.values(lambda key: dict(key)["country"] == self.code))
+                self._version = version
+            return self._chargers
+
+
+CHARGER_SHARDS: Dict[str, CountryShard] = process_resource(
+    "charger_shards", lambda: {code: CountryShard(code) for code in Config.CHARGER_COUNTRIES}
+)
+
+
+def known_chargers(
+    lat: Optional[float] = None, lon: Optional[float] = None, range_km: float = 0.0
+) -> Tuple[ChargerSet, Tuple[str, ...]]:
+    """Chargers held in the POI cache, deduplicated by OCM id, and the countries they came from.
+
+    Given a point, only the country shards within range_km of it are read.
+    """
+    codes = tuple(CHARGER_SHARDS) if lat is None else countries_near(lat, lon, range_km)
+    shards = [CHARGER_SHARDS[code].chargers() for code in codes if code in CHARGER_SHARDS]
+    if len(shards) == 1:
+        return shards[0], codes
+    return ChargerSet.union(shards), codes
+
+
+def reachable_chargers(
+    chargers: ChargerSet,
+    lat: float,
+    lon: float,
+    range_km: float,
+    road_factor: float = Config.ROAD_DISTANCE_FACTOR,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Estimated road distance (km) to each charger and indices of the reachable ones, nearest first.
+
+    Road distance is approximated as straight-line distance × road_factor.
+    """
+    road_km = haversine_km(lat, lon, chargers.records["lat"], chargers.records["lon"]) * road_factor
+    reachable = np.flatnonzero(road_km <= range_km)
+    return road_km, reachable[np.argsort(road_km[reachable], kind="stable")]
+
+
+def local_minute_now() -> float:
+    """Minutes after local midnight now: the plug-in time when a caller gives none."""
+    now = time.localtime()
+    return now.tm_hour * 60.0 + now.tm_min + now.tm_sec / 60.0
+
+
 def pick_best_charger_stop(
     lon: float,
     lat: float,
@@ -328,76 +1982,413 @@ def pick_best_charger_stop(
     comparison_currency: str,
     exchange_rates: Dict,
     available_cards: Optional[Set[str]] = None,
+    plug_in_minute: Optional[float] = None,
 ) -> Optional[Dict]:
-    pois = fetch_nearby_chargers(lat, lon, distance_km=5, max_results=10)
+    """Best charger near a route point, scored on cost, charging time and detour (see rank_chargers)."""
+    pois = search_chargers(lat, lon, distance_km=5, max_results=10)
     if not pois:
         return None
+    if end_soc <= start_soc:
+        return None
 
-    energy_needed = battery_kwh * ((end_soc - start_soc) / 100.0)
-    energy_needed *= (1.0 + efficiency_loss / 100.0)
-    if energy_needed <= 0:
+    ranked = rank_chargers(
+        charger_index(pois), lat, lon, len(pois),
+        battery_kwh, miles_per_kwh, start_soc, end_soc, efficiency_loss, apply_taper,
+        car_max_kw, comparison_currency, exchange_rates, available_cards,
+        round_trip=True, plug_in_minute=plug_in_minute,
+    )
+    if not len(ranked["index"]):
         return None
 
-    best = None
-
-    for poi in pois:
-        addr = poi.get("AddressInfo", {}) or {}
-        op_info = poi.get("OperatorInfo") or {}
-        operator_title = op_info.get("Title")
-        site_title = addr.get("Title")
-        display_operator = operator_title or site_title or "Unknown"
-
-        lat_c = addr.get("Latitude")
-        lon_c = addr.get("Longitude")
-
-        connections = poi.get("Connections") or []
-        power_kw = connections[0].get("PowerKW") if connections else None
-        if not isinstance(power_kw, (int, float)):
-            power_kw = 50.0
-        effective_kw = min(float(power_kw), float(car_max_kw))
-
-        search_text = f"{operator_title or ''} {site_title or ''}"
-        candidate_tariffs = infer_tariffs_for_operator(search_text)
-        if available_cards:
-            candidate_tariffs = [t for t in candidate_tariffs if t in available_cards]
-        if not candidate_tariffs:
-            continue
+    i = int(ranked["index"][0])
+    display_operator = pois.operator(i) or pois.titles[i] or "Unknown"
+    return {
+        "charger_name": pois.titles[i] or display_operator,
+        "operator": display_operator,
+        "lat": float(pois.records["lat"][i]),
+        "lon": float(pois.records["lon"][i]),
+        "power_kw": float(ranked["power_kw"][0]),
+        "card": ranked["card"][0],
+        "total_cost": float(ranked["session_cost"][0]),
+        "time_min": float(ranked["charge_min"][0]),
+    }
 
-        for tariff_name in candidate_tariffs:
-            preset = CHARGING_PROVIDERS.get(tariff_name)
-            if not preset:
-                continue
+# ============================================================================
+# COMPILED TARIFF RULES
+# ============================================================================
 
-            time_min = calculate_charging_time(
-                battery_kwh, effective_kw, start_soc, end_soc, apply_taper
-            )
-            native_cost = calculate_charging_cost(
-                energy_needed,
-                time_min,
-                preset["energy"],
-                preset["time"],
-                0.0,
-            )
-            total_cost = convert_currency(
-                native_cost,
-                preset["currency"],
-                comparison_currency,
-                exchange_rates,
+@dataclass(frozen=True)
+class PiecewiseLinear:
+    """Cumulative cost curves for several tariffs on one shared breakpoint grid.
+
+    rates[m, i] applies on [x[i], x[i + 1]); the last rate extends to infinity,
+    or the curve repeats every `period` units when one is given.
+    """
+    x: np.ndarray
+    cumulative: np.ndarray
+    rates: np.ndarray
+    period: Optional[float] = None
+
+    def _evaluate(self, values, with_cumulative: bool) -> np.ndarray:
+        v = np.asarray(values, dtype=float)
+        n_tariffs = self.rates.shape[0]
+        shared = v.ndim == 0 or v.shape[-1] == 1
+        if shared:
+            # Same value for every tariff: gather whole rows of the (x, tariff) tables.
+            v = v if v.ndim == 0 else v[..., 0]
+        cycles = None
+        if self.period:
+            cycles, v = np.divmod(v, self.period)
+        idx = np.clip(np.searchsorted(self.x, v, side="right") - 1, 0, len(self.x) - 1)
+        if shared:
+            rate = self.rates.T[idx]
+            if not with_cumulative:
+                return rate
+            total = self.cumulative.T[idx] + rate * (v - self.x[idx])[..., None]
+            if cycles is not None:
+                total += cycles[..., None] * self.cumulative[:, -1]
+            return total
+        tariff = np.arange(n_tariffs)
+        rate = self.rates[tariff, idx]
+        if not with_cumulative:
+            return rate
+        total = self.cumulative[tariff, idx] + rate * (v - self.x[idx])
+        if cycles is not None:
+            total += cycles * self.cumulative[:, -1]
+        return total
+
+    def __call__(self, values) -> np.ndarray:
+        """Integral of the rate from 0 to each value; values broadcast against (..., tariffs)."""
+        return self._evaluate(values, with_cumulative=True)
+
+    def rate(self, values) -> np.ndarray:
+        return self._evaluate(values, with_cumulative=False)
+
+
+def _compile_steps(steps: List[List[Tuple[float, float]]], period: Optional[float] = None) -> PiecewiseLinear:
+    """Compile per-tariff step functions [(breakpoint, rate), ...] starting at 0."""
+    points = [0.0] + [b for spec in steps for b, _ in spec] + ([period] if period else [])
+    x = np.unique(np.asarray(points, dtype=float))
+    rates = np.empty((len(steps), len(x)))
+    for m, spec in enumerate(steps):
+        breakpoints = np.array([b for b, _ in spec], dtype=float)
+        values = np.array([r for _, r in spec], dtype=float)
+        rates[m] = values[np.searchsorted(breakpoints, x, side="right") - 1]
+    cumulative = np.concatenate(
+        [np.zeros((len(steps), 1)), np.cumsum(rates[:, :-1] * np.diff(x), axis=1)], axis=1
+    )
+    return PiecewiseLinear(x, cumulative, rates, period)
+
+
+def _time_of_day_steps(preset: Dict) -> List[Tuple[float, float]]:
+    windows = [
+        (_clock_minutes(w["start"]), _clock_minutes(w["end"]), float(w["energy"]))
+        for w in preset.get("energy_windows", [])
+    ]
+    breakpoints = sorted({0.0, *(w[0] for w in windows), *(w[1] for w in windows)})
+    steps = []
+    for b in breakpoints:
+        price = float(preset["energy"])
+        for start, end, window_price in windows:
+            inside = start <= b < end if start <= end else (b >= start or b < end)
+            if inside:
+                price = window_price
+        steps.append((b, price))
+    return steps
+
+
+@dataclass(frozen=True)
+class CompiledTariffs:
+    """A set of tariffs compiled into piecewise-linear cost curves.
+
+    energy_by_clock integrates price over minute-of-day, energy_tiers over delivered
+    kWh, time_by_minute over session minutes and idle_by_minute over overstay minutes.
+    """
+    names: Tuple[str, ...]
+    currencies: Tuple[str, ...]
+    energy_by_clock: PiecewiseLinear
+    energy_tiers: PiecewiseLinear
+    time_by_minute: PiecewiseLinear
+    idle_by_minute: PiecewiseLinear
+    idle_fee_cap: np.ndarray
+    session_fee: np.ndarray
+
+
+@bounded_cache()
+def compile_tariffs(names: Tuple[str, ...]) -> CompiledTariffs:
+    return compile_presets(names, [CHARGING_PROVIDERS[name] for name in names])
+
+
+def compile_presets(names: Tuple[str, ...], presets: List[Dict]) -> CompiledTariffs:
+    return CompiledTariffs(
+        names=tuple(names),
+        currencies=tuple(p["currency"] for p in presets),
+        energy_by_clock=_compile_steps([_time_of_day_steps(p) for p in presets], period=1440.0),
+        energy_tiers=_compile_steps([
+            [(0.0, 0.0)] + sorted(
+                (float(t["from_kwh"]), float(t["energy_delta"])) for t in p.get("energy_tiers", [])
             )
+            for p in presets
+        ]),
+        time_by_minute=_compile_steps([
+            [(0.0, 0.0), (float(p.get("time_grace_min", 0.0)), float(p["time"]))] for p in presets
+        ]),
+        idle_by_minute=_compile_steps([
+            [(0.0, 0.0), (float(p.get("idle_grace_min", 0.0)), float(p.get("idle_fee", 0.0)))]
+            for p in presets
+        ]),
+        idle_fee_cap=np.array([float(p.get("idle_fee_cap", np.inf)) for p in presets]),
+        session_fee=np.array([float(p.get("session_fee", 0.0)) for p in presets]),
+    )
+
+
+def calculate_session_costs_compiled(
+    tariffs: CompiledTariffs,
+    battery_kwh,
+    effective_kw,
+    start_pct,
+    end_pct,
+    efficiency_loss,
+    apply_taper: bool = True,
+    plug_in_minute=0.0,
+    idle_minutes=0.0,
+) -> np.ndarray:
+    """Native-currency session cost for many sessions against many compiled tariffs.
+
+    Session inputs broadcast against a trailing tariff axis, e.g. shape (N, 1) for
+    N sessions gives an (N, len(tariffs.names)) result. plug_in_minute is the
+    minute of day the session starts; idle_minutes is the overstay after charging.
+    """
+    band_minutes, band_pct = (
+        a if a.ndim > 1 else a[:, None]
+        for a in charging_band_minutes(battery_kwh, effective_kw, start_pct, end_pct, apply_taper)
+    )
+    loss_factor = 1.0 + np.asarray(efficiency_loss, dtype=float) / 100.0
+    band_energy = np.asarray(battery_kwh, dtype=float) * band_pct / 100.0 * loss_factor
+    band_end = np.cumsum(band_minutes, axis=0)
+    band_start = band_end - band_minutes
+    clock = np.asarray(plug_in_minute, dtype=float)
+
+    clock_cost = (
+        tariffs.energy_by_clock(clock + band_end) - tariffs.energy_by_clock(clock + band_start)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_price = np.where(
+            band_minutes > 0,
+            clock_cost / band_minutes,
+            tariffs.energy_by_clock.rate(clock + band_start),
+        )
+    energy_cost = (band_energy * avg_price).sum(axis=0)
+    tier_cost = tariffs.energy_tiers(band_energy.sum(axis=0))
+    time_cost = tariffs.time_by_minute(band_end[-1])
+    idle_cost = np.minimum(tariffs.idle_by_minute(idle_minutes), tariffs.idle_fee_cap)
+    return energy_cost + tier_cost + time_cost + idle_cost + tariffs.session_fee
+
+# ============================================================================
+# CHARGER RANKING
+# ============================================================================
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(lats, lons) -> np.ndarray:
+    lat, lon = np.radians(lats), np.radians(lons)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def card_compatibility(
+    chargers: ChargerSet, card_names: Tuple[str, ...], catalogue: Optional[Catalogue] = None
+) -> np.ndarray:
+    """(N, M) bool: card_names[m] can be used at charger n (vectorized infer_tariffs_for_operator)."""
+    catalogue = catalogue or CATALOGUE
+    text = pd.Series([chargers.search_text(i) for i in range(len(chargers))], dtype=object).str.lower()
+    column = {name: j for j, name in enumerate(card_names)}
+    compatible = np.zeros((len(chargers), len(card_names)), dtype=bool)
+    for needle, tariffs in catalogue.operator_needles:
+        hit = text.str.contains(needle, regex=False).to_numpy(dtype=bool)
+        for name in tariffs:
+            if name in column:
+                compatible[:, column[name]] |= hit
+    return compatible
+
+
+class ChargerIndex:
+    """Nearest-neighbour lookup plus card compatibility over one ChargerSet.
+
+    Chargers are stored as unit vectors, where chord length orders the same way
+    as great-circle distance. scipy's cKDTree is used when installed; otherwise
+    queries fall back to a brute-force scan.
+    """
+    __slots__ = ("chargers", "catalogue", "points", "tree", "card_names", "compatible")
+
+    def __init__(self, chargers: ChargerSet):
+        self.chargers = chargers
+        self.points = _unit_vectors(chargers.records["lat"], chargers.records["lon"])
+        self.tree = cKDTree(self.points) if cKDTree is not None and len(chargers) else None
+        self.catalogue = CATALOGUE
+        self.card_names = tuple(self.catalogue.providers)
+        self.compatible = card_compatibility(chargers, self.card_names, self.catalogue)
+
+    def __len__(self) -> int:
+        return len(self.chargers)
+
+    def nearest(self, lat: float, lon: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of the k nearest chargers and their great-circle distance in km, nearest first."""
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        query = _unit_vectors(lat, lon)[0]
+        if self.tree is not None:
+            chord, idx = self.tree.query(query, k=k)
+            chord, idx = np.atleast_1d(chord), np.atleast_1d(idx)
+        else:
+            d2 = ((self.points - query) ** 2).sum(axis=1)
+            idx = np.argpartition(d2, k - 1)[:k] if k < len(self) else np.arange(len(self))
+            idx = idx[np.argsort(d2[idx], kind="stable")]
+            chord = np.sqrt(d2[idx])
+        return idx, 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2.0, 1.0))
+
+    def nearest_compatible(
+        self, lat: float, lon: float, k: int, columns: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Like nearest, but only chargers where at least one card in columns works."""
+        want = int(k)
+        fetch = min(len(self), max(4 * want, 16))
+        while True:
+            idx, km = self.nearest(lat, lon, fetch)
+            keep = self.compatible[idx][:, columns].any(axis=1)
+            if keep.sum() >= want or fetch >= len(self):
+                return idx[keep][:want], km[keep][:want]
+            fetch = min(len(self), fetch * 4)
+
+
+_charger_indexes: Dict[str, object] = process_resource(
+    "charger_indexes", lambda: {"lock": threading.Lock(), "indexes": OrderedDict()}
+)
+
+
+def charger_index(chargers: ChargerSet, max_indexes: int = 32) -> ChargerIndex:
+    """Build (or reuse) the index for a ChargerSet, keyed by the set's content fingerprint.
+
+    The most recent max_indexes are kept, shared by every session. An index
+    built against an older catalogue is rebuilt, since card compatibility
+    depends on the tariff data.
+    """
+    key = chargers.fingerprint()
+    indexes = _charger_indexes["indexes"]
+    with _charger_indexes["lock"]:
+        index = indexes.get(key)
+        if index is not None and index.catalogue is CATALOGUE:
+            indexes.move_to_end(key)
+            return index
+    index = ChargerIndex(chargers)
+    with _charger_indexes["lock"]:
+        indexes[key] = index
+        indexes.move_to_end(key)
+        while len(indexes) > max_indexes:
+            indexes.popitem(last=False)
+    return index
+
+
+def invalidate_catalogue_caches(previous: Catalogue, current: Catalogue) -> None:
+    """Drop cached results that depend on tariffs changed between two catalogues.
+
+    Only compiled tariffs and annual simulations naming a changed provider are
+    dropped; POI, route and FX caches don't depend on tariff data and stay warm.
+    The cheapest-card table and charger indexes notice the new catalogue themselves.
+    """
+    changed = {
+        name for name in set(previous.providers) | set(current.providers)
+        if previous.providers.get(name) != current.providers.get(name)
+    }
+    if changed:
+        compile_tariffs.cache.discard(lambda key: not changed.isdisjoint(dict(key)["names"]))
+        annual_cost_simulation.cache.discard(
+            lambda key: dict(key)["home_tariff"] in changed or not changed.isdisjoint(dict(key)["public_cards"])
+        )
+
+
+RANKING_FIELDS = (
+    "index", "card", "power_kw", "straight_km", "detour_km",
+    "session_cost", "detour_cost", "charge_min", "detour_min", "score",
+)
 
-            if best is None or total_cost < best["total_cost"]:
-                best = {
-                    "charger_name": site_title or display_operator,
-                    "operator": display_operator,
-                    "lat": lat_c,
-                    "lon": lon_c,
-                    "power_kw": effective_kw,
-                    "card": tariff_name,
-                    "total_cost": total_cost,
-                    "time_min": time_min,
-                }
 
-    return best
+def rank_chargers(
+    index: ChargerIndex,
+    lat: float,
+    lon: float,
+    k: int,
+    battery_kwh: float,
+    miles_per_kwh: float,
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    car_max_kw: float,
+    comparison_currency: str,
+    rates: Dict,
+    available_cards: Optional[Set[str]] = None,
+    value_of_time: float = Config.VALUE_OF_TIME_PER_HOUR,
+    road_factor: float = Config.ROAD_DISTANCE_FACTOR,
+    detour_speed_kmh: float = Config.DETOUR_SPEED_KMH,
+    round_trip: bool = False,
+    plug_in_minute: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """Score the k nearest compatible chargers around a point, best first.
+
+    score = session cost with the cheapest usable card
+          + cost of the energy used driving the detour, at that card's price
+          + value_of_time per hour × (charging time + detour driving time)
+
+    Everything is in comparison_currency. The detour counts there and back when
+    round_trip (a stop off a route), one way otherwise. available_cards limits
+    which cards may be used; None or empty allows them all. plug_in_minute
+    (minutes after local midnight) prices time-of-use tariffs; None means now.
+    """
+    if plug_in_minute is None:
+        plug_in_minute = local_minute_now()
+    columns = np.array([
+        j for j, name in enumerate(index.card_names)
+        if not available_cards or name in available_cards
+    ], dtype=int)
+    if not len(columns) or end_pct <= start_pct:
+        return {key: np.empty(0) for key in RANKING_FIELDS}
+    idx, straight_km = index.nearest_compatible(lat, lon, k, columns)
+
+    names = tuple(index.card_names[j] for j in columns)
+    tariffs = compile_tariffs(names)
+    power_kw = _effective_kw(index.chargers.records["power_kw"][idx], car_max_kw)
+    costs = calculate_session_costs_compiled(
+        tariffs, battery_kwh, power_kw[:, None], start_pct, end_pct,
+        efficiency_loss, apply_taper, plug_in_minute,
+    ) * currency_factors(tariffs.currencies, comparison_currency, rates)
+    costs = np.where(index.compatible[idx][:, columns], costs, np.inf)
+    best = costs.argmin(axis=1) if len(idx) else np.empty(0, dtype=int)
+    session_cost = costs[np.arange(len(idx)), best]
+
+    charge_min = calculate_charging_time_vectorized(battery_kwh, power_kw, start_pct, end_pct, apply_taper)
+    detour_km = straight_km * road_factor * (2.0 if round_trip else 1.0)
+    detour_min = detour_km / detour_speed_kmh * 60.0
+    energy_kwh = battery_kwh * (end_pct - start_pct) / 100.0 * (1.0 + efficiency_loss / 100.0)
+    price_per_kwh = session_cost / energy_kwh if energy_kwh > 0 else np.zeros(len(idx))
+    detour_cost = detour_km * 0.621371 / miles_per_kwh * price_per_kwh
+    score = session_cost + detour_cost + value_of_time * (charge_min + detour_min) / 60.0
+
+    order = np.argsort(score, kind="stable")
+    return {
+        "index": idx[order],
+        "card": [names[j] for j in best[order]],
+        "power_kw": power_kw[order],
+        "straight_km": straight_km[order],
+        "detour_km": detour_km[order],
+        "session_cost": session_cost[order],
+        "detour_cost": detour_cost[order],
+        "charge_min": charge_min[order],
+        "detour_min": detour_min[order],
+        "score": score[order],
+    }
 
 # ============================================================================
 # STYLING & UI
@@ -470,6 +2461,18 @@ def render_hero_section():
     """, unsafe_allow_html=True)
 
 
+def render_upstream_status(slot) -> None:
+    """Warn, in slot, about upstream APIs that are failing or being served from stale cache."""
+    degraded = degraded_upstreams()
+    if not degraded:
+        return
+    names = ", ".join(UPSTREAM_TITLES.get(name, name) for name in degraded)
+    slot.warning(
+        f"⚠️ {names} unavailable: showing the last results we fetched, which may be out of date. "
+        "Live data will return automatically once the service recovers."
+    )
+
+
 def render_vehicle_selector(ios_safe_mode: bool) -> Tuple[float, float]:
     st.markdown("### 🚗 Vehicle configuration")
     col1, col2 = st.columns([2, 1])
@@ -478,10 +2481,10 @@ def render_vehicle_selector(ios_safe_mode: bool) -> Tuple[float, float]:
         vehicle_name = st.selectbox(
             "Select your vehicle",
             VEHICLE_DATABASE["model"].tolist(),
-            index=7,
+            index=min(7, len(VEHICLE_DATABASE) - 1),
         )
 
-    vehicle_data = VEHICLE_DATABASE[VEHICLE_DATABASE["model"] == vehicle_name].iloc[0]
+    vehicle_data = CATALOGUE.vehicles_by_model[vehicle_name]
     default_battery = float(vehicle_data["battery_kwh"])
     default_max_kw = float(vehicle_data["max_dc_kw"])
 
@@ -680,26 +2683,45 @@ def render_provider_configuration(
 # NEARBY CHARGERS (MAP-FIRST, MULTI-TARIFF, CLICKABLE)
 # ============================================================================
 
-def render_location_and_cards_section(
-    battery_kwh: float,
-    start_pct: float,
-    end_pct: float,
-    efficiency_loss: float,
-    miles_per_kwh: float,
-    apply_taper: bool,
-    car_max_kw: float,
-    comparison_currency: str,
-    exchange_rates: Dict,
-    available_cards: List[str],
-):
-    st.markdown("## 🗺️ Nearby chargers & cheapest payment card")
-
-    card_set = set(available_cards or [])
+def nearby_chargers_frame(rows: List[Dict], comparison_currency: str) -> pd.DataFrame:
+    display_cols = [
+        "Charger", "Operator", "Distance", "Approx. Power (kW)",
+        "Cheapest Card (you own)", f"Est. Session Cost ({comparison_currency})", "In range"
+    ]
+    df = pd.DataFrame([
+        {k: v for k, v in row.items() if k in display_cols}
+        for row in rows
+    ])
+    cost_col = f"Est. Session Cost ({comparison_currency})"
+    if cost_col in df.columns:
+        def fmt_cost(x):
+            if x is None or (isinstance(x, float) and np.isnan(x)):
+                return "—"
+            return format_currency(float(x), comparison_currency)
+        df[cost_col] = df[cost_col].apply(fmt_cost)
+    return df
+
+
+def render_location_and_cards_section(
+    battery_kwh: float,
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    miles_per_kwh: float,
+    apply_taper: bool,
+    car_max_kw: float,
+    comparison_currency: str,
+    exchange_rates: Dict,
+    available_cards: List[str],
+):
+    st.markdown("## 🗺️ Nearby chargers & cheapest payment card")
+
+    card_set = set(available_cards or [])
 
     col_loc1, col_loc2 = st.columns([2, 1])
     with col_loc1:
         postcode = st.text_input(
-            "Enter your UK postcode (or click the map to set location)",
+            "Enter your postcode, UK or European (or click the map to set location)",
             placeholder="e.g., SW1A 1AA",
         )
     with col_loc2:
@@ -711,7 +2733,7 @@ def render_location_and_cards_section(
         lat, lon = st.session_state["nearby_click_coords"]
 
     if lat is None and postcode:
-        coords = geocode_postcode(postcode.strip())
+        coords = geocode_postcode(normalize_postcode(postcode))
         if not coords:
             st.error("❌ Could not find that postcode. Please check your input.")
             return
@@ -729,14 +2751,28 @@ def render_location_and_cards_section(
 
     st.success(f"📍 Location set at: {lat:.5f}, {lon:.5f}")
 
+    col_range1, col_range2 = st.columns(2)
+    with col_range1:
+        reserve_pct = st.number_input(
+            "Arrival reserve (%)", 0, 50, Config.DEFAULT_RESERVE_PCT, 1, key="nearby_reserve"
+        )
+    with col_range2:
+        road_factor = st.number_input(
+            "Road distance factor", 1.0, 2.0, Config.ROAD_DISTANCE_FACTOR, 0.05, key="nearby_road_factor",
+            help="Road distance ÷ straight-line distance used to judge reachability",
+        )
+    range_miles = remaining_range_miles(battery_kwh, start_pct, miles_per_kwh, reserve_pct)
+    range_km = range_miles / 0.621371
+    st.caption(
+        f"🔋 About {range_miles:.0f} mi of range from {start_pct}% SoC, keeping {reserve_pct}% in reserve."
+    )
+
     m = folium.Map(location=[lat, lon], zoom_start=13)
     folium.Marker([lat, lon], tooltip="Your location", icon=folium.Icon(color="blue")).add_to(m)
-
-    pois = fetch_nearby_chargers(lat, lon, distance_km=10, max_results=25)
-    if not pois:
-        st.warning("No chargers returned from OpenChargeMap or API key missing.")
-        map_state = st_folium(m, width=800, height=500, key="nearby_chargers_map")
-        return
+    folium.Circle(
+        [lat, lon], radius=range_km / road_factor * 1000.0,
+        color="#00ADF0", fill=True, fill_opacity=0.05, tooltip="Estimated reach",
+    ).add_to(m)
 
     if end_pct <= start_pct:
         st.info("Increase your target SoC above your current SoC to estimate costs.")
@@ -747,112 +2783,180 @@ def render_location_and_cards_section(
         energy_needed *= (1.0 + efficiency_loss / 100.0)
         miles_added = energy_needed * miles_per_kwh if energy_needed > 0 else 0.0
 
+    card_key = frozenset(card_set)
+    CHEAPEST_CARDS.refresh()
+
+    def is_compatible(chargers: ChargerSet, i: int) -> bool:
+        return bool(CHEAPEST_CARDS.usable_tariffs(chargers.search_text(i), card_key))
+
+    status_slot = st.empty()
+    operators_slot = st.empty()
+    map_slot = st.empty()
+    st.markdown("### Nearby chargers & cheapest card (your cards only)")
+    table_slot = st.empty()
+
     rows = []
     operator_counts: Dict[str, int] = {}
+    compatible_count = 0
+    pois = ChargerSet.empty()
+
+    # Results from each ring are costed and shown before the next, wider ring is fetched.
+    for radius_km, pois, new_idx in iter_charger_rings(lat, lon, is_compatible):
+        effective_kws = pois.effective_kw(car_max_kw)
+        records = pois.records
+        road_kms = haversine_km(lat, lon, records["lat"], records["lon"]) * road_factor
+
+        for i in new_idx:
+            operator_title = pois.operator(i)
+            site_title = pois.titles[i]
+            operator = operator_title or "Unknown"
+
+            operator_counts[operator] = operator_counts.get(operator, 0) + 1
+
+            title = site_title or operator or "Unknown charger"
+            dist_km = records["distance_km"][i]
+            dist_str = f"{dist_km:.1f} km" if not np.isnan(dist_km) else "—"
+            lat_c = float(records["lat"][i])
+            lon_c = float(records["lon"][i])
+            effective_kw = float(effective_kws[i])
+
+            usable = CHEAPEST_CARDS.usable_tariffs(pois.search_text(i), card_key)
+            compatible_count += bool(usable)
+            best_card, best_cost = CHEAPEST_CARDS.cheapest(
+                usable, effective_kw, battery_kwh, start_pct, end_pct,
+                efficiency_loss, apply_taper, comparison_currency, exchange_rates,
+            )
 
-    for poi in pois:
-        addr = poi.get("AddressInfo", {}) or {}
-        op_info = poi.get("OperatorInfo") or {}
-        operator_title = op_info.get("Title")
-        site_title = addr.get("Title")
-        operator = operator_title or "Unknown"
-
-        operator_counts[operator] = operator_counts.get(operator, 0) + 1
+            rows.append({
+                "Charger": title,
+                "Operator": operator,
+                "Distance": dist_str,
+                "Approx. Power (kW)": f"{effective_kw:.0f}",
+                "Cheapest Card (you own)": best_card or "N/A",
+                f"Est. Session Cost ({comparison_currency})": best_cost,
+                "In range": "✅" if road_kms[i] <= range_km else "—",
+                "_op_title": operator_title,
+                "_site_title": site_title,
+                "_effective_kw": effective_kw,
+                "_lat": lat_c,
+                "_lon": lon_c,
+            })
 
-        title = site_title or operator or "Unknown charger"
-        dist_km = addr.get("Distance")
-        dist_str = f"{dist_km:.1f} km" if isinstance(dist_km, (int, float)) else "—"
-        lat_c = addr.get("Latitude")
-        lon_c = addr.get("Longitude")
+        status_slot.caption(
+            f"🔎 Searched within {radius_km:g} km • {len(pois)} chargers • "
+            f"{compatible_count} usable with your cards"
+        )
+        if rows:
+            map_slot.map(
+                pd.DataFrame({"lat": [r["_lat"] for r in rows], "lon": [r["_lon"] for r in rows]}),
+                height=500,
+            )
+            table_slot.dataframe(
+                nearby_chargers_frame(rows, comparison_currency),
+                use_container_width=True,
+                hide_index=True,
+            )
 
-        connections = poi.get("Connections") or []
-        power_kw = connections[0].get("PowerKW") if connections else None
-        if not isinstance(power_kw, (int, float)):
-            power_kw = 50.0
-        effective_kw = min(float(power_kw), float(car_max_kw))
+    if not pois:
+        st.warning("No chargers returned from OpenChargeMap or API key missing.")
+        with map_slot.container():
+            map_state = st_folium(m, width=800, height=500, key="nearby_chargers_map")
+        return
 
-        popup_text = f"{title}<br>{operator}<br>~{dist_str}"
+    for row in rows:
+        popup_text = f"{row['Charger']}<br>{row['Operator']}<br>~{row['Distance']}"
         folium.Marker(
-            [lat_c, lon_c],
-            tooltip=title,
+            [row["_lat"], row["_lon"]],
+            tooltip=row["Charger"],
             popup=popup_text,
-            icon=folium.Icon(color="green")
+            icon=folium.Icon(color="green" if row["In range"] == "✅" else "gray")
         ).add_to(m)
 
-        best_card = None
-        best_cost = None
-
-        candidate_tariffs = infer_tariffs_for_operator(f"{operator_title or ''} {site_title or ''}")
-        if energy_needed > 0:
-            for tariff_name in candidate_tariffs:
-                if tariff_name not in card_set:
-                    continue
-                preset = CHARGING_PROVIDERS.get(tariff_name)
-                if not preset:
-                    continue
-
-                time_min = calculate_charging_time(
-                    battery_kwh, effective_kw, start_pct, end_pct, apply_taper
-                )
-                native_cost = calculate_charging_cost(
-                    energy_needed,
-                    time_min,
-                    preset["energy"],
-                    preset["time"],
-                    0.0,
-                )
-                total_cost = convert_currency(
-                    native_cost,
-                    preset["currency"],
-                    comparison_currency,
-                    exchange_rates,
-                )
+    # Operator summary (like Electroverse operator view)
+    with operators_slot.container():
+        st.markdown("#### Operators in this area")
+        if operator_counts:
+            op_df = pd.DataFrame(
+                [{"Operator": k, "Chargers": v} for k, v in sorted(operator_counts.items(), key=lambda kv: -kv[1])]
+            )
+            st.dataframe(op_df, hide_index=True, use_container_width=True)
 
-                if best_cost is None or total_cost < best_cost:
-                    best_cost = total_cost
-                    best_card = tariff_name
-
-        rows.append({
-            "Charger": title,
-            "Operator": operator,
-            "Distance": dist_str,
-            "Approx. Power (kW)": f"{effective_kw:.0f}",
-            "Cheapest Card (you own)": best_card or "N/A",
-            f"Est. Session Cost ({comparison_currency})": best_cost,
-            "_op_title": operator_title,
-            "_site_title": site_title,
-            "_effective_kw": effective_kw,
-            "_lat": lat_c,
-            "_lon": lon_c,
-        })
+    with map_slot.container():
+        map_state = st_folium(m, width=800, height=500, key="nearby_chargers_map")
 
-    # Operator summary (like Electroverse operator view)
-    st.markdown("#### Operators in this area")
-    if operator_counts:
-        op_df = pd.DataFrame(
-            [{"Operator": k, "Chargers": v} for k, v in sorted(operator_counts.items(), key=lambda kv: -kv[1])]
+    # Reachability over every charger already fetched in the countries within range,
+    # this session or by other users
+    started = time.perf_counter()
+    known, countries = known_chargers(lat, lon, range_km)
+    road_km, reachable_idx = reachable_chargers(known, lat, lon, range_km, road_factor)
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    st.markdown("#### What can I reach?")
+    st.caption(
+        f"{len(reachable_idx):,} of {len(known):,} known chargers in {', '.join(countries)} within range "
+        f"(checked in {elapsed_ms:.1f} ms)."
+    )
+    if len(reachable_idx):
+        shown = reachable_idx[:50]
+        st.dataframe(
+            pd.DataFrame({
+                "Charger": [known.titles[i] or known.operator(i) or "Unknown charger" for i in shown],
+                "Operator": [known.operator(i) or "Unknown" for i in shown],
+                "Est. road distance (mi)": road_km[shown] * 0.621371,
+                "Approx. Power (kW)": known.effective_kw(car_max_kw)[shown],
+            }),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Est. road distance (mi)": st.column_config.NumberColumn(format="%.1f"),
+                "Approx. Power (kW)": st.column_config.NumberColumn(format="%.0f"),
+            },
         )
-        st.dataframe(op_df, hide_index=True, use_container_width=True)
-
-    map_state = st_folium(m, width=800, height=500, key="nearby_chargers_map")
 
-    st.markdown("### Nearby chargers & cheapest card (your cards only)")
-    display_cols = [
-        "Charger", "Operator", "Distance", "Approx. Power (kW)",
-        "Cheapest Card (you own)", f"Est. Session Cost ({comparison_currency})"
-    ]
-    df = pd.DataFrame([
-        {k: v for k, v in row.items() if k in display_cols}
-        for row in rows
-    ])
-    cost_col = f"Est. Session Cost ({comparison_currency})"
-    if cost_col in df.columns:
-        def fmt_cost(x):
-            if x is None or (isinstance(x, float) and np.isnan(x)):
-                return "—"
-            return format_currency(float(x), comparison_currency)
-        df[cost_col] = df[cost_col].apply(fmt_cost)
-    st.dataframe(df, use_container_width=True, hide_index=True)
+    # Detour-aware ranking: cost + value of time over the k nearest compatible chargers
+    st.markdown("#### Best stops near you")
+    col_rank1, col_rank2 = st.columns(2)
+    with col_rank1:
+        rank_k = st.slider("Chargers to rank", 3, 50, Config.RANKING_K, key="nearby_rank_k")
+    with col_rank2:
+        value_of_time = st.slider(
+            f"Value of your time ({comparison_currency}/hour)", 0.0, 60.0,
+            Config.VALUE_OF_TIME_PER_HOUR, 1.0, key="nearby_value_of_time",
+        )
+    started = time.perf_counter()
+    ranked = rank_chargers(
+        charger_index(known), lat, lon, rank_k,
+        battery_kwh, miles_per_kwh, start_pct, end_pct, efficiency_loss, apply_taper,
+        car_max_kw, comparison_currency, exchange_rates, card_set,
+        value_of_time=value_of_time, road_factor=road_factor,
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    if len(ranked["index"]):
+        st.caption(
+            f"Score = session cost + detour energy + time (charging and driving) at "
+            f"{format_currency(value_of_time, comparison_currency)}/h. Ranked in {elapsed_ms:.2f} ms."
+        )
+        st.dataframe(
+            pd.DataFrame({
+                "Charger": [known.titles[i] or known.operator(i) or "Unknown charger" for i in ranked["index"]],
+                "Operator": [known.operator(i) or "Unknown" for i in ranked["index"]],
+                "Card": ranked["card"],
+                "Detour (mi)": ranked["detour_km"] * 0.621371,
+                "Power (kW)": ranked["power_kw"],
+                "Charge time": [format_time(t) for t in ranked["charge_min"]],
+                f"Session cost ({comparison_currency})": ranked["session_cost"],
+                f"Score ({comparison_currency})": ranked["score"],
+            }),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Detour (mi)": st.column_config.NumberColumn(format="%.1f"),
+                "Power (kW)": st.column_config.NumberColumn(format="%.0f"),
+                f"Session cost ({comparison_currency})": st.column_config.NumberColumn(format="%.2f"),
+                f"Score ({comparison_currency})": st.column_config.NumberColumn(format="%.2f"),
+            },
+        )
+    else:
+        st.info("No compatible chargers with your selected cards are known near this location yet.")
 
     # Clicked-charger details with multi-tariff breakdown
     clicked_popup = map_state.get("last_object_clicked_popup")
@@ -965,14 +3069,246 @@ def render_location_and_cards_section(
                 f"≈ {format_currency(cheapest[f'Total Cost ({comparison_currency})'], comparison_currency)}."
             )
 
+# ============================================================================
+# ROUTE ENERGY MODEL
+# ============================================================================
+
+GRAVITY = 9.81
+AIR_DENSITY = 1.2
+
+
+@dataclass(frozen=True)
+class VehiclePhysics:
+    """Road-load parameters; the absolute level is calibrated to the car's miles/kWh."""
+    mass_kg: float = 2000.0
+    cda_m2: float = 0.60  # drag coefficient × frontal area
+    crr: float = 0.009  # rolling resistance
+    drivetrain_eff: float = 0.90
+    regen_eff: float = 0.60  # share of braking / descent energy recovered
+    aux_kw: float = 1.0  # heating, cooling, electronics
+
+
+def decode_polyline_array(encoded: str, is3d: bool = False) -> np.ndarray:
+    """Decode an encoded polyline in one pass: (n, 2) lon/lat, or (n, 3) lon/lat/elevation."""
+    raw = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if raw.size == 0:
+        return np.empty((0, 3 if is3d else 2))
+    last = raw < 0x20  # final 5-bit chunk of each value
+    value_id = np.concatenate(([0], np.cumsum(last)[:-1]))
+    first = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    shift = 5 * (np.arange(raw.size) - first[value_id])
+    values = np.bincount(value_id, weights=(raw & 0x1F) << shift).astype(np.int64)
+    values = np.where(values & 1, ~(values >> 1), values >> 1)
+    dims = 3 if is3d else 2
+    points = np.cumsum(values[: values.size // dims * dims].reshape(-1, dims), axis=0).astype(np.float64)
+    out = np.empty_like(points)
+    out[:, 0] = points[:, 1] / 1e5  # polyline order is lat, lon[, ele]
+    out[:, 1] = points[:, 0] / 1e5
+    if is3d:
+        out[:, 2] = points[:, 2] / 1e2
+    return out
+
+
+class ElevationGrid:
+    """Regular lat/lon height grid (e.g. resampled SRTM), sampled bilinearly.
+
+    Stands in for route elevation when the directions response has none.
+    Stored as an .npz with ascending 1-D "lats" and "lons" and a 2-D "heights"
+    of shape (len(lats), len(lons)) in metres.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, heights: np.ndarray):
+        if len(lats) < 2 or len(lons) < 2 or heights.shape != (len(lats), len(lons)):
+            raise ValueError("elevation grid needs ≥2 lats/lons and heights shaped (lats, lons)")
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.heights = np.asarray(heights, dtype=np.float64)
+
+    @classmethod
+    def load(cls, path: str) -> "ElevationGrid":
+        with np.load(path) as data:
+            return cls(data["lats"], data["lons"], data["heights"])
+
+    def sample(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        # Fractional grid indices; points outside the grid clamp to its edge
+        fi = np.interp(lats, self.lats, np.arange(len(self.lats), dtype=np.float64))
+        fj = np.interp(lons, self.lons, np.arange(len(self.lons), dtype=np.float64))
+        i0 = np.minimum(fi.astype(np.int64), len(self.lats) - 2)
+        j0 = np.minimum(fj.astype(np.int64), len(self.lons) - 2)
+        ti, tj = fi - i0, fj - j0
+        h = self.heights
+        return ((1 - ti) * ((1 - tj) * h[i0, j0] + tj * h[i0, j0 + 1])
+                + ti * ((1 - tj) * h[i0 + 1, j0] + tj * h[i0 + 1, j0 + 1]))
+
+
+@functools.lru_cache(maxsize=1)
+def elevation_grid(path: Optional[str]) -> Optional[ElevationGrid]:
+    """The configured stand-in grid, or None (routes are then treated as flat)."""
+    if not path:
+        return None
+    try:
+        return ElevationGrid.load(path)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def segment_speeds_ms(route: Dict, n_segments: int) -> np.ndarray:
+    """Speed on every geometry segment from the ORS step distances/durations.
+
+    Falls back to the route's average speed where there are no steps.
+    """
+    summary = route.get("summary") or {}
+    duration = summary.get("duration") or 0.0
+    average = summary.get("distance", 0.0) / duration if duration > 0 else Config.ROUTE_REFERENCE_SPEED_KMH / 3.6
+    steps = [
+        s for seg in route.get("segments") or () for s in seg.get("steps") or ()
+        if len(s.get("way_points") or ()) == 2 and s["way_points"][1] > s["way_points"][0]
+    ]
+    if not steps:
+        return np.full(n_segments, average)
+    starts = np.array([s["way_points"][0] for s in steps])
+    distance = np.array([float(s.get("distance", 0.0)) for s in steps])
+    duration = np.array([float(s.get("duration", 0.0)) for s in steps])
+    step_speed = np.where(duration > 0, distance / np.maximum(duration, 1e-9), average)
+    idx = np.searchsorted(starts, np.arange(n_segments), side="right") - 1
+    return np.clip(step_speed[np.clip(idx, 0, len(steps) - 1)], 1.0, 60.0)
+
+
+def segment_energy_kwh(
+    distance_m: np.ndarray,
+    speed_ms: np.ndarray,
+    rise_m: np.ndarray,
+    physics: VehiclePhysics,
+) -> np.ndarray:
+    """Battery energy per segment: rolling + aero + grade work, plus auxiliaries.
+
+    Positive wheel work is drawn through the drivetrain; negative work (descents
+    steeper than the road load) is recovered at the regen efficiency.
+    """
+    wheel_j = (
+        physics.mass_kg * GRAVITY * (physics.crr * distance_m + rise_m)
+        + 0.5 * AIR_DENSITY * physics.cda_m2 * speed_ms ** 2 * distance_m
+    )
+    battery_j = np.where(wheel_j > 0, wheel_j / physics.drivetrain_eff, wheel_j * physics.regen_eff)
+    aux_j = physics.aux_kw * 1000.0 * distance_m / np.maximum(speed_ms, 1.0)
+    return (battery_j + aux_j) / 3.6e6
+
+
+def route_distance_km(coords: np.ndarray, total_distance_m: Optional[float] = None) -> np.ndarray:
+    """Cumulative distance in km at every route vertex.
+
+    total_distance_m (the router's figure) rescales segment lengths, which a
+    simplified geometry understates.
+    """
+    distance_m = haversine_km(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0]) * 1000.0
+    if total_distance_m and distance_m.sum() > 0:
+        distance_m *= total_distance_m / distance_m.sum()
+    return np.concatenate(([0.0], np.cumsum(distance_m) / 1000.0))
+
+
+def route_energy_profile(
+    coords: np.ndarray,
+    speeds_ms: np.ndarray,
+    miles_per_kwh: float,
+    physics: VehiclePhysics = VehiclePhysics(),
+    grid: Optional[ElevationGrid] = None,
+    total_distance_m: Optional[float] = None,
+) -> Dict:
+    """Cumulative distance and energy at every route vertex.
+
+    coords is (n, 2) lon/lat or (n, 3) with elevation. The physics model is
+    scaled so a flat segment at Config.ROUTE_REFERENCE_SPEED_KMH uses exactly
+    1 / miles_per_kwh per mile; speed and grade then move energy either side.
+    total_distance_m rescales segment lengths (see route_distance_km).
+    """
+    lon, lat = coords[:, 0], coords[:, 1]
+    if coords.shape[1] > 2:
+        elevation, source = coords[:, 2], "route"
+    elif grid is not None:
+        elevation, source = grid.sample(lat, lon), "grid"
+    else:
+        elevation, source = np.zeros(len(coords)), "flat"
+
+    distance_km = route_distance_km(coords, total_distance_m)
+    distance_m = np.diff(distance_km) * 1000.0
+    rise_m = np.diff(elevation)
+    reference = segment_energy_kwh(
+        np.array([1609.344]), np.array([Config.ROUTE_REFERENCE_SPEED_KMH / 3.6]), np.zeros(1), physics
+    )[0]
+    scale = 1.0 / (miles_per_kwh * reference)
+    seg_kwh = segment_energy_kwh(distance_m, speeds_ms, rise_m, physics) * scale
+    return {
+        "distance_km": distance_km,
+        "energy_kwh": np.concatenate(([0.0], np.cumsum(seg_kwh))),
+        "elevation_m": elevation,
+        "ascent_m": float(rise_m[rise_m > 0].sum()),
+        "elevation_source": source,
+    }
+
+
+def place_charging_stops(
+    energy_kwh: np.ndarray,
+    battery_kwh: float,
+    start_pct: float,
+    reserve_pct: float,
+    charge_to_pct: float,
+    stop_candidates: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vertices to charge at and the SoC at every vertex.
+
+    Drives to the last vertex that keeps the battery at or above reserve_pct,
+    charges there to charge_to_pct and repeats. With stop_candidates (sorted
+    vertex indices, see corridor_indices) each stop moves back to the last
+    candidate before it. One searchsorted per stop; the SoC profile is then a
+    single gather over per-leg starting levels.
+    """
+    n = len(energy_kwh)
+    stops: List[int] = []
+    pos, level = 0, start_pct
+    while pos < n - 1:
+        budget = (level - reserve_pct) / 100.0 * battery_kwh
+        # energy_kwh is not monotonic with regen, so search its running maximum
+        reach = np.searchsorted(np.maximum.accumulate(energy_kwh[pos:]), energy_kwh[pos] + budget, side="right")
+        j = pos + reach - 1
+        if j >= n - 1:
+            break
+        if stop_candidates is not None:
+            k = np.searchsorted(stop_candidates, j, side="right") - 1
+            if k >= 0 and stop_candidates[k] > pos:
+                j = int(stop_candidates[k])
+        j = max(j, pos + 1)  # a single segment longer than a full leg: stop at its end anyway
+        stops.append(j)
+        pos, level = j, charge_to_pct
+        if charge_to_pct <= reserve_pct:
+            break
+
+    stop_idx = np.array(stops, dtype=np.int64)
+    leg = np.searchsorted(stop_idx, np.arange(n), side="left")
+    leg_start = np.concatenate(([0], stop_idx))
+    leg_level = np.concatenate(([start_pct], np.full(len(stop_idx), charge_to_pct)))
+    soc = leg_level[leg] - (energy_kwh - energy_kwh[leg_start[leg]]) / battery_kwh * 100.0
+    return stop_idx, soc
+
+
+def corridor_indices(distance_km: np.ndarray, spacing_km: float) -> np.ndarray:
+    """Route vertices at every spacing_km mark.
+
+    Charging stops snap to these, so charger lookups along a route use a fixed
+    set of points that the warm-up job can fetch ahead of time.
+    """
+    marks = np.arange(spacing_km, distance_km[-1], spacing_km)
+    return np.unique(np.searchsorted(distance_km, marks))
+
+
 # ============================================================================
 # ROUTE PLANNER (MULTI-TARIFF)
 # ============================================================================
 
-def geocode_place_ors(query: str, headers: Dict[str, str]) -> Tuple[float, float]:
-    url = "https://api.openrouteservice.org/geocode/search"
-    params = {"text": query, "size": 1, "boundary.country": "GB"}
-    r = requests.get(url, headers=headers, params=params, timeout=10)
+@bounded_cache(ttl=7 * 24 * 3600, shared=True, upstream="ors_geocode")
+def geocode_place_ors(query: str, _headers: Dict[str, str]) -> Tuple[float, float]:
+    url = f"{Config.ORS_BASE_URL}/geocode/search"
+    params = {"text": query, "size": 1, "boundary.country": ",".join(Config.CHARGER_COUNTRIES)}
+    r = UPSTREAMS["ors_geocode"].request("get", url, headers=_headers, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
     feats = data.get("features") or []
@@ -982,6 +3318,540 @@ def geocode_place_ors(query: str, headers: Dict[str, str]) -> Tuple[float, float
     return coords[0], coords[1]
 
 
+@bounded_cache(ttl=24 * 3600, shared=True, upstream="ors_directions")
+def fetch_ors_directions(
+    coordinates: Tuple[Tuple[float, float], ...], _headers: Dict[str, str], alternatives: int = 1
+) -> Dict:
+    url_dir = f"{Config.ORS_BASE_URL}/v2/directions/driving-car"
+    body = {"coordinates": coordinates, "elevation": True}
+    if alternatives > 1:
+        body["alternative_routes"] = {
+            "target_count": alternatives,
+            "share_factor": Config.ROUTE_ALTERNATIVE_SHARE,
+            "weight_factor": Config.ROUTE_ALTERNATIVE_WEIGHT,
+        }
+    r_dir = UPSTREAMS["ors_directions"].request("post", url_dir, headers=_headers, json=body, timeout=20)
+    r_dir.raise_for_status()
+    return r_dir.json()
+
+
+class UnexpectedRouteResponse(Exception):
+    def __init__(self, response: Dict):
+        super().__init__("Route service returned an unexpected response.")
+        self.response = response
+
+
+def decode_route_geometry(geom, is3d: bool = False) -> np.ndarray:
+    """Route vertices as an (n, 2) lon/lat or (n, 3) lon/lat/elevation array."""
+    if isinstance(geom, dict) and geom.get("coordinates"):
+        return np.asarray(geom["coordinates"], dtype=np.float64)
+    if isinstance(geom, str):
+        return decode_polyline_array(geom, is3d)
+    return np.empty((0, 2))
+
+
+def decode_ors_routes(route: Dict) -> List[Tuple[Dict, np.ndarray]]:
+    """Every route in an ORS directions response with its vertices, best first."""
+    if "routes" not in route or not route["routes"]:
+        raise UnexpectedRouteResponse(route)
+    is3d = bool(((route.get("metadata") or {}).get("query") or {}).get("elevation"))
+    routes = []
+    for route_i in route["routes"]:
+        coords = decode_route_geometry(route_i.get("geometry"), is3d)
+        if len(coords) < 2:
+            raise UnexpectedRouteResponse(route)
+        routes.append((route_i, coords))
+    return routes
+
+
+def split_ors_legs(route_i: Dict, coords: np.ndarray) -> List[Tuple[Dict, np.ndarray]]:
+    """One multi-waypoint ORS route cut into a route per leg, with its vertices.
+
+    ORS gives a segment per leg and, in way_points, the vertex index of every
+    waypoint; each leg gets its own summary and steps re-indexed to its slice.
+    """
+    way_points = route_i.get("way_points") or []
+    segments = route_i.get("segments") or []
+    if len(way_points) != len(segments) + 1:
+        raise UnexpectedRouteResponse(route_i)
+    legs = []
+    for seg, lo, hi in zip(segments, way_points[:-1], way_points[1:]):
+        leg_coords = coords[lo:hi + 1]
+        if len(leg_coords) < 2:
+            raise UnexpectedRouteResponse(route_i)
+        steps = [
+            {**step, "way_points": [w - lo for w in step.get("way_points") or ()]}
+            for step in seg.get("steps") or ()
+        ]
+        leg = {
+            "summary": {"distance": seg.get("distance", 0.0), "duration": seg.get("duration", 0.0)},
+            "segments": [{**seg, "steps": steps}],
+            "way_points": [0, hi - lo],
+        }
+        legs.append((leg, leg_coords))
+    return legs
+
+
+def rates_future(exchange_rates: Optional[Dict] = None) -> "asyncio.Future[Dict]":
+    """exchange_rates as an already-resolved future, or a fresh FX fetch when None."""
+    if exchange_rates is None:
+        return asyncio.ensure_future(IO_ENGINE.call(fetch_exchange_rates))
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(exchange_rates)
+    return future
+
+
+async def fetch_routes_async(
+    start_location: str,
+    end_location: str,
+    headers: Dict[str, str],
+    alternatives: int = 1,
+) -> Tuple[Tuple[float, float], Tuple[float, float], List[Tuple[Dict, np.ndarray]]]:
+    """Geocode both ends together, then route: (start lon/lat, end lon/lat, [(ORS route, vertices)]).
+
+    With alternatives > 1 ORS is asked for that many alternative routes, best
+    first. ORS refuses alternatives on long routes (HTTP 400); the best route
+    alone is returned then.
+    """
+    start, end = await asyncio.gather(
+        IO_ENGINE.call(geocode_place_ors, start_location, headers),
+        IO_ENGINE.call(geocode_place_ors, end_location, headers),
+    )
+    coordinates = (tuple(start), tuple(end))
+    try:
+        route = await IO_ENGINE.call(fetch_ors_directions, coordinates, headers, alternatives=alternatives)
+    except requests.HTTPError as e:
+        if alternatives <= 1 or e.response is None or e.response.status_code != 400:
+            raise
+        route = await IO_ENGINE.call(fetch_ors_directions, coordinates, headers)
+    return start, end, decode_ors_routes(route)
+
+
+async def fetch_route_async(
+    start_location: str,
+    end_location: str,
+    headers: Dict[str, str],
+) -> Tuple[Tuple[float, float], Tuple[float, float], Dict, np.ndarray]:
+    """Geocode both ends together, then route: (start lon/lat, end lon/lat, ORS route, vertices)."""
+    start, end, routes = await fetch_routes_async(start_location, end_location, headers)
+    route0, coords = routes[0]
+    return start, end, route0, coords
+
+
+def route_stops(
+    route0: Dict,
+    coords: np.ndarray,
+    battery_kwh: float,
+    miles_per_kwh: float,
+    start_pct: float,
+    reserve_pct: float,
+    charge_to_pct: float,
+) -> Tuple[Dict, np.ndarray, np.ndarray]:
+    """Energy profile of one ORS route and where to stop: (profile, stop vertex indices, SoC %)."""
+    profile = route_energy_profile(
+        coords,
+        segment_speeds_ms(route0, len(coords) - 1),
+        miles_per_kwh,
+        grid=elevation_grid(Config.ELEVATION_GRID_PATH),
+        total_distance_m=route0["summary"]["distance"],
+    )
+    stop_idx, soc = place_charging_stops(
+        profile["energy_kwh"], battery_kwh, start_pct, reserve_pct, charge_to_pct,
+        stop_candidates=corridor_indices(profile["distance_km"], Config.CORRIDOR_SPACING_KM),
+    )
+    return profile, stop_idx, soc
+
+
+async def cost_route_async(
+    route0: Dict,
+    coords: np.ndarray,
+    stops: Tuple[Dict, np.ndarray, np.ndarray],
+    battery_kwh: float,
+    miles_per_kwh: float,
+    provider_a: Dict,
+    comparison_currency: str,
+    available_cards: List[str],
+    rates: "asyncio.Future[Dict]",
+    charge_to_pct: float,
+) -> Dict:
+    """Chargers, charging time and cost for the stops route_stops placed on one ORS route.
+
+    The OCM lookups for every stop run together; rates is awaited only once
+    they are done, so the FX refresh overlaps them too. Stop picks then run
+    together on the I/O pool, off the event loop. Stops with no usable
+    charger nearby are counted in "unresolved_stops"; charging time and cost
+    leave them out, so such a route is not feasible as planned.
+    """
+    summary = route0["summary"]
+    distance_km = summary["distance"] / 1000
+    duration_min = summary["duration"] / 60
+    distance_miles = distance_km * 0.621371
+
+    profile, stop_idx, soc = stops
+    required_stops = len(stop_idx)
+    stop_points = [(coords[i, 0], coords[i, 1]) for i in stop_idx]
+
+    # Warm the POI cache for every stop at once; pick_best_charger_stop then hits it.
+    await asyncio.gather(*(
+        IO_ENGINE.call(search_chargers, lat_s, lon_s, distance_km=5, max_results=10)
+        for lon_s, lat_s in stop_points
+    ))
+    exchange_rates = await rates
+
+    total_energy_needed = float(profile["energy_kwh"][-1])
+    est_cost = convert_currency(
+        total_energy_needed * provider_a["energy_price"],
+        provider_a["currency"],
+        comparison_currency,
+        exchange_rates
+    )
+
+    card_set = set(available_cards or [])
+    arrival_socs = [float(max(soc[i], 0.0)) for i in stop_idx]
+    # Time-of-use prices at each stop's arrival, leaving now (driving time only)
+    departure = local_minute_now()
+    total_km = max(float(profile["distance_km"][-1]), 1e-9)
+    arrival_minutes = [
+        (departure + duration_min * float(profile["distance_km"][i]) / total_km) % 1440.0 for i in stop_idx
+    ]
+    picks = await asyncio.gather(*(
+        IO_ENGINE.call(
+            pick_best_charger_stop,
+            lon_s,
+            lat_s,
+            battery_kwh=battery_kwh,
+            miles_per_kwh=miles_per_kwh,
+            start_soc=arrival_soc,
+            end_soc=charge_to_pct,
+            efficiency_loss=Config.DEFAULT_EFFICIENCY_LOSS,
+            apply_taper=True,
+            car_max_kw=provider_a["station_kw"],
+            comparison_currency=comparison_currency,
+            exchange_rates=exchange_rates,
+            available_cards=card_set,
+            plug_in_minute=arrival_minute,
+        )
+        for (lon_s, lat_s), arrival_soc, arrival_minute in zip(stop_points, arrival_socs, arrival_minutes)
+    ))
+    stop_suggestions: List[Dict] = []
+    for best, i, arrival_soc in zip(picks, stop_idx, arrival_socs):
+        if best:
+            best["arrival_soc"] = arrival_soc
+            best["route_miles"] = float(profile["distance_km"][i] * 0.621371)
+            stop_suggestions.append(best)
+
+    charging_min = sum(s["time_min"] for s in stop_suggestions)
+    return {
+        "distance_miles": distance_miles,
+        "duration_min": duration_min,
+        "required_stops": required_stops,
+        "unresolved_stops": required_stops - len(stop_suggestions),
+        "est_cost": est_cost,
+        "charging_min": charging_min,
+        "charging_cost": sum(s["total_cost"] for s in stop_suggestions),
+        "trip_min": duration_min + charging_min,
+        "energy_kwh": total_energy_needed,
+        "ascent_m": profile["ascent_m"],
+        "elevation_source": profile["elevation_source"],
+        "arrival_soc": float(soc[-1]),
+        "geometry": route0.get("geometry"),
+        "coords": coords[:, :2].tolist(),
+        "profile": {
+            "distance_km": profile["distance_km"],
+            "elevation_m": profile["elevation_m"],
+            "soc_pct": soc,
+            "stop_index": stop_idx,
+        },
+        "stops": stop_suggestions,
+    }
+
+
+async def plan_route_async(
+    start_location: str,
+    end_location: str,
+    battery_kwh: float,
+    miles_per_kwh: float,
+    provider_a: Dict,
+    comparison_currency: str,
+    available_cards: List[str],
+    headers: Dict[str, str],
+    start_pct: float = Config.ROUTE_START_PCT,
+    reserve_pct: float = Config.DEFAULT_RESERVE_PCT,
+    charge_to_pct: float = Config.ROUTE_CHARGE_TO_PCT,
+    alternatives: int = 1,
+    exchange_rates: Optional[Dict] = None,
+) -> Dict:
+    """Geocode, route and pick charging stops, overlapping every independent call.
+
+    Both geocodes and the FX refresh run together; directions start as soon as
+    both geocodes resolve; the OCM lookups for all stops then run together.
+    Stops come from the route energy model: drive until the battery would
+    drop below reserve_pct, charge to charge_to_pct, repeat.
+
+    With alternatives > 1, every route ORS offers is costed concurrently (their
+    stop searches share the POI caches) and listed, best first, under
+    "alternatives"; the rest of the plan describes the first. Costs use
+    exchange_rates when given (the caller's rates), else a fresh FX fetch.
+    """
+    rates_task = rates_future(exchange_rates)
+    try:
+        (start_lon, start_lat), (end_lon, end_lat), routes = await fetch_routes_async(
+            start_location, end_location, headers, alternatives
+        )
+    except Exception:
+        rates_task.cancel()
+        raise
+
+    # route_stops is a NumPy pass over the whole polyline: keep it off the event loop.
+    route_stop_sets = await asyncio.gather(*(
+        IO_ENGINE.call(route_stops, route_i, coords, battery_kwh, miles_per_kwh, start_pct, reserve_pct, charge_to_pct)
+        for route_i, coords in routes
+    ))
+    plans = await asyncio.gather(*(
+        cost_route_async(
+            route_i, coords, stops,
+            battery_kwh, miles_per_kwh, provider_a, comparison_currency, available_cards, rates_task, charge_to_pct,
+        )
+        for (route_i, coords), stops in zip(routes, route_stop_sets)
+    ))
+    for plan in plans:
+        plan["start"] = (start_lat, start_lon)
+        plan["end"] = (end_lat, end_lon)
+    if alternatives <= 1:
+        return plans[0]
+    return {**plans[0], "alternatives": plans}
+
+
+def plan_route(*args, **kwargs) -> Dict:
+    """Blocking facade over plan_route_async for Streamlit reruns."""
+    return IO_ENGINE.run(plan_route_async(*args, **kwargs))
+
+
+def join_legs(legs: List[Dict]) -> Dict:
+    """One plan over a whole trip from its leg plans: totals, joined profile, stops and geometry."""
+    offsets_km = np.concatenate(([0.0], np.cumsum([leg["distance_miles"] / 0.621371 for leg in legs])))
+    offsets_idx = np.concatenate(([0], np.cumsum([len(leg["profile"]["distance_km"]) for leg in legs])))
+    stops = []
+    for leg, offset_km in zip(legs, offsets_km):
+        stops.extend({**stop, "route_miles": stop["route_miles"] + offset_km * 0.621371} for stop in leg["stops"])
+    sources = {leg["elevation_source"] for leg in legs}
+    source = sources.pop() if len(sources) == 1 else "mixed"
+    return {
+        "start": legs[0]["start"],
+        "end": legs[-1]["end"],
+        **{key: sum(leg[key] for leg in legs) for key in (
+            "distance_miles", "duration_min", "required_stops", "unresolved_stops", "est_cost",
+            "charging_min", "charging_cost", "trip_min", "energy_kwh", "ascent_m",
+        )},
+        "elevation_source": source,
+        "arrival_soc": legs[-1]["arrival_soc"],
+        "geometry": None,
+        "coords": [point for leg in legs for point in leg["coords"]],
+        "profile": {
+            "distance_km": np.concatenate([
+                leg["profile"]["distance_km"] + offset for leg, offset in zip(legs, offsets_km)
+            ]),
+            "elevation_m": np.concatenate([leg["profile"]["elevation_m"] for leg in legs]),
+            "soc_pct": np.concatenate([leg["profile"]["soc_pct"] for leg in legs]),
+            "stop_index": np.concatenate([
+                leg["profile"]["stop_index"] + offset for leg, offset in zip(legs, offsets_idx)
+            ]).astype(np.int64),
+        },
+        "stops": stops,
+        "legs": legs,
+    }
+
+
+async def plan_trip_async(
+    places: List[str],
+    overnight: List[bool],
+    battery_kwh: float,
+    miles_per_kwh: float,
+    provider_a: Dict,
+    comparison_currency: str,
+    available_cards: List[str],
+    headers: Dict[str, str],
+    start_pct: float = Config.ROUTE_START_PCT,
+    reserve_pct: float = Config.DEFAULT_RESERVE_PCT,
+    charge_to_pct: float = Config.ROUTE_CHARGE_TO_PCT,
+    exchange_rates: Optional[Dict] = None,
+) -> Dict:
+    """Plan a trip through places in order, one leg per consecutive pair.
+
+    overnight[i] says the car charges overnight at places[i] (a home or
+    destination charger), so the next leg starts at start_pct again;
+    otherwise each leg starts with the charge the previous one arrived with.
+    Every distinct place is geocoded at once, then the whole trip is routed in
+    one multi-waypoint directions request (cached) and split into legs, so a
+    long trip costs one ORS directions call rather than one per leg. Only stop
+    placement, a few milliseconds per leg on the I/O pool, runs leg by leg to
+    carry the charge; the charger searches for all legs then run together. As in
+    plan_route_async, exchange_rates (when given) are used instead of a fresh fetch.
+    """
+    if len(places) < 2:
+        raise ValueError("A trip needs at least two places.")
+    if len(overnight) != len(places):
+        raise ValueError("overnight needs one flag per place.")
+    rates_task = rates_future(exchange_rates)
+    try:
+        unique = list(dict.fromkeys(places))
+        points = dict(zip(unique, await asyncio.gather(*(
+            IO_ENGINE.call(geocode_place_ors, place, headers) for place in unique
+        ))))
+        response = await IO_ENGINE.call(
+            fetch_ors_directions, tuple(tuple(points[place]) for place in places), headers
+        )
+        routes = split_ors_legs(*decode_ors_routes(response)[0])
+    except Exception:
+        rates_task.cancel()
+        raise
+
+    leg_stops = []
+    soc_pct = start_pct
+    for i, (route_i, coords) in enumerate(routes):
+        if i and overnight[i]:
+            soc_pct = start_pct
+        stops = await IO_ENGINE.call(
+            route_stops, route_i, coords, battery_kwh, miles_per_kwh, soc_pct, reserve_pct, charge_to_pct
+        )
+        leg_stops.append(stops)
+        soc_pct = float(max(stops[2][-1], 0.0))
+
+    legs = await asyncio.gather(*(
+        cost_route_async(
+            route_i, coords, stops, battery_kwh, miles_per_kwh, provider_a, comparison_currency,
+            available_cards, rates_task, charge_to_pct,
+        )
+        for (route_i, coords), stops in zip(routes, leg_stops)
+    ))
+    for i, leg in enumerate(legs):
+        (start_lon, start_lat), (end_lon, end_lat) = points[places[i]], points[places[i + 1]]
+        leg.update({
+            "from": places[i],
+            "to": places[i + 1],
+            "start": (start_lat, start_lon),
+            "end": (end_lat, end_lon),
+            "overnight_after": bool(overnight[i + 1]) if i + 2 < len(places) else False,
+        })
+    return join_legs(legs)
+
+
+def plan_trip(*args, **kwargs) -> Dict:
+    """Blocking facade over plan_trip_async for Streamlit reruns."""
+    return IO_ENGINE.run(plan_trip_async(*args, **kwargs))
+
+
+def render_route_soc_profile(plan: Dict, reserve_pct: float, max_points: int = 1500):
+    """SoC and elevation along the route, downsampled for the browser."""
+    profile = plan["profile"]
+    n = len(profile["distance_km"])
+    idx = np.unique(np.concatenate((
+        np.linspace(0, n - 1, min(n, max_points)).astype(np.int64),
+        profile["stop_index"],
+    )))
+    df = pd.DataFrame({
+        "Distance (mi)": profile["distance_km"][idx] * 0.621371,
+        "SoC (%)": profile["soc_pct"][idx],
+        "Elevation (m)": profile["elevation_m"][idx],
+    })
+    stops = df[np.isin(idx, profile["stop_index"])]
+    x = alt.X("Distance (mi):Q", title="Distance (mi)")
+    soc_line = alt.Chart(df).mark_line(color="#00ADF0").encode(
+        x=x, y=alt.Y("SoC (%):Q", title="State of charge (%)"),
+        tooltip=[alt.Tooltip("Distance (mi):Q", format=".0f"), alt.Tooltip("SoC (%):Q", format=".0f")],
+    )
+    reserve_rule = alt.Chart(pd.DataFrame({"SoC (%)": [reserve_pct]})).mark_rule(
+        color="#E45756", strokeDash=[4, 3]
+    ).encode(y="SoC (%):Q")
+    stop_points = alt.Chart(stops).mark_point(color="orange", size=120, filled=True).encode(
+        x=x, y="SoC (%):Q",
+        tooltip=[alt.Tooltip("Distance (mi):Q", format=".0f"), alt.Tooltip("SoC (%):Q", format=".0f")],
+    )
+    elevation = alt.Chart(df).mark_area(opacity=0.3, color="gray").encode(
+        x=x, y=alt.Y("Elevation (m):Q", title="Elevation (m)"),
+    ).properties(height=120)
+    st.markdown("### 🔋 Charge along the route")
+    st.altair_chart(
+        alt.vconcat((soc_line + reserve_rule + stop_points).properties(height=260), elevation),
+        use_container_width=True,
+    )
+    sources = {
+        "route": "the route service",
+        "grid": "the local grid",
+        "mixed": "the route service or local grid, varying by leg",
+    }
+    if plan["elevation_source"] == "flat":
+        st.caption("No elevation data for this route; energy assumes flat roads.")
+    else:
+        st.caption(f"Total climb {plan['ascent_m']:,.0f} m "
+                   f"(elevation from {sources.get(plan['elevation_source'], 'the local grid')}).")
+
+
+def format_stops(plan: Dict) -> str:
+    if plan["unresolved_stops"]:
+        return f"{plan['required_stops']} ({plan['unresolved_stops']} without a charger)"
+    return str(plan["required_stops"])
+
+
+def render_trip_legs(legs: List[Dict], comparison_currency: str):
+    st.markdown("### Trip legs")
+    st.dataframe(pd.DataFrame([
+        {
+            "Leg": i + 1,
+            "From": leg["from"],
+            "To": leg["to"] + (" 🛏" if leg["overnight_after"] else ""),
+            "Distance (mi)": f"{leg['distance_miles']:.0f}",
+            "Drive time": format_time(leg["duration_min"]),
+            "Stops": format_stops(leg),
+            "Charging time": format_time(leg["charging_min"]),
+            f"Charging cost ({comparison_currency})": format_currency(leg["charging_cost"], comparison_currency),
+            "Arrive (%)": f"{leg['arrival_soc']:.0f}",
+        }
+        for i, leg in enumerate(legs)
+    ]), hide_index=True, use_container_width=True)
+
+
+def render_route_alternatives(plans: List[Dict], comparison_currency: str) -> int:
+    """Compare alternative routes on trip time and charging cost; returns the one picked to show."""
+    st.markdown("### Route options")
+    if len(plans) == 1:
+        st.caption("OpenRouteService offered a single route for this trip.")
+        return 0
+    labels = [f"Route {chr(ord('A') + i)}" for i in range(len(plans))]
+    # Routes with stops we found no charger for are missing those sessions; never badge them.
+    feasible = [i for i, p in enumerate(plans) if not p["unresolved_stops"]]
+    fastest = min(feasible, key=lambda i: plans[i]["trip_min"], default=None)
+    cheapest = min(feasible, key=lambda i: plans[i]["charging_cost"], default=None)
+    st.dataframe(pd.DataFrame([
+        {
+            "Route": label + (" ⏱" if i == fastest else "") + (" 💰" if i == cheapest else ""),
+            "Distance (mi)": f"{p['distance_miles']:.0f}",
+            "Drive time": format_time(p["duration_min"]),
+            "Stops": format_stops(p),
+            "Charging time": format_time(p["charging_min"]),
+            "Total trip time": format_time(p["trip_min"]),
+            f"Charging cost ({comparison_currency})": format_currency(p["charging_cost"], comparison_currency),
+            "Arrival (%)": f"{p['arrival_soc']:.0f}",
+        }
+        for i, (label, p) in enumerate(zip(labels, plans))
+    ]), hide_index=True, use_container_width=True)
+    points = pd.DataFrame({
+        "Route": labels,
+        "Trip time (h)": [p["trip_min"] / 60.0 for p in plans],
+        "Charging cost": [p["charging_cost"] for p in plans],
+    })
+    st.altair_chart(
+        alt.Chart(points).mark_circle(size=160).encode(
+            x=alt.X("Trip time (h):Q", scale=alt.Scale(zero=False)),
+            y=alt.Y("Charging cost:Q", title=f"Charging cost ({comparison_currency})", scale=alt.Scale(zero=False)),
+            color="Route:N",
+            tooltip=["Route", alt.Tooltip("Trip time (h):Q", format=".2f"), alt.Tooltip("Charging cost:Q", format=".2f")],
+        ).properties(height=220),
+        use_container_width=True,
+    )
+    return labels.index(st.radio("Show on map", labels, horizontal=True, key=f"route_alternative_shown_{len(labels)}"))
+
+
 def render_route_planner(
     battery_kwh: float,
     miles_per_kwh: float,
@@ -1002,106 +3872,130 @@ def render_route_planner(
         end_location = st.text_input("Destination", "Manchester, UK")
     with col_r3:
         plan_clicked = st.button("Plan route", use_container_width=True)
+    with st.expander("➕ Waypoints and overnight stops"):
+        waypoints = st.data_editor(
+            pd.DataFrame({"Via": pd.Series([], dtype=object), "Overnight": pd.Series([], dtype=bool)}),
+            num_rows="dynamic",
+            use_container_width=True,
+            key="route_waypoints",
+            column_config={
+                "Via": st.column_config.TextColumn("Stop along the way", help="Visited in order, e.g. 'York, UK'"),
+                "Overnight": st.column_config.CheckboxColumn(
+                    "Charge overnight here", default=False,
+                    help="A home or hotel charger: the next day starts at the starting charge again.",
+                ),
+            },
+        )
+    vias = [
+        (str(row["Via"]).strip(), bool(row["Overnight"]) if pd.notna(row["Overnight"]) else False)
+        for _, row in waypoints.iterrows()
+        if pd.notna(row["Via"]) and str(row["Via"]).strip()
+    ]
+
+    col_s1, col_s2, col_s3, col_s4 = st.columns(4)
+    with col_s1:
+        route_start_pct = st.slider("Starting charge (%)", 10, 100, Config.ROUTE_START_PCT, 5,
+                                    key="route_start_pct")
+    with col_s2:
+        route_reserve_pct = st.slider("Arrival reserve (%)", 0, 40, Config.DEFAULT_RESERVE_PCT, 1,
+                                      key="route_reserve_pct")
+    with col_s3:
+        route_charge_to_pct = st.slider("Charge stops to (%)", 50, 100, Config.ROUTE_CHARGE_TO_PCT, 5,
+                                        key="route_charge_to_pct")
+    with col_s4:
+        route_alternatives = st.number_input("Routes to compare", 1, Config.ROUTE_ALTERNATIVES_MAX, 1,
+                                             key="route_alternatives",
+                                             help="Ask for alternative routes and cost each one.")
 
     if plan_clicked:
         st.session_state["route_planned"] = True
     if not st.session_state["route_planned"]:
         return
 
-    ORS_API_KEY = st.secrets.get("ORS_API_KEY")
+    ORS_API_KEY = get_secret("ORS_API_KEY")
     if not ORS_API_KEY:
         st.error("Missing OpenRouteService API key. Add ORS_API_KEY to Streamlit secrets.")
         return
 
     headers = {"Authorization": ORS_API_KEY}
-    card_set = set(available_cards or [])
+    if route_charge_to_pct <= route_reserve_pct + 5:
+        st.warning("Charge-to level must be well above the arrival reserve.")
+        return
 
     try:
-        start_lon, start_lat = geocode_place_ors(start_location, headers)
-        end_lon, end_lat = geocode_place_ors(end_location, headers)
-
-        url_dir = "https://api.openrouteservice.org/v2/directions/driving-car"
-        body = {"coordinates": [[start_lon, start_lat], [end_lon, end_lat]]}
-        r_dir = requests.post(url_dir, headers=headers, json=body, timeout=20)
-        r_dir.raise_for_status()
-        route = r_dir.json()
-
-        if "routes" not in route or not route["routes"]:
-            st.error("Route service returned an unexpected response.")
-            st.caption(f"Raw response: {json.dumps(route, indent=2)[:600]}")
-            return
-
-        route0 = route["routes"][0]
-        summary = route0["summary"]
-        distance_km = summary["distance"] / 1000
-        duration_min = summary["duration"] / 60
-        distance_miles = distance_km * 0.621371
-
-        usable_battery = battery_kwh * 0.70
-        max_range = usable_battery * miles_per_kwh
-        required_stops = max(0, int(distance_miles // max_range))
-
-        total_energy_needed = distance_miles / miles_per_kwh
-        energy_price = provider_a["energy_price"]
-        est_cost_native = total_energy_needed * energy_price
-        est_cost = convert_currency(
-            est_cost_native,
-            provider_a["currency"],
-            comparison_currency,
-            exchange_rates
-        )
+        if vias:
+            plan = plan_trip(
+                [start_location, *(place for place, _ in vias), end_location],
+                [False, *(night for _, night in vias), False],
+                battery_kwh=battery_kwh,
+                miles_per_kwh=miles_per_kwh,
+                provider_a=provider_a,
+                comparison_currency=comparison_currency,
+                available_cards=available_cards,
+                headers=headers,
+                start_pct=route_start_pct,
+                reserve_pct=route_reserve_pct,
+                charge_to_pct=route_charge_to_pct,
+                exchange_rates=exchange_rates,
+            )
+            if route_alternatives > 1:
+                st.caption("Alternative routes are only compared for trips without waypoints.")
+                route_alternatives = 1
+            render_trip_legs(plan["legs"], comparison_currency)
+        else:
+            plan = plan_route(
+                start_location,
+                end_location,
+                battery_kwh=battery_kwh,
+                miles_per_kwh=miles_per_kwh,
+                provider_a=provider_a,
+                comparison_currency=comparison_currency,
+                available_cards=available_cards,
+                headers=headers,
+                start_pct=route_start_pct,
+                reserve_pct=route_reserve_pct,
+                charge_to_pct=route_charge_to_pct,
+                alternatives=int(route_alternatives),
+                exchange_rates=exchange_rates,
+            )
+        alternatives = plan.get("alternatives", [plan])
+        if route_alternatives > 1:
+            plan = alternatives[render_route_alternatives(alternatives, comparison_currency)]
+        start_lat, start_lon = plan["start"]
+        end_lat, end_lon = plan["end"]
+        stop_suggestions = plan["stops"]
 
         col_m1, col_m2, col_m3, col_m4 = st.columns(4)
-        col_m1.metric("Distance", f"{distance_miles:.1f} mi")
-        col_m2.metric("Drive time", format_time(duration_min))
-        col_m3.metric("Charging stops", required_stops)
+        col_m1.metric("Distance", f"{plan['distance_miles']:.1f} mi")
+        col_m2.metric("Drive time", format_time(plan["duration_min"]))
+        col_m3.metric("Charging stops", plan["required_stops"])
         col_m4.metric("Est. charging cost",
-                      format_currency(est_cost, comparison_currency))
-
-        stop_fractions: List[float] = []
-        if required_stops == 1:
-            stop_fractions = [0.5]
-        elif required_stops >= 2:
-            step = 1.0 / (required_stops + 1)
-            stop_fractions = [step * (i + 1) for i in range(required_stops)]
-
-        geom = route0.get("geometry")
-        coords: List[Tuple[float, float]] = []
-        if isinstance(geom, dict) and geom.get("coordinates"):
-            coords = geom["coordinates"]
-        elif isinstance(geom, str):
-            decoded = convert.decode_polyline(geom)
-            coords = decoded["coordinates"]
-
-        stop_suggestions: List[Dict] = []
-        if coords and stop_fractions:
-            n = len(coords) - 1
-            for frac in stop_fractions:
-                idx = int(round(frac * n))
-                idx = max(0, min(n, idx))
-                lon_s, lat_s = coords[idx]
-                best = pick_best_charger_stop(
-                    lon_s,
-                    lat_s,
-                    battery_kwh=battery_kwh,
-                    miles_per_kwh=miles_per_kwh,
-                    start_soc=10.0,
-                    end_soc=80.0,
-                    efficiency_loss=Config.DEFAULT_EFFICIENCY_LOSS,
-                    apply_taper=True,
-                    car_max_kw=provider_a["station_kw"],
-                    comparison_currency=comparison_currency,
-                    exchange_rates=exchange_rates,
-                    available_cards=card_set,
-                )
-                if best:
-                    stop_suggestions.append(best)
+                      format_currency(plan["est_cost"], comparison_currency))
+        col_e1, col_e2, col_e3 = st.columns(3)
+        col_e1.metric("Route energy", f"{plan['energy_kwh']:.1f} kWh")
+        col_e2.metric("Efficiency", f"{plan['distance_miles'] / max(plan['energy_kwh'], 1e-9):.2f} mi/kWh",
+                      delta=f"{plan['distance_miles'] / max(plan['energy_kwh'], 1e-9) - miles_per_kwh:+.2f} vs rated")
+        col_e3.metric("Arrival charge", f"{plan['arrival_soc']:.0f}%")
+        render_route_soc_profile(plan, route_reserve_pct)
+        if plan["unresolved_stops"]:
+            st.warning(
+                f"No usable charger found near {plan['unresolved_stops']} of the "
+                f"{plan['required_stops']} charging stops, so this plan is not drivable as shown; "
+                "charging time and cost leave those stops out."
+            )
 
         if stop_suggestions:
-            st.markdown("### Suggested charging stops (cheapest with your cards)")
+            st.markdown("### Suggested charging stops (best value with your cards)")
+            st.caption(
+                f"Each stop is the nearby charger with the lowest score: session cost + detour energy "
+                f"+ charging and detour time (there and back) at "
+                f"{format_currency(Config.VALUE_OF_TIME_PER_HOUR, comparison_currency)}/h."
+            )
             df_stops = pd.DataFrame([
                 {
                     "Stop #": i + 1,
+                    "At (mi)": f"{s['route_miles']:.0f}",
+                    "Arrive (%)": f"{s['arrival_soc']:.0f}",
                     "Charger": s["charger_name"],
                     "Operator": s["operator"],
                     "Power (kW)": f"{s['power_kw']:.0f}",
@@ -1115,19 +4009,14 @@ def render_route_planner(
 
         m = folium.Map(location=[start_lat, start_lon], zoom_start=6)
 
+        for other in alternatives:
+            if other is not plan:
+                folium.PolyLine([(lat, lon) for lon, lat in other["coords"]], color="gray", weight=3,
+                                opacity=0.6).add_to(m)
         try:
-            route_geom = None
-            if isinstance(geom, dict):
-                route_geom = geom
-            elif isinstance(geom, str):
-                decoded = convert.decode_polyline(geom)
-                route_geom = {
-                    "type": "LineString",
-                    "coordinates": decoded["coordinates"],
-                }
-            if route_geom is not None:
-                route_feature = {"type": "Feature", "geometry": route_geom, "properties": {}}
-                folium.GeoJson(route_feature).add_to(m)
+            route_geom = {"type": "LineString", "coordinates": plan["coords"]}
+            route_feature = {"type": "Feature", "geometry": route_geom, "properties": {}}
+            folium.GeoJson(route_feature).add_to(m)
         except Exception:
             st.caption("Failed to decode route geometry; showing markers only.")
 
@@ -1142,6 +4031,14 @@ def render_route_planner(
             icon=folium.Icon(color="red")
         ).add_to(m)
 
+        for leg in plan.get("legs", [])[:-1]:
+            folium.Marker(
+                list(leg["end"]),
+                tooltip=f"{leg['to']}{' (overnight)' if leg['overnight_after'] else ''}",
+                icon=folium.Icon(color="darkblue" if leg["overnight_after"] else "blue",
+                                 icon="bed" if leg["overnight_after"] else "flag", prefix="fa"),
+            ).add_to(m)
+
         for i, s in enumerate(stop_suggestions):
             folium.Marker(
                 [s["lat"], s["lon"]],
@@ -1176,6 +4073,12 @@ def render_route_planner(
             except Exception:
                 pass
 
+    except UpstreamUnavailable as e:
+        st.error("OpenRouteService is not responding right now; please try again in a minute.")
+        st.caption(str(e))
+    except UnexpectedRouteResponse as e:
+        st.error("Route service returned an unexpected response.")
+        st.caption(f"Raw response: {json.dumps(e.response, indent=2)[:600]}")
     except requests.HTTPError as e:
         body = ""
         try:
@@ -1185,9 +4088,9 @@ def render_route_planner(
         if e.response is not None and e.response.status_code == 400 and "2004" in body:
             st.error(
                 "Route is too long for this OpenRouteService plan (> 6,000 km), "
-                "or one of the locations was geocoded outside the UK."
+                "or one of the locations was geocoded outside the supported countries."
             )
-            st.caption("Try more precise UK names, e.g. 'Eastbourne, UK' and 'Manchester, UK'.")
+            st.caption("Try more precise names, e.g. 'Eastbourne, UK' and 'Calais, France'.")
         else:
             st.error("Route calculation failed (HTTP error).")
             st.caption(f"Status: {e.response.status_code if e.response else 'unknown'}, "
@@ -1196,6 +4099,139 @@ def render_route_planner(
         st.error("Route calculation failed. Check locations or API key.")
         st.caption(str(e))
 
+# ============================================================================
+# CACHE WARM-UP
+# ============================================================================
+
+def normalize_postcode(postcode: str) -> str:
+    """Canonical spelling so 'sw1a  1aa' and 'SW1A 1AA' share one geocode cache entry."""
+    return " ".join(postcode.upper().split())
+
+
+def load_hotspots(path: str) -> Dict[str, List]:
+    """Warm-up targets: {"places": [postcode or {"name", "lat", "lon"}], "routes": [[start, end]]}."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {"places": [], "routes": []}
+    return {"places": list(data.get("places", [])), "routes": [tuple(r) for r in data.get("routes", [])]}
+
+
+async def warm_up_async(
+    hotspots: Dict[str, List],
+    headers: Optional[Dict[str, str]] = None,
+    horizon_s: float = 0.0,
+) -> Dict[str, int]:
+    """Fill the FX, POI, geocode and route caches for the configured hotspots.
+
+    Every entry a user would hit at a hotspot is fetched: the postcode geocode,
+    each nearby search ring, and for each city pair the geocodes, the directions
+    and the chargers at every corridor point (the only places route stops look).
+    Entries still valid for longer than horizon_s are left alone, so a scheduled
+    run only refreshes what is about to expire. Calls run concurrently; the
+    per-upstream limiters keep them within Config.UPSTREAM_LIMITS.
+    """
+    limits = {name: asyncio.Semaphore(n) for name, (n, _, _) in Config.UPSTREAM_LIMITS.items()}
+    stats = {"fetched": 0, "fresh": 0, "failed": 0}
+
+    async def warm(upstream: str, func, *args, **kwargs):
+        if func.time_left(*args, **kwargs) > horizon_s:
+            stats["fresh"] += 1
+            return func(*args, **kwargs)
+        async with limits[upstream]:  # leave I/O threads free for users; UPSTREAMS does the pacing
+            try:
+                value = await IO_ENGINE.call(func.refresh, *args, **kwargs)
+            except Exception:
+                stats["failed"] += 1
+                return None
+        stats["fetched"] += 1
+        return value
+
+    async def warm_place(place):
+        if isinstance(place, dict):
+            lat, lon = float(place["lat"]), float(place["lon"])
+        else:
+            coords = await warm("nominatim", geocode_postcode, normalize_postcode(place))
+            if not coords:
+                return
+            lat, lon = coords
+        await asyncio.gather(*(
+            warm("ocm", fetch_nearby_chargers, lat, lon, distance_km=radius_km, max_results=max_results,
+                 country=country)
+            for radius_km, max_results in Config.NEARBY_SEARCH_RINGS
+            for country in countries_near(lat, lon, radius_km)
+        ))
+
+    async def warm_route(start_location: str, end_location: str):
+        start, end = await asyncio.gather(
+            warm("ors_geocode", geocode_place_ors, start_location, headers),
+            warm("ors_geocode", geocode_place_ors, end_location, headers),
+        )
+        if start is None or end is None:
+            return
+        route = await warm("ors_directions", fetch_ors_directions, (tuple(start), tuple(end)), headers)
+        if not route:
+            return
+        try:
+            route0, coords = decode_ors_routes(route)[0]
+        except UnexpectedRouteResponse:
+            return
+        # The same corridor route_stops snaps stops to
+        distance_km = route_distance_km(coords, route0["summary"]["distance"])
+        await asyncio.gather(*(
+            warm("ocm", fetch_nearby_chargers, coords[i, 1], coords[i, 0], distance_km=5, max_results=10,
+                 country=country)
+            for i in corridor_indices(distance_km, Config.CORRIDOR_SPACING_KM)
+            for country in countries_near(coords[i, 1], coords[i, 0], 5)
+        ))
+
+    compile_tariffs(tuple(CHARGING_PROVIDERS))
+    # Operator names first: every POI fetch below needs them
+    await asyncio.gather(warm("fx", fetch_exchange_rates), *([warm("ocm", fetch_ocm_operators)] if OCM_API_KEY else []))
+    jobs = []
+    if OCM_API_KEY:
+        jobs.extend(warm_place(place) for place in hotspots["places"])
+    if headers:
+        jobs.extend(warm_route(start, end) for start, end in hotspots["routes"])
+    await asyncio.gather(*jobs)
+    return stats
+
+
+def warm_up(horizon_s: float = 0.0) -> Dict[str, int]:
+    """Blocking warm-up of the hotspots in Config.HOTSPOTS_PATH."""
+    ors_api_key = get_secret("ORS_API_KEY")
+    headers = {"Authorization": ors_api_key} if ors_api_key else None
+    return IO_ENGINE.run(warm_up_async(load_hotspots(Config.HOTSPOTS_PATH), headers, horizon_s))
+
+
+# Process-wide, like IO_ENGINE, so reruns of the script don't start another thread
+_warm_up_state: Dict[str, object] = process_resource(
+    "warm_up", lambda: {"lock": threading.Lock(), "thread": None}
+)
+
+
+def start_background_warm_up(interval_s: Optional[float] = Config.WARMUP_INTERVAL_S) -> None:
+    """Warm the caches now on a daemon thread, then every interval_s seconds (if set). Idempotent."""
+    def loop():
+        while True:
+            try:
+                stats = warm_up(horizon_s=interval_s or 0.0)
+                logger.info("warm-up: %d fetched, %d still fresh, %d failed",
+                            stats["fetched"], stats["fresh"], stats["failed"])
+            except Exception:
+                logger.exception("warm-up failed")
+            if not interval_s:
+                return
+            time.sleep(interval_s)
+
+    with _warm_up_state["lock"]:
+        if _warm_up_state["thread"] is not None:
+            return
+        _warm_up_state["thread"] = threading.Thread(target=loop, name="evcp-warm-up", daemon=True)
+        _warm_up_state["thread"].start()
+
+
 # ============================================================================
 # PROVIDER COMPARISON
 # ============================================================================
@@ -1279,6 +4315,1077 @@ def render_results(
         )
         st.markdown(f'<span class="success-badge">Choose {winner}</span>', unsafe_allow_html=True)
 
+def render_tariff_rules_comparison(
+    battery_kwh: float,
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    car_max_kw: float,
+    comparison_currency: str,
+    rates: Dict,
+):
+    st.markdown("### ⏱ Time-of-use, grace period and overstay rules")
+    col1, col2 = st.columns(2)
+    with col1:
+        plug_in = st.time_input("Plug-in time", value=dt_time(18, 0), key="rules_plug_in")
+    with col2:
+        idle_minutes = st.number_input(
+            "Minutes left plugged in after charging", 0, 600, 0, 5, key="rules_idle"
+        )
+
+    if end_pct <= start_pct:
+        st.info("Increase your target SoC above your current SoC to estimate costs.")
+        return
+
+    names = tuple(CHARGING_PROVIDERS.keys())
+    presets = [CHARGING_PROVIDERS[n] for n in names]
+    compiled = compile_tariffs(names)
+    effective_kw = np.minimum([p["default_kw"] for p in presets], car_max_kw)
+    minutes = calculate_charging_time_vectorized(
+        battery_kwh, effective_kw, start_pct, end_pct, apply_taper
+    )
+    energy_needed = battery_kwh * ((end_pct - start_pct) / 100.0) * (1.0 + efficiency_loss / 100.0)
+    fx = currency_factors(list(compiled.currencies), comparison_currency, rates)
+    flat_cost = calculate_charging_cost(
+        energy_needed, minutes,
+        np.array([p["energy"] for p in presets]), np.array([p["time"] for p in presets]), 0.0,
+    ) * fx
+    rules_cost = calculate_session_costs_compiled(
+        compiled, battery_kwh, effective_kw, start_pct, end_pct, efficiency_loss,
+        apply_taper, plug_in.hour * 60 + plug_in.minute, idle_minutes,
+    ) * fx
+
+    df = pd.DataFrame({
+        "Provider": names,
+        "Power (kW)": effective_kw,
+        "Charging time": [format_time(m) for m in minutes],
+        f"Flat estimate ({comparison_currency})": flat_cost,
+        f"With tariff rules ({comparison_currency})": rules_cost,
+        f"Difference ({comparison_currency})": rules_cost - flat_cost,
+    }).sort_values(by=f"With tariff rules ({comparison_currency})")
+    st.dataframe(
+        df,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Power (kW)": st.column_config.NumberColumn(format="%.0f"),
+            f"Flat estimate ({comparison_currency})": st.column_config.NumberColumn(format="%.2f"),
+            f"With tariff rules ({comparison_currency})": st.column_config.NumberColumn(format="%.2f"),
+            f"Difference ({comparison_currency})": st.column_config.NumberColumn(format="%+.2f"),
+        },
+    )
+
+def pareto_front(cost, minutes, groups=None) -> np.ndarray:
+    """Mask of options no other option in the same group beats on both cost and time.
+
+    Options are sorted by group, time, cost. An option is on the front when it is
+    strictly cheaper than everything at least as fast before it in its group.
+    """
+    cost = np.asarray(cost, dtype=float)
+    minutes = np.asarray(minutes, dtype=float)
+    groups = np.zeros(len(cost), dtype=int) if groups is None else np.asarray(groups)
+    if not len(cost):
+        return np.zeros(0, dtype=bool)
+    order = np.lexsort((cost, minutes, groups))
+    # Shift each group wholly below the previous one so the running minimum restarts per group
+    span = cost.max() - cost.min() + 1.0
+    shifted = cost[order] - groups[order] * span
+    best_before = np.concatenate(([np.inf], np.minimum.accumulate(shifted)[:-1]))
+    on_front = np.empty(len(cost), dtype=bool)
+    on_front[order] = shifted < best_before
+    return on_front
+
+
+def compare_providers(
+    provider_names: List[str],
+    power_levels_kw: List[float],
+    start_pcts: List[float],
+    end_pcts: List[float],
+    battery_kwh: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    car_max_kw: float,
+    comparison_currency: str,
+    rates: Dict,
+    plug_in_minute: float = 0.0,
+) -> pd.DataFrame:
+    """Cost and time of every provider × charger power × (start, end) SoC pair in one pass.
+
+    Powers are capped at car_max_kw. Home tariffs are only evaluated up to their
+    default_kw, and pairs with end <= start are dropped. Rank orders options by
+    cost within each SoC pair; Pareto marks the undominated cost/time options.
+    """
+    names = tuple(provider_names)
+    presets = [CHARGING_PROVIDERS[name] for name in names]
+    compiled = compile_tariffs(names)
+    power = np.unique(np.minimum(np.asarray(power_levels_kw, dtype=float), car_max_kw))
+    start, end = (a.ravel() for a in np.meshgrid(
+        np.asarray(start_pcts, dtype=float), np.asarray(end_pcts, dtype=float), indexing="ij"
+    ))
+    start, end = start[end > start], end[end > start]
+
+    # Session axis: every SoC pair × power, against a trailing provider axis
+    scenario = np.repeat(np.arange(len(start)), len(power))
+    session_kw = np.tile(power, len(start))
+    cost = calculate_session_costs_compiled(
+        compiled, battery_kwh, session_kw[:, None], start[scenario][:, None], end[scenario][:, None],
+        efficiency_loss, apply_taper, plug_in_minute,
+    ) * currency_factors(list(compiled.currencies), comparison_currency, rates)
+    minutes = calculate_charging_time_vectorized(
+        battery_kwh, session_kw, start[scenario], end[scenario], apply_taper
+    )
+    home_max_kw = np.array([p["default_kw"] if p["type"] == "home" else np.inf for p in presets])
+    valid = (session_kw[:, None] <= home_max_kw).ravel()
+
+    s_idx, m_idx = (idx.ravel() for idx in np.indices(cost.shape))
+    df = pd.DataFrame({
+        "Start %": start[scenario][s_idx],
+        "End %": end[scenario][s_idx],
+        "Provider": pd.Categorical.from_codes(m_idx, categories=names),
+        "Power (kW)": session_kw[s_idx],
+        "Time (min)": minutes[s_idx],
+        f"Cost ({comparison_currency})": cost.ravel(),
+        "_scenario": scenario[s_idx],
+    })[valid].reset_index(drop=True)
+    df["Rank"] = df.groupby("_scenario")[f"Cost ({comparison_currency})"].rank(method="min").astype(int)
+    df["Pareto"] = pareto_front(df[f"Cost ({comparison_currency})"], df["Time (min)"], df["_scenario"])
+    return df.drop(columns="_scenario")
+
+
+def render_provider_sweep(
+    battery_kwh: float,
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    car_max_kw: float,
+    comparison_currency: str,
+    rates: Dict,
+):
+    st.markdown("### 📊 All providers: cost vs. charging time")
+    all_names = list(CHARGING_PROVIDERS.keys())
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        names = st.multiselect("Providers", all_names, default=all_names, key="sweep_providers")
+    with col2:
+        powers = st.multiselect(
+            "Charger powers (kW)", list(Config.FLEET_POWER_LEVELS_KW),
+            default=list(Config.FLEET_POWER_LEVELS_KW), key="sweep_powers",
+        )
+    with col3:
+        plug_in = st.time_input("Plug-in time", value=dt_time(18, 0), key="sweep_plug_in")
+
+    if not names or not powers:
+        st.info("Pick at least one provider and one charger power.")
+        return
+    if end_pct <= start_pct:
+        st.info("Increase your target SoC above your current SoC to compare providers.")
+        return
+
+    cost_col = f"Cost ({comparison_currency})"
+    plug_in_minute = plug_in.hour * 60 + plug_in.minute
+    df = compare_providers(
+        names, powers, [start_pct], [end_pct], battery_kwh, efficiency_loss,
+        apply_taper, car_max_kw, comparison_currency, rates, plug_in_minute,
+    )
+    front = df[df["Pareto"]].sort_values("Time (min)")
+
+    points = alt.Chart(df).mark_circle(opacity=0.6).encode(
+        x=alt.X("Time (min):Q", title="Charging time (min)"),
+        y=alt.Y(f"{cost_col}:Q", title=cost_col),
+        color=alt.Color("Provider:N", legend=alt.Legend(columns=2)),
+        size=alt.condition("datum.Pareto", alt.value(140), alt.value(40)),
+        tooltip=["Provider", "Power (kW)", alt.Tooltip("Time (min):Q", format=".0f"),
+                 alt.Tooltip(f"{cost_col}:Q", format=".2f"), "Pareto"],
+    )
+    frontier = alt.Chart(front).mark_line(color="#00ADF0", strokeDash=[4, 3]).encode(
+        x="Time (min):Q", y=f"{cost_col}:Q",
+    )
+    st.altair_chart((points + frontier).properties(height=380), use_container_width=True)
+
+    st.markdown("**Pareto-optimal options** — nothing else is both cheaper and faster")
+    st.dataframe(
+        front[["Provider", "Power (kW)", "Time (min)", cost_col, "Rank"]],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Power (kW)": st.column_config.NumberColumn(format="%.0f"),
+            "Time (min)": st.column_config.NumberColumn(format="%.0f"),
+            cost_col: st.column_config.NumberColumn(format="%.2f"),
+        },
+    )
+
+    with st.expander("Across a grid of start/end SoC"):
+        col_g1, col_g2, col_g3 = st.columns(3)
+        with col_g1:
+            start_range = st.slider("Start SoC range (%)", 0, 90, (10, 50), 5, key="sweep_start_range")
+        with col_g2:
+            end_range = st.slider("End SoC range (%)", 10, 100, (60, 100), 5, key="sweep_end_range")
+        with col_g3:
+            step = st.select_slider("Step (%)", [1, 2, 5, 10], value=5, key="sweep_step")
+        started = time.perf_counter()
+        grid = compare_providers(
+            names, powers,
+            np.arange(start_range[0], start_range[1] + 1, step),
+            np.arange(end_range[0], end_range[1] + 1, step),
+            battery_kwh, efficiency_loss, apply_taper, car_max_kw,
+            comparison_currency, rates, plug_in_minute,
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if grid.empty:
+            st.info("No SoC pairs in this grid end above where they start.")
+            return
+        st.caption(f"{len(grid):,} options evaluated in {elapsed_ms:.0f} ms.")
+        cheapest = grid[grid["Rank"] == 1].drop_duplicates(["Start %", "End %"])
+        cheapest = cheapest.assign(
+            Option=cheapest["Provider"].astype(str) + " @ " + cheapest["Power (kW)"].map("{:.0f} kW".format)
+        )
+        front_sizes = grid[grid["Pareto"]].groupby(["Start %", "End %"]).size().rename("Pareto options")
+        summary = cheapest.set_index(["Start %", "End %"])[["Option", cost_col, "Time (min)"]].join(front_sizes)
+        st.dataframe(
+            summary.reset_index(),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Start %": st.column_config.NumberColumn(format="%.0f"),
+                "End %": st.column_config.NumberColumn(format="%.0f"),
+                cost_col: st.column_config.NumberColumn(format="%.2f"),
+                "Time (min)": st.column_config.NumberColumn(format="%.0f"),
+            },
+        )
+
+def soc_sweep_curves(
+    provider_names: List[str],
+    battery_kwh: float,
+    start_pct: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    car_max_kw: float,
+    miles_per_kwh: float,
+    comparison_currency: str,
+    rates: Dict,
+    plug_in_minute: float = 0.0,
+) -> pd.DataFrame:
+    """Cost, minutes and marginal cost per added mile for every whole target SoC above start_pct.
+
+    Each card charges at its default_kw capped by car_max_kw. Marginal cost is
+    the extra cost of the last 1% step over the miles that step adds, so fixed
+    session fees only show up in the total.
+    """
+    names = tuple(provider_names)
+    compiled = compile_tariffs(names)
+    effective_kw = np.minimum([CHARGING_PROVIDERS[n]["default_kw"] for n in names], car_max_kw)
+    # Include the target equal to start so the first step has a baseline
+    targets = np.arange(np.floor(start_pct), 101.0)
+    targets[0] = start_pct
+    cost = calculate_session_costs_compiled(
+        compiled, battery_kwh, effective_kw, start_pct, targets[:, None],
+        efficiency_loss, apply_taper, plug_in_minute,
+    ) * currency_factors(list(compiled.currencies), comparison_currency, rates)
+    minutes = calculate_charging_time_vectorized(
+        battery_kwh, effective_kw, start_pct, targets[:, None], apply_taper
+    )
+    step_miles = np.diff(targets)[:, None] / 100.0 * battery_kwh * miles_per_kwh
+    marginal = np.diff(cost, axis=0) / step_miles
+
+    t_idx, m_idx = (idx.ravel() for idx in np.indices(marginal.shape))
+    return pd.DataFrame({
+        "Card": pd.Categorical.from_codes(m_idx, categories=names),
+        "Power (kW)": effective_kw[m_idx],
+        "Target %": targets[1:][t_idx],
+        f"Cost ({comparison_currency})": cost[1:].ravel(),
+        "Time (min)": minutes[1:].ravel(),
+        f"Marginal cost / mile ({comparison_currency})": marginal.ravel(),
+    })
+
+
+def render_soc_sweep(
+    battery_kwh: float,
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    car_max_kw: float,
+    miles_per_kwh: float,
+    comparison_currency: str,
+    rates: Dict,
+    available_cards: List[str],
+):
+    st.markdown("### 🎯 Where does topping up stop paying?")
+    if not available_cards:
+        st.info("Select the payment options you have to see their target SoC curves.")
+        return
+    if start_pct >= 100:
+        st.info("Your battery is already full.")
+        return
+
+    # Shares the plug-in time picked in the provider sweep above
+    plug_in = st.session_state.get("sweep_plug_in", dt_time(18, 0))
+    df = soc_sweep_curves(
+        available_cards, battery_kwh, start_pct, efficiency_loss, apply_taper,
+        car_max_kw, miles_per_kwh, comparison_currency, rates, plug_in.hour * 60 + plug_in.minute,
+    )
+    metrics = {
+        "Marginal cost per added mile": f"Marginal cost / mile ({comparison_currency})",
+        "Total cost": f"Cost ({comparison_currency})",
+        "Charging time": "Time (min)",
+    }
+    metric = st.radio("Show", list(metrics), horizontal=True, key="soc_sweep_metric")
+    column = metrics[metric]
+
+    lines = alt.Chart(df).mark_line().encode(
+        x=alt.X("Target %:Q", title="Target SoC (%)", scale=alt.Scale(domain=[start_pct, 100])),
+        y=alt.Y(f"{column}:Q", title=column),
+        color=alt.Color("Card:N", legend=alt.Legend(columns=2)),
+        tooltip=["Card", "Power (kW)", "Target %", alt.Tooltip(f"{column}:Q", format=".2f")],
+    )
+    target_rule = alt.Chart(pd.DataFrame({"Target %": [end_pct]})).mark_rule(
+        color="#FF6B6B", strokeDash=[4, 3]
+    ).encode(x="Target %:Q")
+    st.altair_chart((lines + target_rule).properties(height=380), use_container_width=True)
+    st.caption(
+        "Marginal cost is what the last 1% cost per mile it adds. Per-minute tariffs climb "
+        "past 80% and 90%, where taper slows charging."
+    )
+
+    at_targets = df[df["Target %"].isin([end_pct, 80.0, 90.0, 100.0])]
+    st.dataframe(
+        at_targets.pivot_table(
+            index="Card", columns="Target %", values=metrics["Total cost"], observed=True
+        ).rename(columns=lambda t: f"{t:.0f}%"),
+        use_container_width=True,
+        column_config={
+            col: st.column_config.NumberColumn(format="%.2f")
+            for col in (f"{t:.0f}%" for t in at_targets["Target %"].unique())
+        },
+    )
+
+# ============================================================================
+# COST UNCERTAINTY (MONTE CARLO)
+# ============================================================================
+
+MONTE_CARLO_DISTRIBUTIONS = ("Fixed", "Normal", "Uniform", "Triangular")
+
+
+def sample_distribution(
+    rng: np.random.Generator,
+    kind: str,
+    centre: float,
+    spread: float,
+    n: int,
+    low: float,
+    high: float,
+) -> np.ndarray:
+    """Draw n values around centre; spread is the SD (Normal) or half-width (Uniform/Triangular)."""
+    if kind == "Normal" and spread > 0:
+        values = rng.normal(centre, spread, n)
+    elif kind == "Uniform" and spread > 0:
+        values = rng.uniform(centre - spread, centre + spread, n)
+    elif kind == "Triangular" and spread > 0:
+        values = rng.triangular(centre - spread, centre, centre + spread, n)
+    else:
+        values = np.full(n, float(centre))
+    return np.clip(values, low, high)
+
+
+def simulate_session_costs(
+    providers: List[Dict],
+    battery_kwh: float,
+    end_pct: float,
+    start_soc: Tuple[str, float, float],
+    charging_loss: Tuple[str, float, float],
+    delivered_power: Tuple[str, float, float],
+    fx_volatility_pct: float,
+    apply_taper: bool,
+    comparison_currency: str,
+    rates: Dict,
+    n_draws: int,
+    seed: int = 0,
+) -> np.ndarray:
+    """Sampled session costs in comparison currency, shape (len(providers), n_draws).
+
+    start_soc, charging_loss and delivered_power are (kind, centre, spread) specs;
+    delivered_power is a percentage of each provider's effective kW and is drawn
+    independently per provider. Each currency involved gets lognormal rate noise.
+    Draws are processed in cache-sized chunks to keep temporaries small.
+    """
+    rng = np.random.default_rng(seed)
+    sigma = fx_volatility_pct / 100.0
+    currencies = {p["currency"] for p in providers} | {comparison_currency}
+    noisy_currencies = sorted(c for c in currencies if c in rates and c != "EUR")
+    costs = np.empty((len(providers), n_draws))
+
+    for lo in range(0, n_draws, Config.MONTE_CARLO_CHUNK):
+        n = min(Config.MONTE_CARLO_CHUNK, n_draws - lo)
+        start = sample_distribution(rng, *start_soc, n, 0.0, max(end_pct - 1.0, 0.0))
+        loss = sample_distribution(rng, *charging_loss, n, 0.0, 30.0)
+        energy_needed = battery_kwh * ((end_pct - start) / 100.0) * (1.0 + loss / 100.0)
+        sampled_rates = {"EUR": 1.0}
+        for currency in noisy_currencies:
+            noise = rng.normal(-0.5 * sigma ** 2, sigma, n) if sigma > 0 else 0.0
+            sampled_rates[currency] = rates[currency] * np.exp(noise)
+
+        for i, provider in enumerate(providers):
+            power_pct = sample_distribution(rng, *delivered_power, n, 5.0, 100.0)
+            minutes = calculate_charging_time_vectorized(
+                battery_kwh, provider["effective_kw"] * power_pct / 100.0, start, end_pct, apply_taper
+            )
+            native = calculate_charging_cost(
+                energy_needed, minutes,
+                provider["energy_price"], provider["time_price"], provider["session_fee"],
+            )
+            from_rate = sampled_rates.get(provider["currency"])
+            to_rate = sampled_rates.get(comparison_currency)
+            if provider["currency"] == comparison_currency or from_rate is None or to_rate is None:
+                costs[i, lo:lo + n] = native
+            else:
+                costs[i, lo:lo + n] = native / from_rate * to_rate
+    return costs
+
+
+def render_monte_carlo(
+    battery_kwh: float,
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    provider_a: Dict,
+    provider_b: Dict,
+    comparison_currency: str,
+    rates: Dict,
+):
+    st.markdown("### 🎲 Cost uncertainty (Monte Carlo)")
+    if not st.toggle("Simulate uncertain inputs", value=False, key="mc_enabled"):
+        return
+    if end_pct <= start_pct:
+        st.info("Increase your target SoC above your current SoC to simulate costs.")
+        return
+
+    specs = {}
+    inputs = [
+        ("start", "Current SoC (%)", float(start_pct), 5.0),
+        ("loss", "Charging loss (%)", float(efficiency_loss), 2.0),
+        ("power", "Delivered power (% of rated)", 90.0, 10.0),
+    ]
+    for key, label, centre, spread in inputs:
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            kind = st.selectbox(label, MONTE_CARLO_DISTRIBUTIONS, index=1, key=f"mc_{key}_kind")
+        with col2:
+            centre = st.number_input("Centre", value=centre, step=1.0, key=f"mc_{key}_centre")
+        with col3:
+            spread = st.number_input("Spread", 0.0, 50.0, spread, 0.5, key=f"mc_{key}_spread")
+        specs[key] = (kind, centre, spread)
+
+    col4, col5, col6 = st.columns(3)
+    with col4:
+        fx_volatility = st.number_input("FX volatility (%)", 0.0, 20.0, 2.0, 0.5, key="mc_fx")
+    with col5:
+        n_draws = st.select_slider(
+            "Draws", options=list(Config.MONTE_CARLO_DRAWS), value=100_000, key="mc_draws"
+        )
+    with col6:
+        seed = st.number_input("Seed", 0, 10_000, 0, 1, key="mc_seed")
+
+    started = time.perf_counter()
+    costs = simulate_session_costs(
+        [provider_a, provider_b], battery_kwh, end_pct,
+        specs["start"], specs["loss"], specs["power"], fx_volatility,
+        apply_taper, comparison_currency, rates, int(n_draws), int(seed),
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+    percentiles = [5, 25, 50, 75, 95]
+    quantiles = np.percentile(costs, percentiles, axis=1)
+    summary = pd.DataFrame(
+        {
+            f"P{p}": [format_currency(q, comparison_currency) for q in quantiles[i]]
+            for i, p in enumerate(percentiles)
+        },
+        index=[provider_a["provider"], provider_b["provider"]],
+    )
+    st.dataframe(summary, use_container_width=True)
+
+    p_a_cheaper = float(np.mean(costs[0] < costs[1]))
+    p_b_cheaper = float(np.mean(costs[1] < costs[0]))
+    col7, col8, col9 = st.columns(3)
+    col7.metric(f"P({provider_a['provider']} cheaper)", f"{p_a_cheaper * 100:.1f}%")
+    col8.metric(f"P({provider_b['provider']} cheaper)", f"{p_b_cheaper * 100:.1f}%")
+    col9.metric("P(same cost)", f"{(1.0 - p_a_cheaper - p_b_cheaper) * 100:.1f}%")
+
+    edges = np.histogram_bin_edges(costs, bins=60)
+    hist = pd.DataFrame({
+        "Cost": np.concatenate([edges[:-1], edges[:-1]]),
+        "Draws": np.concatenate([np.histogram(costs[0], edges)[0], np.histogram(costs[1], edges)[0]]),
+        "Provider": [provider_a["provider"]] * (len(edges) - 1) + [provider_b["provider"]] * (len(edges) - 1),
+    })
+    chart = alt.Chart(hist).mark_area(opacity=0.5, interpolate="step").encode(
+        x=alt.X("Cost:Q", title=f"Session cost ({comparison_currency})"),
+        y=alt.Y("Draws:Q", stack=None),
+        color="Provider:N",
+    )
+    st.altair_chart(chart, use_container_width=True)
+    st.caption(f"{int(n_draws):,} draws simulated in {elapsed_ms:.0f} ms.")
+
+# ============================================================================
+# FLEET COST MATRIX
+# ============================================================================
+
+def compute_fleet_cost_matrix(
+    vehicles: pd.DataFrame,
+    provider_names: List[str],
+    power_levels_kw: List[float],
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    apply_taper: bool,
+    comparison_currency: str,
+    rates: Dict,
+) -> pd.DataFrame:
+    """Cost every vehicle × provider × charger power in one broadcast pass.
+
+    `vehicles` needs model, battery_kwh, max_dc_kw and miles_per_kwh columns.
+    Home tariffs are only evaluated at powers up to their default_kw.
+    Returns one row per cell, long format.
+    """
+    catalogue = CATALOGUE
+    presets = [catalogue.providers[name] for name in provider_names]
+    prices = catalogue.provider_prices(provider_names)
+    battery = vehicles["battery_kwh"].to_numpy(dtype=float)[:, None, None]
+    max_kw = vehicles["max_dc_kw"].to_numpy(dtype=float)[:, None, None]
+    mpk = vehicles["miles_per_kwh"].to_numpy(dtype=float)[:, None, None]
+    power = np.asarray(power_levels_kw, dtype=float)[None, None, :]
+    energy_price = prices["energy"][None, :, None]
+    time_price = prices["time"][None, :, None]
+    session_fee = prices["session_fee"][None, :, None]
+    fx = currency_factors([p["currency"] for p in presets], comparison_currency, rates)[None, :, None]
+    home_max_kw = np.array([
+        p["default_kw"] if p["type"] == "home" else np.inf for p in presets
+    ])[None, :, None]
+
+    effective_kw = np.minimum(power, max_kw)
+    energy_needed = battery * ((end_pct - start_pct) / 100.0) * (1.0 + efficiency_loss / 100.0)
+    minutes = calculate_charging_time_vectorized(
+        battery, effective_kw, start_pct, end_pct, apply_taper
+    )
+    cost = calculate_charging_cost(
+        energy_needed, minutes, energy_price, time_price, session_fee
+    ) * fx
+    miles_added = energy_needed * mpk
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost_per_100 = np.where(miles_added > 0, cost / miles_added * 100.0, np.nan)
+
+    shape = np.broadcast_shapes(cost.shape, effective_kw.shape)
+    valid = np.broadcast_to(power <= home_max_kw, shape).ravel()
+    v_idx, p_idx, k_idx = (idx.ravel() for idx in np.indices(shape))
+    models = vehicles["model"].to_numpy()
+    names = np.asarray(provider_names, dtype=object)
+    df = pd.DataFrame({
+        "Vehicle": models[v_idx],
+        "Provider": names[p_idx],
+        "Charger (kW)": np.asarray(power_levels_kw, dtype=float)[k_idx],
+        "Effective kW": np.broadcast_to(effective_kw, shape).ravel(),
+        "Time (min)": np.broadcast_to(minutes, shape).ravel(),
+        f"Cost ({comparison_currency})": np.broadcast_to(cost, shape).ravel(),
+        f"Cost / 100 mi ({comparison_currency})": np.broadcast_to(cost_per_100, shape).ravel(),
+    })
+    return df[valid].reset_index(drop=True)
+
+
+def render_fleet_matrix(
+    start_pct: float,
+    end_pct: float,
+    efficiency_loss: float,
+    miles_per_kwh: float,
+    apply_taper: bool,
+    comparison_currency: str,
+    exchange_rates: Dict,
+):
+    st.markdown("## 🚙 Fleet cost matrix")
+    st.caption(
+        "Every vehicle against every tariff and charger power for the current session. "
+        "Edit efficiencies or add your own models below."
+    )
+
+    if end_pct <= start_pct:
+        st.info("Increase your target SoC above your current SoC to build the matrix.")
+        return
+
+    fleet_seed = VEHICLE_DATABASE[VEHICLE_DATABASE["model"] != "Custom Vehicle"][
+        ["model", "battery_kwh", "max_dc_kw", "category"]
+    ].assign(miles_per_kwh=float(miles_per_kwh))
+    vehicles = st.data_editor(
+        fleet_seed,
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        key="fleet_vehicles",
+        column_config={
+            "model": st.column_config.TextColumn("Model", required=True),
+            "battery_kwh": st.column_config.NumberColumn("Battery (kWh)", min_value=10.0, max_value=220.0),
+            "max_dc_kw": st.column_config.NumberColumn("Max DC (kW)", min_value=3, max_value=400),
+            "category": st.column_config.TextColumn("Category"),
+            "miles_per_kwh": st.column_config.NumberColumn("Efficiency (mi/kWh)", min_value=1.0, max_value=7.0),
+        },
+    )
+    vehicles = vehicles.dropna(subset=["model", "battery_kwh", "max_dc_kw"]).copy()
+    vehicles["miles_per_kwh"] = vehicles["miles_per_kwh"].fillna(miles_per_kwh)
+    if vehicles.empty:
+        st.info("Add at least one vehicle to the fleet.")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        provider_names = st.multiselect(
+            "Tariffs", list(CHARGING_PROVIDERS.keys()),
+            default=list(CHARGING_PROVIDERS.keys()), key="fleet_providers",
+        )
+    with col2:
+        power_levels = st.multiselect(
+            "Charger powers (kW)", list(Config.FLEET_POWER_LEVELS_KW),
+            default=list(Config.FLEET_POWER_LEVELS_KW), key="fleet_powers",
+        )
+    if not provider_names or not power_levels:
+        st.info("Select at least one tariff and one charger power.")
+        return
+
+    matrix = compute_fleet_cost_matrix(
+        vehicles, provider_names, sorted(power_levels), start_pct, end_pct,
+        efficiency_loss, apply_taper, comparison_currency, exchange_rates,
+    )
+    cost_col = f"Cost ({comparison_currency})"
+    per_100_col = f"Cost / 100 mi ({comparison_currency})"
+    st.caption(f"{len(matrix):,} vehicle × tariff × power combinations evaluated.")
+
+    col3, col4 = st.columns(2)
+    with col3:
+        metric = st.radio(
+            "Heatmap metric", [cost_col, "Time (min)", per_100_col],
+            horizontal=True, key="fleet_metric",
+        )
+    with col4:
+        power_choice = st.selectbox(
+            "Heatmap charger power", ["Best per tariff"] + [f"{kw} kW" for kw in sorted(power_levels)],
+            key="fleet_heat_power",
+        )
+
+    if power_choice == "Best per tariff":
+        heat_df = matrix.groupby(["Vehicle", "Provider"], as_index=False)[metric].min()
+    else:
+        heat_df = matrix[matrix["Charger (kW)"] == float(power_choice.split()[0])]
+
+    heatmap = alt.Chart(heat_df).mark_rect().encode(
+        x=alt.X("Provider:N", title=None),
+        y=alt.Y("Vehicle:N", title=None),
+        color=alt.Color(f"{metric}:Q", scale=alt.Scale(scheme="viridis"), title=metric),
+        tooltip=["Vehicle", "Provider", alt.Tooltip(f"{metric}:Q", format=".2f")],
+    )
+    st.altair_chart(heatmap, use_container_width=True)
+
+    st.dataframe(
+        matrix.sort_values(by=[metric, "Vehicle"]),
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Effective kW": st.column_config.NumberColumn(format="%.0f"),
+            "Time (min)": st.column_config.NumberColumn(format="%.0f"),
+            cost_col: st.column_config.NumberColumn(format="%.2f"),
+            per_100_col: st.column_config.NumberColumn(format="%.2f"),
+        },
+    )
+
+# ============================================================================
+# ANNUAL COST SIMULATOR
+# ============================================================================
+
+@dataclass(frozen=True)
+class DrivingProfile:
+    daily_miles: float = 25.0
+    daily_miles_sd: float = 15.0
+    long_trip_prob: float = 0.03  # chance any given day includes a long trip
+    long_trip_miles: float = 220.0
+    home_charging_prob: float = 0.9  # chance the car can plug in at home overnight
+    home_target_pct: float = 80.0
+    home_plug_in_minute: float = 23.5 * 60
+    reserve_pct: float = 10.0
+    rapid_target_pct: float = 80.0
+
+
+def _lognormal(rng: np.random.Generator, mean: float, sd: float, n: int) -> np.ndarray:
+    if mean <= 0:
+        return np.zeros(n)
+    if sd <= 0:
+        return np.full(n, float(mean))
+    sigma2 = np.log1p((sd / mean) ** 2)
+    return rng.lognormal(np.log(mean) - sigma2 / 2.0, np.sqrt(sigma2), n)
+
+
+def iter_driving_days(profile: DrivingProfile, n_vehicles: int, n_days: int, seed: int = 0):
+    """Yield (miles, home_available) arrays of length n_vehicles, one pair per day."""
+    rng = np.random.default_rng(seed)
+    for _ in range(n_days):
+        miles = _lognormal(rng, profile.daily_miles, profile.daily_miles_sd, n_vehicles)
+        long_trip = rng.random(n_vehicles) < profile.long_trip_prob
+        if long_trip.any():
+            miles[long_trip] += _lognormal(
+                rng, profile.long_trip_miles, profile.long_trip_miles * 0.3, int(long_trip.sum())
+            )
+        yield miles, rng.random(n_vehicles) < profile.home_charging_prob
+
+
+def iter_charging_days(
+    days,
+    profile: DrivingProfile,
+    battery_kwh: float,
+    miles_per_kwh: float,
+):
+    """Walk SoC through each day; yield (public_sessions, home_start_pct, home_end_pct, miles).
+
+    Public sessions always run from the reserve to rapid_target_pct; home charging
+    tops up to home_target_pct overnight when available.
+    """
+    soc = None
+    span = max(profile.rapid_target_pct - profile.reserve_pct, 1.0)
+    for miles, home_available in days:
+        if soc is None:
+            soc = np.full(miles.shape, profile.home_target_pct)
+        soc = soc - miles / miles_per_kwh / battery_kwh * 100.0
+        deficit = profile.reserve_pct - soc
+        sessions = np.where(deficit > 0, np.ceil(deficit / span), 0.0)
+        soc = soc + sessions * span
+        home_start = soc.copy()
+        plug_in = home_available & (soc < profile.home_target_pct)
+        soc = np.where(plug_in, profile.home_target_pct, soc)
+        yield sessions, home_start, soc, miles
+
+
+def simulate_annual_costs(
+    profile: DrivingProfile,
+    battery_kwh: float,
+    miles_per_kwh: float,
+    car_max_kw: float,
+    efficiency_loss: float,
+    home_tariff: str,
+    public_cards: List[str],
+    comparison_currency: str,
+    rates: Dict,
+    n_vehicles: int,
+    n_days: int,
+    seed: int = 0,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Simulate n_vehicles for n_days with one strategy per public card.
+
+    Returns the daily fleet-mean cumulative cost per strategy and a per-strategy
+    summary. Memory is O(vehicles × strategies), independent of n_days.
+    """
+    presets = [CHARGING_PROVIDERS[c] for c in public_cards]
+    fx = currency_factors([p["currency"] for p in presets], comparison_currency, rates)[:, None]
+    card_kw = np.minimum([p["default_kw"] for p in presets], car_max_kw)
+    session_minutes = calculate_charging_time_vectorized(
+        battery_kwh, card_kw, profile.reserve_pct, profile.rapid_target_pct, True
+    )[:, None]
+    session_kwh = battery_kwh * (profile.rapid_target_pct - profile.reserve_pct) / 100.0
+    session_kwh *= 1.0 + efficiency_loss / 100.0
+    session_cost = calculate_charging_cost(
+        session_kwh, session_minutes,
+        np.array([p["energy"] for p in presets])[:, None],
+        np.array([p["time"] for p in presets])[:, None],
+        np.array([p.get("session_fee", 0.0) for p in presets])[:, None],
+    ) * fx
+
+    home = CHARGING_PROVIDERS[home_tariff]
+    home_compiled = compile_tariffs((home_tariff,))
+    home_fx = convert_currency(1.0, home["currency"], comparison_currency, rates)
+
+    public_cost = np.zeros((len(public_cards), n_vehicles))
+    home_cost = np.zeros(n_vehicles)
+    public_sessions = np.zeros(n_vehicles)
+    total_miles = np.zeros(n_vehicles)
+    daily = np.empty((n_days, len(public_cards)))
+
+    days = iter_driving_days(profile, n_vehicles, n_days, seed)
+    for day, (sessions, home_start, home_end, miles) in enumerate(
+        iter_charging_days(days, profile, battery_kwh, miles_per_kwh)
+    ):
+        public_cost += sessions * session_cost
+        public_sessions += sessions
+        total_miles += miles
+        plugged_in = home_end > home_start
+        home_cost += np.where(plugged_in, calculate_session_costs_compiled(
+            home_compiled, battery_kwh, min(home["default_kw"], car_max_kw),
+            home_start[:, None], home_end[:, None], efficiency_loss,
+            True, profile.home_plug_in_minute,
+        )[:, 0], 0.0) * home_fx
+        daily[day] = public_cost.mean(axis=1) + home_cost.mean()
+
+    total = public_cost + home_cost
+    years = n_days / 365.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_100 = np.where(total_miles > 0, total / total_miles * 100.0, 0.0)
+    summary = pd.DataFrame({
+        "Public card": public_cards,
+        f"Mean annual cost ({comparison_currency})": total.mean(axis=1) / years,
+        f"P10 annual ({comparison_currency})": np.percentile(total, 10, axis=1) / years,
+        f"P90 annual ({comparison_currency})": np.percentile(total, 90, axis=1) / years,
+        f"Home share ({comparison_currency}/yr)": np.full(len(public_cards), home_cost.mean() / years),
+        "Public sessions / yr": np.full(len(public_cards), public_sessions.mean() / years),
+        f"Cost / 100 mi ({comparison_currency})": per_100.mean(axis=1),
+    }).sort_values(by=f"Mean annual cost ({comparison_currency})")
+    daily_df = pd.DataFrame(daily, columns=public_cards)
+    daily_df.index = pd.RangeIndex(1, n_days + 1, name="Day")
+    return daily_df, summary
+
+
+@bounded_cache()
+def annual_cost_simulation(
+    profile: DrivingProfile,
+    battery_kwh: float,
+    miles_per_kwh: float,
+    car_max_kw: float,
+    efficiency_loss: float,
+    home_tariff: str,
+    public_cards: Tuple[str, ...],
+    comparison_currency: str,
+    rates: Tuple[Tuple[str, float], ...],
+    n_vehicles: int,
+    n_days: int,
+    seed: int = 0,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """simulate_annual_costs memoized on its inputs; rates as from rates_fingerprint()."""
+    return simulate_annual_costs(
+        profile, battery_kwh, miles_per_kwh, car_max_kw, efficiency_loss, home_tariff,
+        list(public_cards), comparison_currency, dict(rates), n_vehicles, n_days, seed,
+    )
+
+
+def render_annual_simulator(
+    battery_kwh: float,
+    miles_per_kwh: float,
+    car_max_kw: float,
+    efficiency_loss: float,
+    comparison_currency: str,
+    exchange_rates: Dict,
+    available_cards: List[str],
+):
+    st.markdown("## 📅 Annual driving & charging cost")
+    public_cards = [c for c in available_cards if CHARGING_PROVIDERS[c]["type"] != "home"]
+    home_tariffs = [n for n, p in CHARGING_PROVIDERS.items() if p["type"] == "home"]
+    if not public_cards:
+        st.info("Select at least one public charging card above to compare strategies.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        daily_miles = st.number_input("Typical daily miles", 0.0, 300.0, 25.0, 1.0, key="annual_daily")
+        daily_sd = st.number_input("Day-to-day spread (mi)", 0.0, 200.0, 15.0, 1.0, key="annual_sd")
+    with col2:
+        trips_per_year = st.number_input("Long trips per year", 0, 365, 10, 1, key="annual_trips")
+        trip_miles = st.number_input("Long trip distance (mi)", 0.0, 1000.0, 220.0, 10.0, key="annual_trip_mi")
+    with col3:
+        home_pct = st.slider("Nights with home charging (%)", 0, 100, 90, 5, key="annual_home_pct")
+        home_tariff = st.selectbox("Home tariff", home_tariffs, key="annual_home_tariff")
+    col4, col5, col6 = st.columns(3)
+    with col4:
+        plug_in = st.time_input("Home plug-in time", value=dt_time(23, 30), key="annual_plug_in")
+    with col5:
+        n_vehicles = st.number_input("Vehicles simulated", 1, 10_000, 500, 100, key="annual_vehicles")
+    with col6:
+        n_years = st.number_input("Years", 1, 5, 1, 1, key="annual_years")
+
+    profile = DrivingProfile(
+        daily_miles=daily_miles,
+        daily_miles_sd=daily_sd,
+        long_trip_prob=trips_per_year / 365.0,
+        long_trip_miles=trip_miles,
+        home_charging_prob=home_pct / 100.0,
+        home_plug_in_minute=plug_in.hour * 60 + plug_in.minute,
+    )
+    started = time.perf_counter()
+    daily, summary = annual_cost_simulation(
+        profile, battery_kwh, miles_per_kwh, car_max_kw, efficiency_loss, home_tariff,
+        tuple(public_cards), comparison_currency, rates_fingerprint(exchange_rates),
+        int(n_vehicles), int(n_years) * 365,
+    )
+    elapsed = time.perf_counter() - started
+
+    st.line_chart(daily, x_label="Day", y_label=f"Cumulative cost per vehicle ({comparison_currency})")
+    money_cols = [c for c in summary.columns if comparison_currency in c]
+    st.dataframe(
+        summary,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            **{c: st.column_config.NumberColumn(format="%.2f") for c in money_cols},
+            "Public sessions / yr": st.column_config.NumberColumn(format="%.1f"),
+        },
+    )
+    st.caption(f"{int(n_vehicles):,} vehicles × {int(n_years) * 365} days simulated in {elapsed:.2f} s.")
+
+# ============================================================================
+# RERUN PROFILER
+# ============================================================================
+
+class SamplingProfiler:
+    """Wall-clock sampler for one rerun: the script thread plus the I/O threads.
+
+    A daemon thread reads sys._current_frames() every interval seconds and
+    counts each distinct stack, so time spent waiting on the network shows up
+    next to CPU work. Idle pool workers and the idle event loop are skipped.
+    The I/O threads are shared by every session, so their samples can include
+    other users' calls made during the same rerun.
+    """
+
+    def __init__(self, interval: float = 0.002, thread_prefixes: Tuple[str, ...] = ("evcp-io",)):
+        self.interval = interval
+        self.thread_prefixes = thread_prefixes
+        self.counts: Dict[Tuple[str, Tuple], int] = {}
+        self.samples = 0
+        self.elapsed = 0.0
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._target = threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="evcp-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+        return False
+
+    def _run(self):
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == self._target:
+                    group = "script"
+                else:
+                    name = names.get(ident, "")
+                    if not name.startswith(self.thread_prefixes):
+                        continue
+                    if frame.f_code.co_name in ("_worker", "select"):
+                        continue  # idle pool worker / event loop
+                    group = "io"
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                key = (group, tuple(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    @staticmethod
+    def _label(code) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed stacks ("root;...;leaf count"), for flamegraph.pl / speedscope."""
+        lines = []
+        for (group, stack), count in self.counts.items():
+            lines.append(";".join([group] + [self._label(c) for c in reversed(stack)]) + f" {count}")
+        return "\n".join(sorted(lines)) + "\n"
+
+    def speedscope(self) -> str:
+        """speedscope.app file: one sampled profile per thread group, weights in ms."""
+        frames: List[Dict] = []
+        frame_index: Dict = {}
+        profiles: Dict[str, Dict] = {}
+        weight_ms = self.interval * 1000.0
+        for (group, stack), count in self.counts.items():
+            indices = []
+            for code in reversed(stack):
+                if code not in frame_index:
+                    frame_index[code] = len(frames)
+                    frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+                indices.append(frame_index[code])
+            profile = profiles.setdefault(group, {
+                "type": "sampled", "name": f"{group} threads", "unit": "milliseconds",
+                "startValue": 0, "endValue": 0.0, "samples": [], "weights": [],
+            })
+            profile["samples"].append(indices)
+            profile["weights"].append(count * weight_ms)
+            profile["endValue"] += count * weight_ms
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{Config.APP_TITLE} rerun",
+            "exporter": "ev_charge_pro_app",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        })
+
+    def top_functions(self, limit: int = 15) -> pd.DataFrame:
+        """This module's functions on the script thread, by inclusive and self time."""
+        inclusive: Dict = {}
+        own: Dict = {}
+        for (group, stack), count in self.counts.items():
+            if group != "script":
+                continue
+            own[stack[0]] = own.get(stack[0], 0) + count
+            for code in set(stack):
+                inclusive[code] = inclusive.get(code, 0) + count
+        total = max(sum(own.values()), 1)
+        rows = [
+            {"Function": self._label(code), "Total (%)": 100.0 * n / total,
+             "Self (%)": 100.0 * own.get(code, 0) / total}
+            for code, n in inclusive.items()
+            if code.co_filename == __file__ and code.co_name not in ("<module>", "run")
+        ]
+        if not rows:
+            return pd.DataFrame(columns=["Function", "Total (%)", "Self (%)"])
+        return pd.DataFrame(rows).sort_values("Total (%)", ascending=False).head(limit)
+
+
+def profiling_requested() -> bool:
+    """?profile=1 in the URL, or the diagnostics toggle; a dict lookup when off."""
+    if not Config.PROFILING_ENABLED:
+        return False
+    return st.query_params.get("profile") == "1" or bool(st.session_state.get("profile_reruns"))
+
+
+def render_profile(profiler: SamplingProfiler):
+    with st.expander(f"⏱ Rerun profile: {profiler.elapsed * 1000:.0f} ms, {profiler.samples:,} samples", expanded=True):
+        st.dataframe(
+            profiler.top_functions(),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Total (%)": st.column_config.NumberColumn(format="%.1f"),
+                "Self (%)": st.column_config.NumberColumn(format="%.1f"),
+            },
+        )
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        col_d1, col_d2 = st.columns(2)
+        with col_d1:
+            st.download_button("Download speedscope profile", profiler.speedscope(),
+                               file_name=f"evcp-rerun-{stamp}.speedscope.json", mime="application/json",
+                               on_click="ignore", key="profile_speedscope", use_container_width=True)
+        with col_d2:
+            st.download_button("Download collapsed stacks", profiler.collapsed(),
+                               file_name=f"evcp-rerun-{stamp}.folded", mime="text/plain",
+                               on_click="ignore", key="profile_collapsed", use_container_width=True)
+        st.caption("Open the speedscope file at speedscope.app, or feed the collapsed stacks to flamegraph.pl.")
+
+
+def run():
+    """Script entry point: main(), wrapped in the sampler only when asked for."""
+    if Config.WARMUP_ON_START:
+        start_background_warm_up()
+    if not profiling_requested():
+        main()
+        return
+    with SamplingProfiler(Config.PROFILE_INTERVAL_S) as profiler:
+        main()
+    render_profile(profiler)
+
+
 # ============================================================================
 # MAIN
 # ============================================================================
@@ -1291,18 +5398,28 @@ def main():
         initial_sidebar_state="collapsed"
     )
 
+    # Pick up edited tariff/vehicle data files without a restart.
+    reload_catalogue()
+    # Start the FX refresh while the page chrome renders.
+    rates_future = IO_ENGINE.submit_call(fetch_exchange_rates)
     apply_custom_styles()
-    exchange_rates = fetch_exchange_rates()
     render_hero_section()
+    # Filled in at the end of the run, once we know which upstream calls failed
+    upstream_status_slot = st.container()
 
     ios_safe_mode = st.toggle(
         "📱 iOS-friendly inputs",
         value=True,
         help="Use number inputs instead of sliders to prevent accidental changes while scrolling"
     )
+    exchange_rates = rates_future.result()
+    if exchange_rates.get("_date") == "fallback":
+        st.warning("⚠️ Unable to fetch live exchange rates. Using fallback values.")
     rate_status = exchange_rates.get("_status", "Unknown")
     rate_date = exchange_rates.get("_date", "Unknown")
-    st.caption(f"💱 Exchange rates: {rate_status} • Updated: {rate_date}")
+    st.caption(f"💱 Exchange rates: {rate_status} • Updated: {rate_date} • 📒 {CATALOGUE.version}")
+    if catalogue_error():
+        st.warning(f"⚠️ Updated tariff data was rejected, still using the previous version: {catalogue_error()}")
     st.markdown("---")
 
     battery_kwh, car_max_kw = render_vehicle_selector(ios_safe_mode)
@@ -1325,8 +5442,8 @@ def main():
     )
 
     st.markdown("---")
-    nearby_tab, route_tab, compare_tab = st.tabs(
-        ["Nearby chargers", "Route planner", "Provider comparison"]
+    nearby_tab, route_tab, compare_tab, fleet_tab, annual_tab = st.tabs(
+        ["Nearby chargers", "Route planner", "Provider comparison", "Fleet matrix", "Annual cost"]
     )
 
     with nearby_tab:
@@ -1367,6 +5484,15 @@ def main():
 
     with compare_tab:
         st.markdown("## 🔌 Charging provider comparison")
+        render_provider_sweep(
+            battery_kwh, start_pct, end_pct, efficiency_loss, apply_taper,
+            car_max_kw, comparison_currency, exchange_rates,
+        )
+        render_soc_sweep(
+            battery_kwh, start_pct, end_pct, efficiency_loss, apply_taper, car_max_kw,
+            miles_per_kwh, comparison_currency, exchange_rates, user_cards,
+        )
+        st.markdown("### 🆚 Head to head")
         col_a, col_b = st.columns(2)
         with col_a:
             provider_a = render_provider_configuration("Provider A", "provider_a", car_max_kw, ios_safe_mode)
@@ -1383,6 +5509,74 @@ def main():
                 )
             st.session_state["provider_a_for_route"] = provider_a
 
+        render_monte_carlo(
+            battery_kwh, start_pct, end_pct, efficiency_loss, apply_taper,
+            provider_a, provider_b, comparison_currency, exchange_rates,
+        )
+        render_tariff_rules_comparison(
+            battery_kwh, start_pct, end_pct, efficiency_loss, apply_taper,
+            car_max_kw, comparison_currency, exchange_rates,
+        )
+
+    with fleet_tab:
+        render_fleet_matrix(
+            start_pct=start_pct,
+            end_pct=end_pct,
+            efficiency_loss=efficiency_loss,
+            miles_per_kwh=miles_per_kwh,
+            apply_taper=apply_taper,
+            comparison_currency=comparison_currency,
+            exchange_rates=exchange_rates,
+        )
+
+    with annual_tab:
+        render_annual_simulator(
+            battery_kwh=battery_kwh,
+            miles_per_kwh=miles_per_kwh,
+            car_max_kw=car_max_kw,
+            efficiency_loss=efficiency_loss,
+            comparison_currency=comparison_currency,
+            exchange_rates=exchange_rates,
+            available_cards=user_cards,
+        )
+
+    with st.expander("🧰 Cache statistics"):
+        if Config.PROFILING_ENABLED:
+            st.toggle("⏱ Profile each rerun", key="profile_reruns",
+                      help="Same as adding ?profile=1 to the URL.")
+        stats = cache_stats()
+        st.dataframe(
+            stats,
+            hide_index=True,
+            use_container_width=True,
+            column_config={"hit_rate": st.column_config.NumberColumn(format="%.2f")},
+        )
+        st.caption(f"Total cached: {stats['bytes'].sum() / 2**20:.2f} MiB")
+        st.dataframe(
+            upstream_stats(),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "rate_per_s": st.column_config.NumberColumn(format="%.2f"),
+                "mean_wait_ms": st.column_config.NumberColumn(format="%.1f"),
+                "p95_ms": st.column_config.NumberColumn(format="%.0f"),
+            },
+        )
+        cards = CHEAPEST_CARDS.stats()
+        st.caption(
+            f"Cheapest-card table v{cards['version']}: {cards['entries']:,} entries, "
+            f"{cards['hits']:,} hits, {cards['misses']:,} misses, {cards['invalidated']:,} invalidated."
+        )
+        if SHARED_CACHE_STORE is not None:
+            shared = SHARED_CACHE_STORE.stats()
+            st.caption(
+                f"Shared cache ({shared.get('path', 'custom store')}): {shared.get('hits', 0):,} hits, "
+                f"{shared.get('misses', 0):,} misses, {shared.get('writes', 0):,} writes, "
+                f"{shared.get('errors', 0):,} errors."
+            )
+
+    render_upstream_status(upstream_status_slot)
+
     st.markdown("---")
     st.markdown("""
         <div style='text-align: center; color: #a0aec0; padding: 2rem 0;'>
@@ -1394,6 +5588,3 @@ def main():
         </div>
     """, unsafe_allow_html=True)
 
-
-if __name__ == "__main__":
-    main()
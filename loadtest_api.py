@@ -0,0 +1,148 @@
+"""
+Load test for the EV Charge Pro JSON API.
+
+    python loadtest_api.py --spawn --duration 10 --concurrency 8 --batch 50
+    python loadtest_api.py --url http://127.0.0.1:8080 --endpoint cheapest-card
+
+--spawn starts the API in-process on a free port, so no separate server is needed.
+Reports requests/s, sessions/s and latency percentiles.
+"""
+
+from typing import Dict, List, Optional
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.parse
+import numpy as np
+
+ENDPOINTS = ("sessions", "cheapest-card", "convert")
+OPERATORS = ("Shell Recharge", "BP Pulse", "Osprey", "Pod Point", "Ionity", "InstaVolt", "MFG EV Power")
+
+
+def make_payload(endpoint: str, batch: int, rng: random.Random, providers: List[str]) -> Dict:
+    if endpoint == "convert":
+        return {
+            "amounts": [round(rng.uniform(1, 80), 2) for _ in range(batch)],
+            "from": [rng.choice(("GBP", "EUR", "USD")) for _ in range(batch)],
+            "to": "GBP",
+        }
+    sessions = []
+    for _ in range(batch):
+        start = rng.randint(5, 60)
+        session = {
+            "battery_kwh": rng.choice((51.0, 64.0, 75.0, 82.0, 94.9)),
+            "station_kw": rng.choice((7, 22, 50, 150, 350)),
+            "car_max_kw": rng.choice((100, 150, 250)),
+            "start_pct": start,
+            "end_pct": rng.randint(start + 5, 100),
+        }
+        if endpoint == "sessions":
+            session["provider"] = rng.choice(providers)
+        else:
+            session["operator"] = rng.choice(OPERATORS)
+            session["plug_in_minute"] = rng.randint(0, 1439)
+        sessions.append(session)
+    return {"sessions": sessions, "currency": "GBP"}
+
+
+def worker(
+    url: urllib.parse.ParseResult,
+    endpoint: str,
+    batch: int,
+    deadline: float,
+    seed: int,
+    providers: List[str],
+    latencies: List[float],
+    errors: List[str],
+):
+    rng = random.Random(seed)
+    # A small pool of pre-encoded bodies keeps client-side JSON work out of the measurement
+    bodies = [json.dumps(make_payload(endpoint, batch, rng, providers)).encode() for _ in range(16)]
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    path = f"/v1/{endpoint}"
+    i = 0
+    while time.perf_counter() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request("POST", path, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = response.read()
+            if response.status != 200:
+                errors.append(f"{response.status}: {data[:200]!r}")
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def fetch_providers(url: urllib.parse.ParseResult) -> List[str]:
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    conn.request("GET", "/v1/providers")
+    providers = list(json.loads(conn.getresponse().read())["providers"])
+    conn.close()
+    return providers
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test the EV Charge Pro JSON API")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--spawn", action="store_true", help="start the API in-process on a free port")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="sessions")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="client connections")
+    parser.add_argument("--batch", type=int, default=1, help="sessions per request")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn:
+        import api_server
+
+        api_server.warm_caches()
+        server = api_server.make_server("127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        args.url = f"http://127.0.0.1:{server.server_port}"
+    url = urllib.parse.urlparse(args.url)
+    providers = fetch_providers(url)
+
+    latencies: List[float] = []
+    errors: List[str] = []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url, args.endpoint, args.batch, deadline, seed, providers, latencies, errors),
+        )
+        for seed in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    ms = np.asarray(latencies) * 1000.0
+    print(f"endpoint      /v1/{args.endpoint}  (batch {args.batch}, {args.concurrency} connections)")
+    print(f"requests      {len(ms):,} ok, {len(errors):,} failed in {elapsed:.1f} s")
+    print(f"throughput    {len(ms) / elapsed:,.0f} req/s, {len(ms) * args.batch / elapsed:,.0f} items/s")
+    if len(ms):
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        print(f"latency (ms)  p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f}  max {ms.max():.2f}")
+    for message in errors[:5]:
+        print(f"error         {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Concurrent-session load test for the Streamlit app, against local stand-in APIs.
+
+    python loadtest_app.py --sessions 1,2,4,8,16 --duration 30 --upstream-latency-ms 80
+
+Each simulated user is a headless AppTest session driven through a scripted
+visit: enter a postcode, click the map, plan a route, compare two providers.
+All sessions share one process, as they do on a Streamlit server, and every
+upstream call goes to standin_apis.py. For each session count the report gives
+reruns/s, p50/p95/p99 rerun latency and resident memory per session, then the
+session count at which throughput stops scaling or p95 exceeds --slo-ms.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import argparse
+import gc
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "ev_charge_pro_app.py")
+POSTCODES = (
+    "SW1A 1AA", "M1 1AE", "B1 1BB", "LS1 4DY", "BS1 5TR", "EH1 1YZ", "G1 1XQ", "CF10 1EP",
+    "BN21 4QJ", "EX1 1HS", "NE1 7RU", "CT16 1JA", "OX1 2JD", "CB2 1TN", "YO1 7HH", "NG1 5FS",
+)
+CITY_PAIRS = (
+    ("Eastbourne, UK", "Manchester, UK"), ("London, UK", "Edinburgh, UK"), ("Bristol, UK", "Leeds, UK"),
+    ("Cardiff, UK", "Newcastle, UK"), ("Brighton, UK", "Glasgow, UK"), ("Exeter, UK", "Birmingham, UK"),
+)
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _by_label(widgets, prefix: str):
+    return next(w for w in widgets if w.label.startswith(prefix))
+
+
+# ============================================================================
+# SCRIPTED INTERACTIONS
+# ============================================================================
+
+def step_postcode(at, rng: random.Random):
+    _by_label(at.checkbox, "Use map click").uncheck()
+    _by_label(at.text_input, "Enter your postcode").input(rng.choice(POSTCODES))
+
+
+def step_map_click(at, rng: random.Random):
+    # What the base map's click handler stores before rerunning
+    at.session_state["nearby_click_coords"] = (rng.uniform(50.8, 55.5), rng.uniform(-3.5, 0.5))
+    _by_label(at.checkbox, "Use map click").check()
+
+
+def step_route(at, rng: random.Random):
+    start, end = rng.choice(CITY_PAIRS)
+    _by_label(at.text_input, "Start location").input(start)
+    _by_label(at.text_input, "Destination").input(end)
+    _by_label(at.button, "Plan route").click()
+
+
+def step_compare(at, rng: random.Random):
+    a = at.selectbox(key="provider_a_name")
+    b = at.selectbox(key="provider_b_name")
+    a.select(rng.choice(a.options))
+    b.select(rng.choice(b.options))
+    at.button(key="compare_button").click()
+
+
+SCENARIO: Tuple[Tuple[str, Callable], ...] = (
+    ("postcode", step_postcode),
+    ("map click", step_map_click),
+    ("route", step_route),
+    ("compare", step_compare),
+)
+
+
+def run_session(
+    seed: int,
+    deadline: float,
+    think_s: float,
+    timeout: float,
+    results: List[Tuple[str, float]],
+    errors: List[str],
+    sessions: List,
+    ready: threading.Barrier,
+):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    sessions.append(at)
+    ready.wait()
+    step = 0
+    started = time.perf_counter()
+    at.run()
+    results.append(("open", time.perf_counter() - started))
+    while time.perf_counter() < deadline:
+        name, action = SCENARIO[step % len(SCENARIO)]
+        step += 1
+        try:
+            action(at, rng)
+            started = time.perf_counter()
+            at.run()
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            errors.append(f"{name}: {type(e).__name__}: {e}")
+            continue
+        if at.exception:
+            errors.append(f"{name}: {at.exception[0].value}")
+        results.append((name, elapsed))
+        if think_s:
+            time.sleep(rng.expovariate(1.0 / think_s))
+
+
+def run_level(n: int, duration: float, think_s: float, timeout: float) -> Dict:
+    gc.collect()
+    rss_before = rss_bytes()
+    results: List[Tuple[str, float]] = []
+    errors: List[str] = []
+    sessions: List = []
+    ready = threading.Barrier(n + 1)
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(
+            target=run_session,
+            args=(seed, started + duration, think_s, timeout, results, errors, sessions, ready),
+            name=f"loadtest-session-{seed}",
+        )
+        for seed in range(n)
+    ]
+    for t in threads:
+        t.start()
+    ready.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    rss_after = rss_bytes()  # sessions are still referenced here
+    sessions.clear()
+
+    ms = np.array([r[1] for r in results]) * 1000.0
+    level = {
+        "sessions": n,
+        "reruns": len(ms),
+        "errors": len(errors),
+        "first_errors": errors[:3],
+        "throughput": len(ms) / elapsed if elapsed else 0.0,
+        "p50": float(np.percentile(ms, 50)) if len(ms) else float("nan"),
+        "p95": float(np.percentile(ms, 95)) if len(ms) else float("nan"),
+        "p99": float(np.percentile(ms, 99)) if len(ms) else float("nan"),
+        "mib_per_session": max(rss_after - rss_before, 0) / n / 2**20,
+        "by_step": {},
+    }
+    for name, _ in (("open", None),) + SCENARIO:
+        step_ms = np.array([r[1] for r in results if r[0] == name]) * 1000.0
+        if len(step_ms):
+            level["by_step"][name] = (len(step_ms), *np.percentile(step_ms, [50, 95]))
+    return level
+
+
+def saturation_point(levels: List[Dict], slo_ms: float, min_gain: float) -> Optional[int]:
+    """Largest session count before throughput stops growing by min_gain or p95 breaks the SLO."""
+    best = None
+    for prev, level in zip([None] + levels[:-1], levels):
+        if level["p95"] > slo_ms or level["errors"]:
+            break
+        if prev is not None and level["throughput"] < prev["throughput"] * (1.0 + min_gain):
+            break
+        best = level["sessions"]
+    return best
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test the Streamlit app with concurrent headless sessions")
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="comma-separated session counts to sweep")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per session count")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between interactions")
+    parser.add_argument("--upstream-latency-ms", type=float, default=80.0, help="stand-in API response delay")
+    parser.add_argument("--standin-url", help="use an already running standin_apis.py instead of starting one")
+    parser.add_argument("--slo-ms", type=float, default=2000.0, help="p95 rerun latency budget")
+    parser.add_argument("--min-gain", type=float, default=0.10,
+                        help="throughput gain below which a larger session count counts as saturated")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout, seconds")
+    args = parser.parse_args(argv)
+    counts = [int(n) for n in args.sessions.split(",") if n.strip()]
+
+    import standin_apis
+
+    server = None
+    base_url = args.standin_url
+    if base_url is None:
+        server = standin_apis.make_server("127.0.0.1", 0, args.upstream_latency_ms)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+    # Set before the app is first imported: Config reads these at import time
+    os.environ.update(standin_apis.standin_env(base_url))
+    os.environ.pop("EVCP_SHARED_CACHE", None)
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+
+    # One untimed visit, so imports and process-wide caches don't count against the first level
+    run_level(1, 0.0, 0.0, args.timeout)
+
+    print(f"stand-in APIs {base_url} ({args.upstream_latency_ms:.0f} ms), {args.duration:.0f} s per level, "
+          f"think time {args.think_ms:.0f} ms")
+    print(f"{'sessions':>8} {'reruns':>7} {'errors':>6} {'reruns/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'MiB/session':>12}")
+    levels = []
+    for n in counts:
+        level = run_level(n, args.duration, args.think_ms / 1000.0, args.timeout)
+        levels.append(level)
+        print(f"{n:>8} {level['reruns']:>7} {level['errors']:>6} {level['throughput']:>9.1f} "
+              f"{level['p50']:>8.0f} {level['p95']:>8.0f} {level['p99']:>8.0f} {level['mib_per_session']:>12.1f}")
+        for message in level["first_errors"]:
+            print(f"{'':>8} error  {message[:160]}")
+    if server is not None:
+        server.shutdown()
+
+    print("\nper interaction at the largest level (count, p50 ms, p95 ms):")
+    for name, (count, p50, p95) in levels[-1]["by_step"].items():
+        print(f"  {name:<10} {count:>6} {p50:>8.0f} {p95:>8.0f}")
+    point = saturation_point(levels, args.slo_ms, args.min_gain)
+    if point is None:
+        print(f"\nsaturated already at {counts[0]} session(s) (p95 over {args.slo_ms:.0f} ms or errors)")
+    elif point == counts[-1]:
+        print(f"\nstill scaling at {point} sessions; sweep higher to find the saturation point")
+    else:
+        print(f"\nsaturation: about {point} concurrent sessions per process "
+              f"(p95 budget {args.slo_ms:.0f} ms, min throughput gain {args.min_gain:.0%})")
+
+
+if __name__ == "__main__":
+    main()
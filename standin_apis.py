@@ -0,0 +1,249 @@
+"""
+Local stand-ins for the upstream APIs the app calls, for load tests and offline work.
+
+    python standin_apis.py --port 8090 --latency-ms 80
+
+Serves deterministic synthetic data on the same paths as the real services:
+OpenChargeMap (/v3/poi/, /v3/referencedata/), OpenRouteService
+(/geocode/search, /v2/directions/driving-car), Frankfurter (/latest) and
+Nominatim (/search). Point the app at it with the variables from
+standin_env(), e.g. EVCP_OCM_URL=http://127.0.0.1:8090.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import argparse
+import hashlib
+import json
+import math
+import time
+import urllib.parse
+import numpy as np
+
+OPERATORS = (
+    (1, "Shell Recharge"), (2, "BP Pulse"), (3, "Osprey"), (4, "Ionity"), (5, "Pod Point"),
+    (6, "Tesla"), (7, "InstaVolt"), (8, "MFG EV Power"), (9, "GRIDSERVE"), (10, "Connected Kerb"),
+)
+POWER_LEVELS_KW = (7, 22, 50, 75, 150, 350)
+PLACES = {
+    "london": (-0.1276, 51.5072), "manchester": (-2.2426, 53.4808), "birmingham": (-1.8904, 52.4862),
+    "leeds": (-1.5491, 53.8008), "bristol": (-2.5879, 51.4545), "edinburgh": (-3.1883, 55.9533),
+    "glasgow": (-4.2518, 55.8642), "cardiff": (-3.1791, 51.4816), "eastbourne": (0.2840, 50.7684),
+    "brighton": (-0.1372, 50.8225), "exeter": (-3.5339, 50.7184), "newcastle": (-1.6178, 54.9783),
+    "dover": (1.3134, 51.1279), "calais": (1.8587, 50.9513), "paris": (2.3522, 48.8566),
+    "folkestone": (1.1664, 51.0814), "lille": (3.0573, 50.6292), "lyon": (4.8357, 45.7640),
+}
+SITE_SPACING_DEG = 0.02  # one synthetic charging site per grid cell (~2 km)
+ROUTE_VERTEX_SPACING_M = 100.0
+
+
+def _unit(*parts) -> float:
+    """Deterministic pseudo-random number in [0, 1) from the given parts."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2**64
+
+
+def place_coordinates(query: str) -> Tuple[float, float]:
+    """lon/lat for a place name or postcode: known towns, else a stable spot in Great Britain."""
+    key = query.lower()
+    for name, coords in PLACES.items():
+        if name in key:
+            return coords
+    return -4.5 + 5.0 * _unit("lon", key), 50.6 + 4.5 * _unit("lat", key)
+
+
+def country_of(lat: float, lon: float) -> str:
+    """Rough GB/FR split, enough to make countrycode filtering behave across the Channel."""
+    return "FR" if lat < 49.9 or (lon > 1.45 and lat < 51.1) else "GB"
+
+
+def chargers_near(
+    lat: float, lon: float, distance_km: float, max_results: int, country: Optional[str] = None
+) -> List[Dict]:
+    """Compact OCM POIs on a fixed grid, so overlapping searches return the same sites."""
+    dlat = distance_km / 111.0
+    dlon = distance_km / (111.0 * max(math.cos(math.radians(lat)), 0.1))
+    rows = range(math.floor((lat - dlat) / SITE_SPACING_DEG), math.ceil((lat + dlat) / SITE_SPACING_DEG) + 1)
+    cols = range(math.floor((lon - dlon) / SITE_SPACING_DEG), math.ceil((lon + dlon) / SITE_SPACING_DEG) + 1)
+    pois = []
+    for i in rows:
+        for j in cols:
+            site_lat = (i + _unit("y", i, j)) * SITE_SPACING_DEG
+            site_lon = (j + _unit("x", i, j)) * SITE_SPACING_DEG
+            d = math.hypot((site_lat - lat) * 111.0, (site_lon - lon) * 111.0 * math.cos(math.radians(lat)))
+            if d > distance_km or (country and country_of(site_lat, site_lon) != country):
+                continue
+            op_id, _ = OPERATORS[int(_unit("op", i, j) * len(OPERATORS))]
+            site_id = (i % 100_000) * 100_000 + j % 100_000
+            pois.append({
+                "ID": site_id,
+                "OperatorID": op_id,
+                "AddressInfo": {"Title": f"Site {site_id}", "Latitude": site_lat, "Longitude": site_lon, "Distance": d},
+                "Connections": [{"PowerKW": POWER_LEVELS_KW[int(_unit("kw", i, j) * len(POWER_LEVELS_KW))]}],
+            })
+    pois.sort(key=lambda p: p["AddressInfo"]["Distance"])
+    return pois[:max_results]
+
+
+def _encode_values(deltas: np.ndarray) -> str:
+    out = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def _route(coordinates: List[List[float]], via: bool = False) -> Dict:
+    """A gently curving 3D route through the given lon/lat points, as one ORS route.
+
+    Like ORS, every leg between requested points is its own segment, and
+    way_points holds the vertex index of each point; with via the inner
+    points only shape the route (as for an alternative) and it is one segment.
+    """
+    lons, lats, eles, steps, segments, way_points = [], [], [], [], [], [0]
+    for (lon0, lat0), (lon1, lat1) in zip(coordinates[:-1], coordinates[1:]):
+        km = math.hypot((lon1 - lon0) * 111.0 * math.cos(math.radians((lat0 + lat1) / 2)), (lat1 - lat0) * 111.0)
+        n = max(int(km * 1000.0 / ROUTE_VERTEX_SPACING_M), 2)
+        t = np.linspace(0.0, 1.0, n)
+        bend = 0.05 * math.sin(7.0 * _unit(lon0, lat0, lon1, lat1)) * np.sin(np.pi * t)
+        seg_lon = lon0 + (lon1 - lon0) * t - (lat1 - lat0) * bend
+        seg_lat = lat0 + (lat1 - lat0) * t + (lon1 - lon0) * bend
+        seg_ele = 80.0 + 60.0 * np.sin(t * km / 15.0) + 40.0 * np.sin(t * km / 4.0)
+        start = len(lons) - (1 if lons else 0)
+        if lons:  # legs share their joining vertex
+            seg_lon, seg_lat, seg_ele = seg_lon[1:], seg_lat[1:], seg_ele[1:]
+        lons.extend(seg_lon), lats.extend(seg_lat), eles.extend(seg_ele)
+        road_km = km * 1.25
+        # Motorway in the middle of each leg, slower roads at either end
+        leg_steps = []
+        for a, b, kmh in ((0.0, 0.1, 50.0), (0.1, 0.9, 105.0), (0.9, 1.0, 50.0)):
+            wp = (start + int(a * (n - 1)), start + int(b * (n - 1)))
+            leg_steps.append({"distance": (b - a) * road_km * 1000.0,
+                              "duration": (b - a) * road_km / kmh * 3600.0, "way_points": list(wp)})
+        steps.extend(leg_steps)
+        segments.append({"distance": sum(s["distance"] for s in leg_steps),
+                         "duration": sum(s["duration"] for s in leg_steps), "steps": leg_steps})
+        way_points.append(len(lons) - 1)
+    points = np.column_stack([
+        np.round(np.asarray(lats) * 1e5), np.round(np.asarray(lons) * 1e5), np.round(np.asarray(eles) * 1e2)
+    ]).astype(np.int64)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 3), dtype=np.int64)).ravel()
+    distance = sum(s["distance"] for s in steps)
+    duration = sum(s["duration"] for s in steps)
+    if via:
+        segments = [{"distance": distance, "duration": duration, "steps": steps}]
+        way_points = [way_points[0], way_points[-1]]
+    return {
+        "summary": {"distance": distance, "duration": duration},
+        "segments": segments,
+        "way_points": way_points,
+        "geometry": _encode_values(deltas),
+    }
+
+
+def directions(coordinates: List[List[float]], alternatives: int = 1) -> Dict:
+    """ORS directions JSON; alternatives bow out either side of the direct route, each longer."""
+    routes = [_route(coordinates)]
+    (lon0, lat0), (lon1, lat1) = coordinates[0], coordinates[-1]
+    for k in range(1, alternatives if len(coordinates) == 2 else 1):
+        side = 0.12 * (1 + (k - 1) // 2) * (1 if k % 2 else -1)
+        via = [(lon0 + lon1) / 2 - (lat1 - lat0) * side, (lat0 + lat1) / 2 + (lon1 - lon0) * side]
+        routes.append(_route([coordinates[0], via, coordinates[-1]], via=True))
+    return {"routes": routes, "metadata": {"query": {"coordinates": coordinates, "elevation": True}}}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency_s = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        if url.path.startswith("/v3/poi"):
+            payload = chargers_near(
+                float(query["latitude"]), float(query["longitude"]),
+                float(query.get("distance", 10)), int(query.get("maxresults", 20)), query.get("countrycode"),
+            )
+        elif url.path.startswith("/v3/referencedata"):
+            payload = {"Operators": [{"ID": i, "Title": title} for i, title in OPERATORS]}
+        elif url.path == "/latest":
+            payload = {"date": time.strftime("%Y-%m-%d"), "rates": {"GBP": 0.86, "USD": 1.09}}
+        elif url.path == "/geocode/search":
+            lon, lat = place_coordinates(query.get("text", ""))
+            payload = {"features": [{"geometry": {"type": "Point", "coordinates": [lon, lat]}}]}
+        elif url.path == "/search":
+            lon, lat = place_coordinates(query.get("q", ""))
+            payload = [{"lat": str(lat), "lon": str(lon), "display_name": query.get("q", ""),
+                        "boundingbox": [str(lat), str(lat), str(lon), str(lon)]}]
+        else:
+            return self._send(404, {"error": f"unknown path {url.path}"})
+        self._send(200, payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if urllib.parse.urlsplit(self.path).path.startswith("/v2/directions"):
+            alternatives = int((body.get("alternative_routes") or {}).get("target_count", 1))
+            return self._send(200, directions(body["coordinates"], alternatives))
+        self._send(404, {"error": f"unknown path {self.path}"})
+
+    def _send(self, status: int, payload):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0) -> ThreadingHTTPServer:
+    """Stand-in server; every response is delayed by latency_ms to mimic the real APIs."""
+    handler = type("Handler", (StandInHandler,), {"latency_s": latency_ms / 1000.0})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def standin_env(base_url: str) -> Dict[str, str]:
+    """Environment that points the app (and api_server.py) at a stand-in server."""
+    return {
+        "EVCP_OCM_URL": base_url,
+        "EVCP_ORS_URL": base_url,
+        "EVCP_FX_URL": base_url,
+        "EVCP_NOMINATIM_URL": base_url,
+        "OCM_API_KEY": "stand-in",
+        "ORS_API_KEY": "stand-in",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stand-ins for the OCM, ORS, FX and Nominatim APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.latency_ms)
+    base_url = f"http://{args.host}:{server.server_port}"
+    print(f"Stand-in APIs on {base_url}; point the app at them with:")
+    for name, value in standin_env(base_url).items():
+        print(f"  export {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
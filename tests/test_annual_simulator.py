@@ -0,0 +1,32 @@
+import ev_charge_pro_app as app
+
+
+def _home_and_public():
+    home = next(n for n, p in app.CHARGING_PROVIDERS.items() if p["type"] == "home")
+    public = [n for n, p in app.CHARGING_PROVIDERS.items() if p["type"] != "home"][:2]
+    return home, public
+
+
+def test_home_session_fee_only_charged_on_plugged_in_nights(monkeypatch):
+    home, public = _home_and_public()
+    fee_home = "Home with standing fee (test)"
+    monkeypatch.setitem(
+        app.CHARGING_PROVIDERS, fee_home, {**app.CHARGING_PROVIDERS[home], "session_fee": 1.0}
+    )
+    never_home = app.DrivingProfile(home_charging_prob=0.0)
+    _, summary = app.simulate_annual_costs(
+        never_home, 60.0, 3.5, 150.0, 10.0, fee_home, public,
+        "GBP", app.FALLBACK_EXCHANGE_RATES, n_vehicles=50, n_days=365,
+    )
+    assert (summary["Home share (GBP/yr)"] == 0.0).all()
+
+
+def test_annual_cost_simulation_is_memoized_on_inputs():
+    home, public = _home_and_public()
+    args = (
+        app.DrivingProfile(), 60.0, 3.5, 150.0, 10.0, home, tuple(public), "GBP",
+        app.rates_fingerprint(app.FALLBACK_EXCHANGE_RATES), 20, 30,
+    )
+    first = app.annual_cost_simulation(*args)
+    assert app.annual_cost_simulation(*args) is first
+    assert app.annual_cost_simulation(*args[:-1], 31) is not first
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import ev_charge_pro_app as app
+from ev_charge_pro_app import BoundedCache, bounded_cache, estimate_size
+
+
+def test_lru_evicts_least_recently_used_entry():
+    cache = BoundedCache("lru", max_bytes=2**20, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)  # "b" is now least recently used
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_quota_evicts_until_under_quota():
+    value = "x" * 1000
+    size = estimate_size(value)
+    cache = BoundedCache("bytes", max_bytes=2 * size + size // 2)
+    for key in "abc":
+        cache.put(key, value)
+    assert cache.bytes <= cache.max_bytes
+    assert cache.get("a") == (False, None)
+    assert cache.get("b")[0] and cache.get("c")[0]
+
+
+def test_value_over_quota_is_rejected():
+    cache = BoundedCache("reject", max_bytes=100)
+    cache.put("big", "x" * 1000)
+    assert cache.get("big") == (False, None)
+    assert cache.bytes == 0
+    assert cache.stats()["rejections"] == 1
+
+
+def test_ttl_expires_entries_but_keeps_them_for_stale_serving():
+    cache = BoundedCache("ttl", max_bytes=2**20, ttl=0.05)
+    cache.put("k", "v")
+    assert cache.get("k") == (True, "v")
+    time.sleep(0.1)
+    assert cache.get("k") == (False, None)
+    assert cache.stats()["expirations"] == 1
+    assert cache.get_stale("k") == (True, "v")
+
+
+def test_put_ttl_overrides_cache_ttl():
+    cache = BoundedCache("ttl-override", max_bytes=2**20, ttl=3600)
+    cache.put("k", "v", ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("k") == (False, None)
+
+
+def test_decorator_memoizes_and_ignores_underscore_args():
+    calls = []
+
+    @bounded_cache(ttl=60, name="test_decorator_memoizes")
+    def double(x, _unused=None):
+        calls.append(x)
+        return 2 * x
+
+    assert double(2, _unused="a") == 4
+    assert double(2, _unused="b") == 4
+    assert double(x=2) == 4
+    assert calls == [2]
+
+
+def test_decorated_cache_survives_redecoration():
+    @bounded_cache(ttl=60, name="test_redecorated")
+    def first(x):
+        return x
+
+    first(1)
+
+    @bounded_cache(ttl=60, name="test_redecorated")
+    def second(x):
+        raise AssertionError("served from the cache")
+
+    assert second.cache is first.cache
+    assert second(1) == 1
+
+
+def test_concurrent_misses_share_one_call():
+    calls = []
+    release = threading.Event()
+
+    @bounded_cache(ttl=60, name="test_single_flight")
+    def slow(x):
+        calls.append(x)
+        release.wait(1.0)
+        return x
+
+    threads = [threading.Thread(target=slow, args=(1,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+    assert app.CACHES["test_single_flight"].stats()["coalesced"] >= 1
+
+
+def test_partition_version_only_moves_for_its_partition():
+    cache = BoundedCache("parts", max_bytes=2**20, max_entries=2, partition=lambda key: key[0])
+    cache.put(("GB", 1), "a")
+    gb, fr = cache.partition_version("GB"), cache.partition_version("FR")
+    cache.put(("FR", 1), "b")
+    assert cache.partition_version("GB") == gb
+    assert cache.partition_version("FR") > fr
+    cache.put(("FR", 2), "c")  # evicts ("GB", 1)
+    assert cache.partition_version("GB") > gb
@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import ev_charge_pro_app as app
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for name in ("tariffs.json", "vehicles.json"):
+        shutil.copy(os.path.join(DATA_DIR, name), tmp_path / name)
+    return tmp_path
+
+
+def _edit_tariffs(data_dir, edit):
+    path = data_dir / "tariffs.json"
+    tariffs = json.loads(path.read_text())
+    edit(tariffs)
+    path.write_text(json.dumps(tariffs))
+
+
+def _first_provider(tariffs):
+    return next(iter(tariffs["providers"].values()))
+
+
+@pytest.mark.parametrize("edit", [
+    lambda t: _first_provider(t).update(energy="0.45"),
+    lambda t: _first_provider(t).update(default_kw=0),
+    lambda t: _first_provider(t).update(energy_windows=[{"start": "7am", "end": "08:00", "energy": 0.1}]),
+    lambda t: _first_provider(t).update(energy_windows=[{"start": "07:00", "end": "08:00"}]),
+    lambda t: _first_provider(t).update(energy_tiers=[{"from_kwh": 10}]),
+    lambda t: t.update(operator_tariffs=["not", "a", "mapping"]),
+])
+def test_malformed_tariffs_raise_catalogue_error(data_dir, edit):
+    _edit_tariffs(data_dir, edit)
+    with pytest.raises(app.CatalogueError):
+        app.load_catalogue(str(data_dir))
+
+
+def test_rejected_reload_keeps_current_catalogue(data_dir, monkeypatch):
+    current = app.current_catalogue()
+    _edit_tariffs(data_dir, lambda t: _first_provider(t).update(time=[0.1]))
+    monkeypatch.setattr(app.Config, "DATA_DIR", str(data_dir))
+    for key in ("stamp", "checked_at", "error"):
+        monkeypatch.setitem(app._catalogue_state, key, app._catalogue_state[key])
+    assert app.reload_catalogue(force=True) is False
+    assert app.current_catalogue() is current
+    assert "time must be a number" in app.catalogue_error()
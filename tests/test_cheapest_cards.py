@@ -0,0 +1,51 @@
+import dataclasses
+
+import ev_charge_pro_app as app
+
+
+def _public_eur_and_gbp():
+    providers = app.CHARGING_PROVIDERS
+    eur = next(n for n, p in providers.items() if p["currency"] == "EUR" and p["type"] != "home")
+    gbp = next(n for n, p in providers.items() if p["currency"] == "GBP" and p["type"] != "home")
+    return eur, gbp
+
+
+def test_entries_are_keyed_by_the_callers_rates():
+    table = app.CheapestCardTable()
+    table.refresh()
+    eur, _ = _public_eur_and_gbp()
+    session = ((eur,), 50.0, 60.0, 20.0, 80.0, 10.0, True, "GBP")
+    _, cost_a = table.cheapest(*session, {"EUR": 1.0, "GBP": 0.80, "_date": "a"})
+    _, cost_b = table.cheapest(*session, {"EUR": 1.0, "GBP": 0.90, "_date": "b"})
+    assert cost_b > cost_a
+    _, again = table.cheapest(*session, {"EUR": 1.0, "GBP": 0.80, "_date": "c"})
+    assert again == cost_a
+    assert table.stats()["hits"] == 1
+
+
+def test_costs_computed_across_a_catalogue_swap_are_not_stored(monkeypatch):
+    table = app.CheapestCardTable()
+    table.refresh()
+    eur, _ = _public_eur_and_gbp()
+    compute = table._compute
+
+    def compute_during_reload(key, providers):
+        monkeypatch.setattr(app, "CATALOGUE", dataclasses.replace(app.CATALOGUE))
+        return compute(key, providers)
+
+    monkeypatch.setattr(table, "_compute", compute_during_reload)
+    card, _ = table.cheapest((eur,), 50.0, 60.0, 20.0, 80.0, 10.0, True, "GBP", {"EUR": 1.0, "GBP": 0.85})
+    assert card == eur
+    assert table.stats()["entries"] == 0
+
+
+def test_full_table_evicts_least_recently_used():
+    table = app.CheapestCardTable(max_entries=2)
+    table.refresh()
+    eur, _ = _public_eur_and_gbp()
+    rates = {"EUR": 1.0, "GBP": 0.85}
+    for start in (10.0, 20.0, 10.0, 30.0):
+        table.cheapest((eur,), 50.0, 60.0, start, 80.0, 10.0, True, "GBP", rates)
+    table.cheapest((eur,), 50.0, 60.0, 10.0, 80.0, 10.0, True, "GBP", rates)
+    assert table.stats()["entries"] == 2
+    assert table.stats()["hits"] == 2
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+import ev_charge_pro_app as app
+
+
+@pytest.mark.parametrize("lat, lon, radius_km, expected", [
+    (51.15, 0.87, 10, ("GB",)),  # Ashford, Kent: the Channel keeps France out of reach
+    (51.08, 1.17, 10, ("GB",)),  # Folkestone
+    (50.95, 1.85, 10, ("FR",)),  # Calais
+    (54.60, -5.93, 10, ("GB",)),  # Belfast
+    (53.35, -6.26, 10, ("IE",)),  # Dublin
+    (55.68, 12.57, 10, ("DK",)),  # Copenhagen, across the Øresund from Malmö
+    (47.56, 7.59, 10, ("FR", "DE", "CH")),  # Basel
+    (42.00, 9.00, 5, ("FR",)),  # Corsica, nearer Italy than mainland France
+])
+def test_countries_near_follows_outlines(lat, lon, radius_km, expected):
+    assert app.countries_near(lat, lon, radius_km) == expected
+
+
+def test_point_outside_every_outline_gets_nearest_country():
+    assert app.countries_near(60.15, -1.15) == ("GB",)  # Shetland is not in the outlines
+
+
+def test_search_chargers_fetches_countries_concurrently(monkeypatch):
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def fetch(lat, lon, distance_km, max_results, country):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return app.ChargerSet.empty()
+
+    monkeypatch.setattr(app, "fetch_nearby_chargers", fetch)
+    app.search_chargers(47.56, 7.59, distance_km=10)
+    assert peak[0] == 3
+
+
+def test_country_shard_rebuilds_only_after_its_own_entries_change(monkeypatch):
+    cache = app.fetch_nearby_chargers.cache
+    shard = app.CountryShard("LU")
+    unions = []
+    real_union = app.ChargerSet.union
+    monkeypatch.setattr(app.ChargerSet, "union", lambda sets: unions.append(len(sets)) or real_union(sets))
+
+    shard.chargers()
+    shard.chargers()
+    assert len(unions) == 1
+    key = (("lat", 0.0), ("lon", 0.0), ("distance_km", 1), ("max_results", 1), ("country", "NO"))
+    cache.put(key, app.ChargerSet.empty())
+    shard.chargers()
+    assert len(unions) == 1
+    cache.put(key[:-1] + (("country", "LU"),), app.ChargerSet.empty())
+    shard.chargers()
+    assert len(unions) == 2
+    cache.discard(lambda k: dict(k)["lat"] == 0.0)
+
+
+def test_charger_index_is_shared_by_equal_sets():
+    pois = [{"ID": 7, "AddressInfo": {"Title": "Site", "Latitude": 51.5, "Longitude": -0.1}}]
+    first = app.ChargerSet.from_ocm(pois, {})
+    again = app.ChargerSet.from_ocm(pois, {})
+    other = app.ChargerSet.from_ocm([{**pois[0], "ID": 8}], {})
+    assert app.charger_index(first) is app.charger_index(again)
+    assert app.charger_index(other) is not app.charger_index(first)
+
+
+def test_pois_without_an_id_get_the_same_id_in_every_set():
+    site = {"AddressInfo": {"Latitude": 51.5, "Longitude": -0.1}, "OperatorInfo": {"Title": "Ionity"}}
+    other = {"AddressInfo": {"Latitude": 52.5, "Longitude": -1.1}, "OperatorInfo": {"Title": "Ionity"}}
+    first = app.ChargerSet.from_ocm([site, other], {})
+    second = app.ChargerSet.from_ocm([other, site], {})
+    assert (first.records["id"] < 0).all()
+    assert sorted(first.records["id"]) == sorted(second.records["id"])
+    assert len(app.ChargerSet.union([first, second])) == 2
@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+
+import ev_charge_pro_app as app
+
+PROVIDER_A = {"provider": "Test", "energy_price": 0.5, "currency": "GBP", "station_kw": 150.0}
+RATES = {"EUR": 1.0, "GBP": 0.85, "USD": 1.1}
+
+
+def _stop(lon, lat):
+    return {"charger_name": f"Site {lon:g}", "time_min": 30.0, "total_cost": 12.0}
+
+
+def _cost_route(monkeypatch, pick):
+    monkeypatch.setattr(app, "search_chargers", lambda *args, **kwargs: None)
+    monkeypatch.setattr(app, "pick_best_charger_stop", pick)
+    coords = np.array([[-1.0, 51.0, 0.0], [-1.5, 52.0, 0.0], [-2.0, 53.0, 0.0]])
+    profile = {
+        "energy_kwh": np.array([0.0, 30.0, 60.0]),
+        "distance_km": np.array([0.0, 120.0, 240.0]),
+        "elevation_m": np.zeros(3),
+        "ascent_m": 0.0,
+        "elevation_source": "flat",
+    }
+    stops = (profile, np.array([1, 2]), np.array([80.0, 10.0, 10.0]))
+    route = {"summary": {"distance": 240_000.0, "duration": 3 * 3600.0}}
+
+    async def run():
+        rates = asyncio.get_running_loop().create_future()
+        rates.set_result(RATES)
+        return await app.cost_route_async(
+            route, coords, stops, 60.0, 3.5, PROVIDER_A, "GBP", [], rates, 80.0
+        )
+
+    return asyncio.run(run())
+
+
+def test_stops_without_a_charger_are_counted_as_unresolved(monkeypatch):
+    plan = _cost_route(monkeypatch, lambda lon, lat, **kw: _stop(lon, lat) if lat < 52.5 else None)
+    assert plan["required_stops"] == 2
+    assert plan["unresolved_stops"] == 1
+    assert len(plan["stops"]) == 1
+    assert app.format_stops(plan) == "2 (1 without a charger)"
+
+
+def test_join_legs_sums_unresolved_stops(monkeypatch):
+    leg = _cost_route(monkeypatch, lambda lon, lat, **kw: None)
+    leg.update(start=(51.0, -1.0), end=(53.0, -2.0))
+    trip = app.join_legs([leg, dict(leg)])
+    assert trip["required_stops"] == 4
+    assert trip["unresolved_stops"] == 4
+
+
+def test_join_legs_reports_mixed_elevation_sources(monkeypatch):
+    leg = _cost_route(monkeypatch, lambda lon, lat, **kw: None)
+    leg.update(start=(51.0, -1.0), end=(53.0, -2.0))
+    assert app.join_legs([leg, dict(leg)])["elevation_source"] == "flat"
+    assert app.join_legs([leg, {**leg, "elevation_source": "route"}])["elevation_source"] == "mixed"
+
+
+def test_split_ors_legs_cuts_a_multi_waypoint_route_per_segment():
+    coords = np.array([[float(i), 50.0, 0.0] for i in range(6)])
+    route = {
+        "summary": {"distance": 5000.0, "duration": 500.0},
+        "way_points": [0, 2, 5],
+        "segments": [
+            {"distance": 2000.0, "duration": 200.0, "steps": [{"way_points": [0, 2], "distance": 2000.0}]},
+            {"distance": 3000.0, "duration": 300.0, "steps": [{"way_points": [2, 5], "distance": 3000.0}]},
+        ],
+    }
+    (first, first_coords), (second, second_coords) = app.split_ors_legs(route, coords)
+    assert first["summary"] == {"distance": 2000.0, "duration": 200.0}
+    assert second["summary"] == {"distance": 3000.0, "duration": 300.0}
+    assert first_coords[:, 0].tolist() == [0.0, 1.0, 2.0]
+    assert second_coords[:, 0].tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert second["segments"][0]["steps"][0]["way_points"] == [0, 3]
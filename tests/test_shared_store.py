@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+import ev_charge_pro_app as app
+
+
+def test_store_directory_is_created_private(tmp_path):
+    path = tmp_path / "cache" / "store.sqlite3"
+    store = app.open_shared_store(str(path))
+    assert store is not None
+    assert os.stat(path.parent).st_mode & 0o777 == 0o700
+    assert os.stat(path).st_mode & 0o077 == 0
+    store.put("ns", b"k", b"v", None)
+    assert store.get("ns", b"k") == (b"v", None)
+
+
+def test_store_backend_must_implement_the_interface():
+    class Partial(app.SharedCacheStore):
+        def get(self, namespace, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+@pytest.mark.parametrize("mode", [0o750, 0o707, 0o777])
+def test_store_in_shared_directory_is_refused(tmp_path, mode):
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    directory.chmod(mode)
+    with pytest.raises(PermissionError):
+        app.check_private_store_path(str(directory / "store.sqlite3"))
+    assert app.open_shared_store(str(directory / "store.sqlite3")) is None
+
+
+def test_world_readable_database_is_refused(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o700)
+    path = directory / "store.sqlite3"
+    path.touch()
+    path.chmod(0o644)
+    with pytest.raises(PermissionError):
+        app.check_private_store_path(str(path))
+
+
+def test_symlinked_database_is_refused(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o700)
+    (directory / "store.sqlite3").symlink_to(tmp_path / "elsewhere.sqlite3")
+    with pytest.raises(PermissionError):
+        app.check_private_store_path(str(directory / "store.sqlite3"))
+
+
+def test_failed_charger_search_is_not_cached(monkeypatch):
+    class BadLimiter:
+        def request(self, *args, **kwargs):
+            raise ValueError("not JSON")
+
+    monkeypatch.setattr(app, "OCM_API_KEY", "test-key")
+    monkeypatch.setitem(app.UPSTREAMS, "ocm", BadLimiter())
+    args = (12.345, 6.789)
+    result = app.fetch_nearby_chargers(*args, country="NL")
+    assert len(result) == 0
+    assert app.fetch_nearby_chargers.time_left(*args, country="NL") <= 0
+
+
+def test_failed_operator_lookup_is_not_cached(monkeypatch):
+    class NotFound:
+        status_code = 404
+
+        def raise_for_status(self):
+            raise app.requests.HTTPError("404 Not Found")
+
+    class Limiter:
+        def request(self, *args, **kwargs):
+            return NotFound()
+
+    app.fetch_ocm_operators.cache.clear()
+    monkeypatch.setattr(app, "OCM_API_KEY", "test-key")
+    monkeypatch.setitem(app.UPSTREAMS, "ocm", Limiter())
+    assert app.fetch_ocm_operators() == {}
+    assert app.fetch_ocm_operators.time_left() == 0
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+import ev_charge_pro_app as app
+
+
+def test_slot_is_held_until_a_timed_out_attempt_finishes():
+    limiter = app.UpstreamLimiter("test", max_concurrent=1, rate=1000.0, burst=10)
+    release = threading.Event()
+    running = []
+
+    def slow():
+        running.append(time.monotonic())
+        release.wait(5)
+        return "late"
+
+    with pytest.raises(app.UpstreamUnavailable):
+        limiter.call(slow, timeout=0.05)
+    assert limiter.in_flight == 1  # the abandoned attempt still occupies the slot
+
+    second = threading.Thread(target=limiter.call, args=(lambda: "ok", 1.0))
+    second.start()
+    time.sleep(0.1)
+    assert limiter.calls == 1  # still waiting for the slot
+    release.set()
+    second.join(2)
+    assert limiter.calls == 2
+    deadline = time.monotonic() + 1.0
+    while limiter.in_flight and time.monotonic() < deadline:  # released by a done-callback
+        time.sleep(0.01)
+    assert limiter.in_flight == 0
+
+
+def test_call_without_a_free_slot_fails_within_its_timeout():
+    limiter = app.UpstreamLimiter("test", max_concurrent=1, rate=1000.0, burst=10)
+    release = threading.Event()
+    holder = threading.Thread(target=limiter.call, args=(lambda: release.wait(5), 5.0))
+    holder.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(app.UpstreamUnavailable, match="saturated"):
+        limiter.call(lambda: "ok", timeout=0.1)
+    assert time.monotonic() - started < 1.0
+    assert limiter.stats()["saturated"] == 1
+    assert limiter.state == "closed"
+    release.set()
+    holder.join(2)
+
+
+def test_call_fails_rather_than_wait_past_its_timeout_for_a_token():
+    limiter = app.UpstreamLimiter("test", max_concurrent=4, rate=0.5, burst=1)
+    assert limiter.call(lambda: "ok", timeout=1.0) == "ok"
+    with pytest.raises(app.UpstreamUnavailable, match="saturated"):
+        limiter.call(lambda: "ok", timeout=0.1)
+    assert limiter.in_flight == 0
@@ -0,0 +1,44 @@
+"""
+Cache warm-up job: pre-fetch FX rates, chargers around hotspots and the routes
+and corridor chargers for popular city pairs (data/hotspots.json).
+
+    EVCP_SHARED_CACHE=$HOME/.cache/ev_charge_pro/cache.sqlite3 python warmup.py
+    EVCP_SHARED_CACHE=... python warmup.py --every 1800
+
+Run it from cron or alongside the servers: results reach the Streamlit and API
+workers through the shared cache, so EVCP_SHARED_CACHE must point at the same
+file they use. To warm a single process in-place instead, start it with
+EVCP_WARMUP=start (once) or EVCP_WARMUP=<seconds> (on a schedule).
+"""
+
+from typing import List, Optional
+
+import argparse
+import sys
+import time
+
+from ev_charge_pro_app import Config, SHARED_CACHE_STORE, warm_up
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Pre-warm EV Charge Pro caches for hotspots and popular routes")
+    parser.add_argument("--every", type=float, help="repeat every this many seconds instead of running once")
+    args = parser.parse_args(argv)
+
+    if SHARED_CACHE_STORE is None:
+        print("warning: no shared cache (EVCP_SHARED_CACHE unset or refused), "
+              "so nothing warmed here reaches other processes", file=sys.stderr)
+    print(f"hotspots from {Config.HOTSPOTS_PATH}", file=sys.stderr)
+    while True:
+        started = time.perf_counter()
+        # On a schedule, refetch whatever would expire before the next run
+        stats = warm_up(horizon_s=args.every or 0.0)
+        print(f"warmed in {time.perf_counter() - started:.1f} s: {stats['fetched']} fetched, "
+              f"{stats['fresh']} still fresh, {stats['failed']} failed", file=sys.stderr)
+        if not args.every:
+            return
+        time.sleep(max(args.every - (time.perf_counter() - started), 0.0))
+
+
+if __name__ == "__main__":
+    main()